@@ -39,7 +39,8 @@ CREATE TABLE sos_logs (
     sms_status VARCHAR(50) NULL,     -- 'sent', 'delivered', 'failed', etc.
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_created (user_id, created_at, id)  -- keyset paging of a user's logs
 );
 
 
@@ -56,15 +57,23 @@ CREATE TABLE incident_reports (
     place_name VARCHAR(255) NULL,
     location_type VARCHAR(20) DEFAULT 'gps_auto',  -- 'gps_auto', 'gps_manual', 'address_search'
     is_verified BOOLEAN DEFAULT FALSE,  -- For moderation/verification
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- Microsecond precision: (updated_at, id) is the /incidents/recent delta cursor
+    created_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6),
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    -- Planar (lng, lat) point kept in sync with latitude/longitude by MySQL; bbox queries use
+    -- MBRContains(ST_MakeEnvelope(...), location) so they hit the SPATIAL index (R-tree)
+    location POINT GENERATED ALWAYS AS (POINT(longitude, latitude)) STORED NOT NULL SRID 0,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
     INDEX idx_lat_lng (latitude, longitude),
+    SPATIAL INDEX idx_location (location),
     INDEX idx_created_at (created_at),
+    INDEX idx_updated_at (updated_at),  -- incremental incident store sync window
     INDEX idx_severity (severity),
     INDEX idx_type (incident_type),
     INDEX idx_verified (is_verified),
-    INDEX idx_location_type (location_type)
+    INDEX idx_location_type (location_type),
+    INDEX idx_user_created (user_id, created_at, id),  -- keyset paging of a user's reports
+    INDEX idx_user_updated (user_id, updated_at, id)   -- per-user delta sync cursor
 );
 
 
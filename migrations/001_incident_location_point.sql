@@ -0,0 +1,18 @@
+-- Adds a spatially indexed POINT column to incident_reports (already part of DB.sql
+-- for new installs). Run once on existing databases:
+--
+--     mysql hershield < migrations/001_incident_location_point.sql
+--
+-- The column is a stored generated column, so every INSERT/UPDATE of latitude or
+-- longitude keeps it in sync without application changes. SRID 0 (planar, x=lng,
+-- y=lat) matches the degree bboxes the server queries with ST_MakeEnvelope, and
+-- the SRID attribute is what lets the optimizer use the SPATIAL index.
+--
+-- Verify index use with: python server/benchmarks/check_incident_plan.py
+
+ALTER TABLE incident_reports
+    ADD COLUMN location POINT
+        GENERATED ALWAYS AS (POINT(longitude, latitude)) STORED NOT NULL SRID 0;
+
+ALTER TABLE incident_reports
+    ADD SPATIAL INDEX idx_location (location);
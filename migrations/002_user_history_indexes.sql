@@ -0,0 +1,17 @@
+-- Composite indexes for the per-user history endpoints (already part of DB.sql
+-- for new installs). Run once on existing databases:
+--
+--     mysql hershield < migrations/002_user_history_indexes.sql
+--
+-- /sos_logs/<user_id> and /incident_reports/<user_id> page newest-first with
+-- WHERE user_id = ? AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+-- LIMIT n, which these indexes answer with a short range scan whatever the
+-- size of the user's history. idx_user_updated serves the ?since= delta queries
+-- and the "newest change" lookup behind the incident reports cursor.
+
+ALTER TABLE sos_logs
+    ADD INDEX idx_user_created (user_id, created_at, id);
+
+ALTER TABLE incident_reports
+    ADD INDEX idx_user_created (user_id, created_at, id),
+    ADD INDEX idx_user_updated (user_id, updated_at, id);
@@ -0,0 +1,10 @@
+-- Index for the incident store's incremental sync (already part of DB.sql for
+-- new installs). Run once on existing databases:
+--
+--     mysql hershield < migrations/003_incident_updated_at_index.sql
+--
+-- Each sync re-reads WHERE updated_at >= <previous sync minus an overlap>,
+-- which this index answers with a short range scan instead of a table scan.
+
+ALTER TABLE incident_reports
+    ADD INDEX idx_updated_at (updated_at);
@@ -0,0 +1,14 @@
+-- Microsecond timestamps on incident_reports (already part of DB.sql for new
+-- installs). Run once on existing databases:
+--
+--     mysql hershield < migrations/004_incident_timestamp_precision.sql
+--
+-- /incidents/recent?since= and /incident_reports/<user_id>?since= page by
+-- (updated_at, id). At one-second precision a row changed later within the
+-- cursor's second but with a lower id sorted before the cursor and was never
+-- sent; microseconds make such ties practically impossible. Existing values
+-- keep their whole seconds. The server reads these columns in UTC.
+
+ALTER TABLE incident_reports
+    MODIFY created_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6),
+    MODIFY updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
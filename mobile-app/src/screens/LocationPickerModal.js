@@ -18,7 +18,7 @@ import WebMapComponent from "../components/WebMapComponent";
 import MapFloatingControls from "../components/MapFloatingControls";
 import { useToast } from "../context/ToastContext";
 import { GEOAPIFY_KEY } from "../utils/config";
-import { BASE_URL } from "../utils/config";
+import { bboxAround, fetchViewportIncidents } from "../utils/incidents";
 
 const KARNATAKA_BOUNDS = {
   minLat: 11.5,
@@ -27,6 +27,8 @@ const KARNATAKA_BOUNDS = {
   maxLng: 78.6,
 };
 
+const NEARBY_INCIDENTS_RADIUS_M = 5000;
+
 export default function LocationPicker({ onClose, onLocationSelected }) {
   const mapRef = useRef(null);
   const searchDebounceRef = useRef(null);
@@ -91,13 +93,17 @@ export default function LocationPicker({ onClose, onLocationSelected }) {
   };
   const fetchIncidents = async () => {
     try {
-      const res = await fetch(`${BASE_URL}/incidents/recent`);
-      const data = await res.json();
-  
-      if (data?.success && data.incidents) {
-        setIncidents(data.incidents);
-        mapRef.current?.addIncidents(data.incidents);
-      }
+      // Reports around the user when we know where they are, else state-wide clusters
+      const { incidents: items } = userLocation
+        ? await fetchViewportIncidents(
+            bboxAround(userLocation.latitude, userLocation.longitude, NEARBY_INCIDENTS_RADIUS_M),
+            14,
+            { details: true }
+          )
+        : await fetchViewportIncidents(KARNATAKA_BOUNDS, 7);
+
+      setIncidents(items);
+      mapRef.current?.addIncidents(items);
     } catch (e) {
       console.log("Incident fetch error", e);
     }
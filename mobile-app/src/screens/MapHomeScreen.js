@@ -15,7 +15,7 @@ import WebMapComponent from "../components/WebMapComponent";
 import MapFloatingControls from "../components/MapFloatingControls";
 
 import { useToast } from "../context/ToastContext";
-import { BASE_URL } from "../utils/config";
+import { fetchRecentIncidents } from "../utils/incidents";
 
 export default function MapHomeScreen({ navigation }) {
   const mapRef = useRef(null);
@@ -116,11 +116,10 @@ export default function MapHomeScreen({ navigation }) {
 
   const fetchIncidents = async () => {
     try {
-      const res = await fetch(`${BASE_URL}/incidents/recent`);
-      const data = await res.json(); // ← data exists ONLY below this line
+      const incidents = await fetchRecentIncidents();
   
-      if (data?.success && Array.isArray(data.incidents)) {
-        const normalized = data.incidents.map(i => ({
+      if (incidents.length) {
+        const normalized = incidents.map(i => ({
           latitude: i.latitude ?? i.lat,
           longitude: i.longitude ?? i.lng,
           severity: i.severity ?? 1,
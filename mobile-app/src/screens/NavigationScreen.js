@@ -19,6 +19,7 @@ import { Ionicons } from "@expo/vector-icons";
 import WebMapComponent from "../components/WebMapComponent";
 import MapFloatingControls from "../components/MapFloatingControls";
 import { BASE_URL } from "../utils/config";
+import { bboxAround, fetchViewportIncidents } from "../utils/incidents";
 import Clipboard from '@react-native-clipboard/clipboard';
 import AppHeader from "../components/AppHeader";
 import { useToast } from "../context/ToastContext";
@@ -56,6 +57,7 @@ export default function NavigationScreen({ route, navigation }) {
   const normalizedRouteRef = useRef([]);
   const currentStepIndexRef = useRef(0);
   const lastRerouteAtRef = useRef(0);
+  const navSessionIdRef = useRef(null);
   const lastVoiceStepRef = useRef(-1);
   const arrivalAnnouncedRef = useRef(false);
 
@@ -402,6 +404,47 @@ export default function NavigationScreen({ route, navigation }) {
     });
   };
 
+  // Reroutes go through a server-side navigation session, which repairs the
+  // previous search incrementally; /safe_route is the fallback.
+  const requestReroute = async (coords) => {
+    const position = { lat: coords.latitude, lng: coords.longitude };
+    const postJson = async (path, body) => {
+      const res = await fetch(`${BASE_URL}${path}`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+      });
+      return { res, data: await res.json() };
+    };
+
+    try {
+      if (navSessionIdRef.current) {
+        const result = await postJson(`/navigation/${navSessionIdRef.current}/position`, position);
+        if (result.res.status !== 404) return result;
+        navSessionIdRef.current = null;
+      }
+
+      const result = await postJson("/navigation/start", {
+        start: position,
+        end: { lat: end.lat, lng: end.lng },
+        mode: "walk",
+      });
+      if (result.res.ok && result.data?.nav_session_id) {
+        navSessionIdRef.current = result.data.nav_session_id;
+        return result;
+      }
+    } catch (e) {
+      console.log("Navigation session error:", e);
+    }
+
+    return postJson("/safe_route", {
+      start: position,
+      end: { lat: end.lat, lng: end.lng },
+      mode: "walk",
+      multiple: false,
+    });
+  };
+
   const rerouteFromCurrentLocation = async (coords) => {
     const now = Date.now();
     if (isRerouting || now - lastRerouteAtRef.current < REROUTE_COOLDOWN_MS) return;
@@ -412,17 +455,7 @@ export default function NavigationScreen({ route, navigation }) {
       speakText("Off route detected. Rerouting.");
       toast.showToast("Off-route detected. Rerouting...", "warning");
 
-      const res = await fetch(`${BASE_URL}/safe_route`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          start: { lat: coords.latitude, lng: coords.longitude },
-          end: { lat: end.lat, lng: end.lng },
-          mode: "walk",
-          multiple: false,
-        }),
-      });
-      const data = await res.json();
+      const { res, data } = await requestReroute(coords);
       const nextRoute = data?.route || data?.routes?.[0];
       if (!res.ok || !data?.success || !nextRoute) {
         toast.showToast("Reroute failed. Continuing current route.", "error");
@@ -644,10 +677,13 @@ export default function NavigationScreen({ route, navigation }) {
     lastIncidentFetchRef.current = now;
 
     try {
-      const res = await fetch(`${BASE_URL}/incidents/recent`);
-      const data = await res.json();
+      const data = await fetchViewportIncidents(
+        bboxAround(loc.latitude, loc.longitude, REPORT_RADIUS_M),
+        16,
+        { details: true }
+      );
 
-      if (!data?.success || !Array.isArray(data.incidents)) {
+      if (!data.incidents.length) {
         setIncidentCount(0);
         setNearbyReportItems([]);
         mapRef.current?.clearIncidents();
@@ -666,6 +702,7 @@ export default function NavigationScreen({ route, navigation }) {
             incident_type: i.incident_type || "Safety report",
             description: (i.description || "").trim(),
             place_name: (i.place_name || "").trim(),
+            count: i.count ?? 1,
           };
         })
         .filter(
@@ -688,7 +725,8 @@ export default function NavigationScreen({ route, navigation }) {
 
       const forMap = withDistance.map(({ distanceM, ...rest }) => rest);
 
-      setIncidentCount(forMap.length);
+      // Dense areas come back as clusters; count the reports, not the markers
+      setIncidentCount(forMap.reduce((n, i) => n + i.count, 0));
       setNearbyReportItems(withDistance);
       mapRef.current?.clearIncidents();
       if (forMap.length) mapRef.current?.addIncidents(forMap);
@@ -712,6 +750,9 @@ export default function NavigationScreen({ route, navigation }) {
       if (navigationStartTimeoutRef.current) {
         clearTimeout(navigationStartTimeoutRef.current);
       }
+      if (navSessionIdRef.current) {
+        fetch(`${BASE_URL}/navigation/${navSessionIdRef.current}/stop`, { method: "POST" }).catch(() => {});
+      }
     };
   }, []);
 
@@ -40,6 +40,9 @@ export default function ProfileScreen({ navigation }) {
   const [contacts, setContacts] = useState([]);
   const [sosLogs, setSosLogs] = useState([]);
   const [incidentReports, setIncidentReports] = useState([]);
+  // Keyset cursors for the next history page (null when everything is loaded)
+  const [sosNextCursor, setSosNextCursor] = useState(null);
+  const [reportsNextCursor, setReportsNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [editing, setEditing] = useState(false);
 
@@ -104,6 +107,7 @@ export default function ProfileScreen({ navigation }) {
           const sosData = await sosRes.json();
           if (mounted) {
             setSosLogs(sosData.logs || []);
+            setSosNextCursor(sosData.next_cursor || null);
           }
         }
 
@@ -112,6 +116,7 @@ export default function ProfileScreen({ navigation }) {
           const incData = await incRes.json();
           if (mounted) {
             setIncidentReports(incData.reports || []);
+            setReportsNextCursor(incData.next_cursor || null);
           }
         }
 
@@ -125,6 +130,32 @@ export default function ProfileScreen({ navigation }) {
     return () => { mounted = false };
   }, []);
 
+  const loadMoreSosLogs = async () => {
+    if (!sosNextCursor || !user?.id) return;
+    try {
+      const res = await fetch(`${BASE_URL}/sos_logs/${user.id}?before=${encodeURIComponent(sosNextCursor)}`);
+      if (!res.ok) return;
+      const data = await res.json();
+      setSosLogs(logs => [...logs, ...(data.logs || [])]);
+      setSosNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.warn("Loading more SOS logs failed", err);
+    }
+  };
+
+  const loadMoreReports = async () => {
+    if (!reportsNextCursor || !user?.id) return;
+    try {
+      const res = await fetch(`${BASE_URL}/incident_reports/${user.id}?before=${encodeURIComponent(reportsNextCursor)}`);
+      if (!res.ok) return;
+      const data = await res.json();
+      setIncidentReports(reports => [...reports, ...(data.reports || [])]);
+      setReportsNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.warn("Loading more reports failed", err);
+    }
+  };
+
   const toggleSection = (key) => {
     setExpandedSections(s => ({ ...s, [key]: !s[key] }));
   };
@@ -576,9 +607,16 @@ export default function ProfileScreen({ navigation }) {
               sosLogs.length === 0 ? (
                 <Text style={styles.emptyText}>No SOS recorded by user.</Text>
               ) : (
-                sosLogs.map((item) => (
-                  <SosItem key={item.id?.toString()} item={item} />
-                ))
+                <>
+                  {sosLogs.map((item) => (
+                    <SosItem key={item.id?.toString()} item={item} />
+                  ))}
+                  {sosNextCursor && (
+                    <TouchableOpacity onPress={loadMoreSosLogs}>
+                      <Text style={styles.loadMoreText}>Load more</Text>
+                    </TouchableOpacity>
+                  )}
+                </>
               )
             )}
           </View>
@@ -594,9 +632,16 @@ export default function ProfileScreen({ navigation }) {
               incidentReports.length === 0 ? (
                 <Text style={styles.emptyText}>No incidents reported by user.</Text>
               ) : (
-                incidentReports.map((item) => (
-                  <ReportItem key={item.id?.toString()} item={item} />
-                ))
+                <>
+                  {incidentReports.map((item) => (
+                    <ReportItem key={item.id?.toString()} item={item} />
+                  ))}
+                  {reportsNextCursor && (
+                    <TouchableOpacity onPress={loadMoreReports}>
+                      <Text style={styles.loadMoreText}>Load more</Text>
+                    </TouchableOpacity>
+                  )}
+                </>
               )
             )}
           </View>
@@ -635,6 +680,7 @@ const styles = StyleSheet.create({
   reportDesc: { fontSize: 13, color: "#444", marginTop: 4 },
   reportMeta: { fontSize: 12, color: "#555", marginTop: 4 },
   emptyText: { textAlign: "center", color: "#999", marginTop: 10 },
+  loadMoreText: { textAlign: "center", color: "#8B133E", fontWeight: "600", paddingVertical: 8 },
   divider: {
     height: 2,
     backgroundColor: "#eee",
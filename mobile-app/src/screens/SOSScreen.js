@@ -27,6 +27,7 @@ import ActionButton from "../components/ActionButton";
 import PageWrapper from "../components/PageWrapper";
 
 import { BASE_URL } from "../utils/config";
+import { createLocationBatcher } from "../utils/locationBatch";
 import Clipboard from '@react-native-clipboard/clipboard';
 
 export default function SOSScreen({ navigation }) {
@@ -45,6 +46,7 @@ export default function SOSScreen({ navigation }) {
 
   const intervalRef = useRef(null);
   const locationIntervalRef = useRef(null);
+  const locationBatcherRef = useRef(null);
   const panicScale = useRef(new Animated.Value(1)).current;
   const panicSoundRef = useRef(null);
 
@@ -231,17 +233,17 @@ export default function SOSScreen({ navigation }) {
 
   const startEmergencyLocationUpdates = async (sessionId) => {
     try {
+      // Fixes are queued and sent in batches, so none are lost while offline
+      const batcher = createLocationBatcher(sessionId);
+      locationBatcherRef.current = batcher;
+
       if (sessionId && currentLocation) {
-        await fetch(`${BASE_URL}/update_location/${sessionId}`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            latitude: currentLocation.lat,
-            longitude: currentLocation.lng,
-            timestamp: new Date().toISOString(),
-            accuracy: 10,
-          }),
+        await batcher.push({
+          latitude: currentLocation.lat,
+          longitude: currentLocation.lng,
+          accuracy: 10,
         });
+        await batcher.flush();
       }
 
       locationIntervalRef.current = setInterval(async () => {
@@ -251,16 +253,13 @@ export default function SOSScreen({ navigation }) {
           });
 
           if (sessionId) {
-            await fetch(`${BASE_URL}/update_location/${sessionId}`, {
-              method: "POST",
-              headers: { "Content-Type": "application/json" },
-              body: JSON.stringify({
-                latitude: location.coords.latitude,
-                longitude: location.coords.longitude,
-                timestamp: new Date().toISOString(),
-                accuracy: 10,
-              }),
+            await batcher.push({
+              latitude: location.coords.latitude,
+              longitude: location.coords.longitude,
+              accuracy: location.coords.accuracy || 10,
+              speed: location.coords.speed || 0,
             });
+            await batcher.flush();
 
             setCurrentLocation({
               lat: location.coords.latitude,
@@ -456,6 +455,10 @@ Sent via HerShield App`;
       if (locationIntervalRef.current) {
         clearInterval(locationIntervalRef.current);
       }
+      if (locationBatcherRef.current) {
+        await locationBatcherRef.current.clear();
+        locationBatcherRef.current = null;
+      }
 
       await AsyncStorage.removeItem('emergency_tracking_session');
 
@@ -1,4 +1,5 @@
 import { BASE_URL } from "../utils/config";
+import { decodePolyline } from "../utils/polyline";
 
 const API_URL = BASE_URL;
 
@@ -70,7 +71,8 @@ class RouteService {
             lng: endCoords.longitude
           },
           mode: options.mode || "walk",
-          multiple: !!options.multiple   // 🔑 CRITICAL
+          multiple: !!options.multiple,   // 🔑 CRITICAL
+          geometry: "polyline"            // compact payload, decoded below
         })
       });
 
@@ -81,12 +83,15 @@ class RouteService {
       }
 
       // 🔁 NORMALIZE RESPONSE
+      const routes = data.routes
+        ? data.routes
+        : data.route
+          ? [data.route]
+          : [];
       const normalized = {
-        routes: data.routes
-          ? data.routes
-          : data.route
-            ? [data.route]
-            : []
+        routes: routes.map((r) =>
+          r.polyline && !r.coords ? { ...r, coords: decodePolyline(r.polyline) } : r
+        )
       };
 
       this.cache[cacheKey] = {
@@ -0,0 +1,78 @@
+import { BASE_URL } from "./config";
+
+// Bbox of a square `radiusM` metres around a point.
+export const bboxAround = (latitude, longitude, radiusM) => {
+  const dLat = radiusM / 111320;
+  const dLng = dLat / Math.max(Math.cos((latitude * Math.PI) / 180), 0.01);
+  return {
+    minLat: latitude - dLat,
+    minLng: longitude - dLng,
+    maxLat: latitude + dLat,
+    maxLng: longitude + dLng,
+  };
+};
+
+// Fetches /incidents/viewport. Returns { mode, total, incidents } where
+// clusters (low zoom / dense areas) are turned into marker-shaped items.
+export const fetchViewportIncidents = async (bbox, zoom, { details = false } = {}) => {
+  const params = new URLSearchParams({
+    min_lat: String(bbox.minLat),
+    min_lng: String(bbox.minLng),
+    max_lat: String(bbox.maxLat),
+    max_lng: String(bbox.maxLng),
+    zoom: String(Math.round(zoom)),
+  });
+  if (details) params.append("details", "1");
+
+  const res = await fetch(`${BASE_URL}/incidents/viewport?${params}`);
+  const data = await res.json();
+  if (!data?.success) return { mode: "points", total: 0, incidents: [] };
+
+  if (data.mode === "clusters") {
+    return {
+      mode: "clusters",
+      total: data.total,
+      incidents: data.clusters.map((c, idx) => ({
+        id: `cluster-${idx}`,
+        latitude: c.latitude,
+        longitude: c.longitude,
+        severity: c.max_severity,
+        count: c.count,
+        incident_type: c.count === 1 ? "Safety report" : `${c.count} safety reports`,
+        description: "",
+        place_name: "",
+      })),
+    };
+  }
+  return { mode: "points", total: data.total, incidents: data.incidents || [] };
+};
+
+// Client copy of /incidents/recent kept in sync with `since` cursors and
+// ETags: refreshes only download rows added or changed since the last one,
+// and an unchanged list costs a 304.
+const recentSync = { cursor: null, etag: null, byId: new Map() };
+
+export const fetchRecentIncidents = async () => {
+  const url = recentSync.cursor
+    ? `${BASE_URL}/incidents/recent?since=${encodeURIComponent(recentSync.cursor)}`
+    : `${BASE_URL}/incidents/recent`;
+  const headers = recentSync.etag ? { "If-None-Match": recentSync.etag } : {};
+
+  const res = await fetch(url, { headers });
+  if (res.status !== 304) {
+    const data = await res.json();
+    if (!data?.success || !Array.isArray(data.incidents)) {
+      throw new Error(data?.error || "Incident fetch failed");
+    }
+    if (!data.delta) recentSync.byId.clear();
+    data.incidents.forEach((i) => recentSync.byId.set(i.id, i));
+    recentSync.cursor = data.cursor;
+    recentSync.etag = res.headers.get("ETag");
+    // A delta is capped server-side; keep reading until it has caught up
+    if (data.has_more) return fetchRecentIncidents();
+  }
+
+  return [...recentSync.byId.values()].sort((a, b) =>
+    (b.created_at || "").localeCompare(a.created_at || "")
+  );
+};
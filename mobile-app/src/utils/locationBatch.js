@@ -0,0 +1,78 @@
+import AsyncStorage from "@react-native-async-storage/async-storage";
+import { BASE_URL } from "./config";
+
+// Most fixes sent per request (the server caps batches at TRACK_BATCH_MAX)
+const MAX_BATCH = 200;
+// Oldest fixes are dropped past this many unsent ones
+const MAX_PENDING = 1000;
+
+// Queue of GPS fixes for one tracking session, sent to /update_locations
+// with increasing sequence numbers. Fixes stay queued (and in AsyncStorage)
+// until the server acknowledges them, so a connectivity gap delays them
+// instead of losing them; resent fixes are deduped server-side by seq.
+// The server drops every fix at or below the highest seq it has accepted,
+// so only one batch is ever in flight and each starts at the oldest
+// unacknowledged fix: a late batch then only repeats fixes already covered.
+export const createLocationBatcher = (sessionId) => {
+  const storageKey = `location_batch_${sessionId}`;
+  let state = { nextSeq: 0, pending: [] };
+  let loaded = false;
+  let sending = false;
+
+  const load = async () => {
+    if (loaded) return;
+    loaded = true;
+    try {
+      const stored = await AsyncStorage.getItem(storageKey);
+      if (stored) state = JSON.parse(stored);
+    } catch {}
+  };
+
+  const save = () => AsyncStorage.setItem(storageKey, JSON.stringify(state)).catch(() => {});
+
+  const push = async ({ latitude, longitude, accuracy = 0, speed = 0 }) => {
+    await load();
+    state.pending.push({
+      seq: state.nextSeq++,
+      latitude,
+      longitude,
+      accuracy,
+      speed,
+      timestamp: new Date().toISOString(),
+    });
+    if (state.pending.length > MAX_PENDING) state.pending.splice(0, state.pending.length - MAX_PENDING);
+    await save();
+  };
+
+  // Sends queued fixes oldest first, one batch at a time; returns false if
+  // the session is gone.
+  const flush = async () => {
+    await load();
+    // A concurrent flush would race this one's batch past the server
+    if (sending) return true;
+    sending = true;
+    try {
+      while (state.pending.length) {
+        const res = await fetch(`${BASE_URL}/update_locations/${sessionId}`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ fixes: state.pending.slice(0, MAX_BATCH) }),
+        });
+        const data = await res.json();
+        if (!data?.success) return res.status >= 500;
+        state.pending = state.pending.filter((fix) => fix.seq > data.last_seq);
+        await save();
+      }
+      return true;
+    } catch {
+      // Offline: keep the queue for the next flush
+      return true;
+    } finally {
+      sending = false;
+    }
+  };
+
+  const clear = () => AsyncStorage.removeItem(storageKey).catch(() => {});
+
+  return { push, flush, clear };
+};
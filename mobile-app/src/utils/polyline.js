@@ -0,0 +1,28 @@
+// Decodes a Google encoded polyline (as returned by /safe_route with
+// geometry: "polyline") into [[lat, lng], ...].
+export const decodePolyline = (encoded, precision = 5) => {
+  const factor = Math.pow(10, precision);
+  const coords = [];
+  let index = 0;
+  let lat = 0;
+  let lng = 0;
+
+  const nextValue = () => {
+    let result = 0;
+    let shift = 0;
+    let byte;
+    do {
+      byte = encoded.charCodeAt(index++) - 63;
+      result |= (byte & 0x1f) << shift;
+      shift += 5;
+    } while (byte >= 0x20);
+    return result & 1 ? ~(result >> 1) : result >> 1;
+  };
+
+  while (index < encoded.length) {
+    lat += nextValue();
+    lng += nextValue();
+    coords.push([lat / factor, lng / factor]);
+  }
+  return coords;
+};
@@ -1,15 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
 import mysql.connector
+import atexit
 import os
 from dotenv import load_dotenv
-from geopy.distance import geodesic
 from loguru import logger
-import math
-import heapq
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from dateutil import parser
 import secrets
 import threading
@@ -20,6 +18,40 @@ import socket
 from pyngrok import ngrok, conf
 import subprocess
 import psutil
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+from geo_math import haversine_km
+from incident_index import IncidentIndex
+from incident_store import (
+    INCIDENT_BBOX_SQL,
+    IncidentStore,
+    SharedIncidents,
+    decay_weights,
+    incident_bbox_params,
+)
+from location_log import LocationLogBusy
+from navigation import NavigationClient, init_navigation_worker
+from road_graph import load_road_graph
+from route_cache import RouteCache
+from route_pool import RoutePool, RoutePoolBusy
+from tile_cache import TileCache
+from broadcast import RoomBroadcaster
+from tracking import TrackingSession, iso, location_dict, parse_timestamp, session_store_from_env
+from json_provider import FastJSONProvider
+import tiles
+from routing import (
+    ROUTE_GEOMETRIES,
+    ROUTE_STEP,
+    SIMPLIFY_TOLERANCE_M,
+    RouteTimeout,
+    find_routes,
+    init_route_worker,
+    route_bbox,
+    route_geometry,
+    set_road_graph,
+    summarize_route,
+)
 
 
 # ENV + BASIC PATHS----------------------------------
@@ -35,9 +67,19 @@ NGROK_AUTHTOKEN = os.getenv('NGROK_AUTHTOKEN')
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Store tracking sessions
-tracking_sessions = {}
-active_connections = {}
+# Tracking sessions, in this process or (TRACKING_REDIS_URL) shared by every worker
+TRACKING_REDIS_URL = os.getenv("TRACKING_REDIS_URL")
+# In-memory sessions are appended to this log and replayed after a restart
+TRACKING_LOG_DIR = os.getenv("TRACKING_LOG_DIR", os.path.join(BASE_DIR, "data", "tracking_log"))
+TRACKING_REPLAY_MINUTES = float(os.getenv("TRACKING_REPLAY_MINUTES", "60"))
+if __name__ == "__main__" and not os.environ.get("WERKZEUG_RUN_MAIN"):
+    # The debug reloader's watcher process runs this module too; the log belongs to the serving child
+    TRACKING_LOG_DIR = ""
+try:
+    tracking_store = session_store_from_env(TRACKING_REDIS_URL, TRACKING_LOG_DIR, TRACKING_REPLAY_MINUTES * 60)
+except LocationLogBusy as e:
+    logger.warning(f"{e}; tracking sessions in this process will not survive a restart")
+    tracking_store = session_store_from_env(TRACKING_REDIS_URL)
 
 # DB CONNECTION----------------------------------
 def get_db():
@@ -46,6 +88,8 @@ def get_db():
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         database=os.getenv("DB_NAME"),
+        # TIMESTAMP columns come back as naive UTC, like the in-process rows and cursors
+        time_zone="+00:00",
     )
 
 
@@ -140,6 +184,24 @@ TRAVEL_SPEEDS = {
     "vehicle": 20.0 
 }
 
+# Fallback severity for incidents reported without one
+INCIDENT_TYPE_SEVERITY = {
+    "physical_assault": 10,
+    "stalking": 9,
+    "theft": 8,
+    "harassment": 6,
+    "eve_teasing": 5,
+    "verbal_abuse": 4,
+    "suspicious": 3,
+    "other": 5,
+}
+
+route_cache = RouteCache(
+    max_entries=int(os.getenv("ROUTE_CACHE_SIZE", "512")),
+    ttl_seconds=int(os.getenv("ROUTE_CACHE_TTL", "300")),
+    grid_step=ROUTE_STEP,
+)
+
 def send_sms(numbers, message) -> bool:
     """Send SMS via Fast2SMS."""
     if not FAST2SMS_API_KEY:
@@ -192,83 +254,225 @@ def save_sos_log(user_id, trigger_type, location, message, recipients=None, stat
         logger.error(f"Failed to save SOS log: {e}")
 
 
-def a_star_safe_path(start, end, incidents, max_time=3.0):
-    """Optimized A* pathfinding with timeout"""
-    STEP = 0.004 
-    MAX_ITERS = 500 
-    start_time = time.time()
-    
-    def h(a, b):
-        return geodesic(a, b).km
-
-    def neighbors(n):
-        lat, lng = n
-        return [
-            (lat + dlat, lng + dlng)
-            for dlat in [-STEP, 0, STEP]
-            for dlng in [-STEP, 0, STEP]
-            if not (dlat == 0 and dlng == 0)
-        ]
+# ========== ROAD NETWORK ==========
+ROAD_NETWORK_PATH = os.getenv("ROAD_NETWORK_PATH", os.path.join(BASE_DIR, "data", "roads.geojson"))
+ROAD_LANDMARKS = int(os.getenv("ROAD_LANDMARKS", "8"))
 
-    frontier = []
-    heapq.heappush(frontier, (0, start))
-    came = {start: None}
-    cost = {start: 0}
-    
-    iterations = 0
+try:
+    road_graph = load_road_graph(ROAD_NETWORK_PATH, num_landmarks=ROAD_LANDMARKS)
+    if road_graph:
+        logger.info(
+            f"Road network loaded: {road_graph.node_count} nodes, "
+            f"{road_graph.edge_count} edges, {len(road_graph.landmarks)} landmarks"
+        )
+        set_road_graph(road_graph)
+    else:
+        logger.info(f"No road network at {ROAD_NETWORK_PATH}, using lattice search")
+except Exception as e:
+    logger.error(f"Road network load failed: {e}")
+
+# ========== NAVIGATION SESSIONS ==========
+# Incremental re-routing state lives in one navigation worker process (see ROUTE WORKERS)
+NAV_MAX_SESSIONS = int(os.getenv("NAV_MAX_SESSIONS", "200"))
+NAV_SESSION_TTL = int(os.getenv("NAV_SESSION_TTL", "1800"))
+NAV_MAX_PENDING = int(os.getenv("NAV_MAX_PENDING", "32"))
+
+# ========== INCIDENT STORE ==========
+# Incidents older than this are ignored by routing (and dropped from the store)
+INCIDENT_RETENTION_DAYS = 180
+INCIDENT_SYNC_SECONDS = int(os.getenv("INCIDENT_SYNC_SECONDS", "60"))
+# Each incremental sync re-reads this many seconds before the previous one, for late commits
+INCIDENT_SYNC_OVERLAP = int(os.getenv("INCIDENT_SYNC_OVERLAP", "120"))
+INCIDENT_FULL_SYNC_SECONDS = int(os.getenv("INCIDENT_FULL_SYNC_SECONDS", "3600"))
+RECENT_INCIDENTS = 100
+
+incident_store = IncidentStore(
+    retention_days=INCIDENT_RETENTION_DAYS,
+    type_severity=INCIDENT_TYPE_SEVERITY,
+    recent_size=RECENT_INCIDENTS,
+)
+
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", os.path.join(BASE_DIR, "cache", "tiles"))
+
+tile_cache = TileCache(
+    TILE_CACHE_DIR,
+    max_entries=int(os.getenv("TILE_CACHE_SIZE", "2048")),
+    ttl_seconds=int(os.getenv("TILE_CACHE_TTL", "3600")),
+)
+# Client-side freshness for tiles; short so new reports show up quickly
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "60"))
+
+
+def invalidate_tiles(lat, lng):
+    """Drop every cached density tile a report at lat/lng contributes to."""
+    return tile_cache.invalidate(tiles.tiles_touching(lat, lng), tiles.TILE_FORMATS)
+
+
+INCIDENT_COLUMNS_SQL = """
+    SELECT id, latitude, longitude, severity, incident_type, UNIX_TIMESTAMP(created_at)
+    FROM incident_reports
+"""
 
-    while frontier and iterations < MAX_ITERS:
-        if iterations % 10 == 0 and (time.time() - start_time) > max_time:
-            print(f"Pathfinding timeout after {iterations} iterations")
-            break
-            
-        _, current = heapq.heappop(frontier)
-        iterations += 1
-
-        if h(current, end) < 0.5: 
-            break
-
-        for nxt in neighbors(current):
-            if iterations > MAX_ITERS * 0.8:
-                continue               
-            d_cost = geodesic(current, nxt).km
-            risk = 0
-
-            for inc in incidents:
-                d = geodesic(nxt, (inc["lat"], inc["lng"])).km
-                if d < 1.0: 
-                    risk += inc["severity"] / (1 + d)
-
-            new_cost = cost[current] + d_cost + (risk * 2)
-
-            if nxt not in cost or new_cost < cost[nxt]:
-                cost[nxt] = new_cost
-                heapq.heappush(frontier, (new_cost + h(nxt, end), nxt))
-                came[nxt] = current
-
-    if not came:
-        return []
-    end_node = min(came.keys(), key=lambda n: h(n, end))
-    path = []
-
-    while end_node:
-        path.append(end_node)
-        end_node = came[end_node]
-        if len(path) > 100:
-            break
-
-    path = list(reversed(path))
-    
-    print(f"✅ Path found: {len(path)} points, {iterations} iterations, {time.time()-start_time:.2f}s")
+RECENT_INCIDENTS_SQL = """
+    SELECT
+        id,
+        latitude,
+        longitude,
+        severity,
+        incident_type,
+        COALESCE(description, '') AS description,
+        COALESCE(place_name, '') AS place_name,
+        location_type,
+        is_verified,
+        created_at,
+        updated_at
+    FROM incident_reports
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+
+# Rows added or changed after a (updated_at, id) cursor, oldest change first
+RECENT_CHANGES_SQL = """
+    SELECT
+        id,
+        latitude,
+        longitude,
+        severity,
+        incident_type,
+        COALESCE(description, '') AS description,
+        COALESCE(place_name, '') AS place_name,
+        location_type,
+        is_verified,
+        created_at,
+        updated_at
+    FROM incident_reports
+    WHERE updated_at > %s OR (updated_at = %s AND id > %s)
+    ORDER BY updated_at ASC, id ASC
+    LIMIT %s
+"""
 
-    if len(path) < 2:
-        print("⚠️ Path too short, returning straight line")
-        return [start, end]
-    
-    return path
+
+def _incident_rows(cursor, batch=50000):
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return
+        for r in rows:
+            yield (int(r[0]), float(r[1]), float(r[2]), r[3], r[4], float(r[5]))
+
+
+def sync_incident_store(full=False):
+    """Full reload of the store, or upsert of rows changed since the last sync.
+
+    Incremental syncs read by updated_at from INCIDENT_SYNC_OVERLAP seconds
+    before the previous sync started, so rows committed late (with an older
+    updated_at) or edited in place are still picked up; merge() skips the
+    ones it already has.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    recent_cursor = db.cursor(dictionary=True)
+    try:
+        # The DB clock, so the window does not depend on this host's clock or time zone
+        cursor.execute("SELECT UNIX_TIMESTAMP()")
+        db_time = float(cursor.fetchone()[0])
+        if full:
+            cursor.execute(
+                INCIDENT_COLUMNS_SQL + " WHERE created_at >= NOW() - INTERVAL %s DAY",
+                (INCIDENT_RETENTION_DAYS,),
+            )
+            rows = list(_incident_rows(cursor))
+        else:
+            since = (incident_store.db_synced_at or db_time) - INCIDENT_SYNC_OVERLAP
+            cursor.execute(INCIDENT_COLUMNS_SQL + " WHERE updated_at >= FROM_UNIXTIME(%s)", (since,))
+            rows = list(_incident_rows(cursor))
+        recent_cursor.execute(RECENT_INCIDENTS_SQL, (RECENT_INCIDENTS,))
+        recent = recent_cursor.fetchall()
+    finally:
+        cursor.close()
+        recent_cursor.close()
+        db.close()
+
+    if full:
+        incident_store.load(rows, recent, db_time=db_time)
+        tile_cache.clear()
+        return len(rows)
+    incident_store.replace_recent(recent)
+    changed = incident_store.merge(rows, db_time=db_time)
+    # Reports written or edited by other workers: drop what this process has cached for them
+    for _, lat, lng, *_ in changed:
+        route_cache.invalidate_point(lat, lng)
+        invalidate_tiles(lat, lng)
+    return len(changed)
+
+
+def run_incident_sync_thread():
+    """Background reconcile: new rows every INCIDENT_SYNC_SECONDS, full reload hourly."""
+    last_full = time.time()
+    while True:
+        time.sleep(INCIDENT_SYNC_SECONDS)
+        try:
+            full = not incident_store.ready or time.time() - last_full >= INCIDENT_FULL_SYNC_SECONDS
+            sync_incident_store(full=full)
+            if full:
+                last_full = time.time()
+        except Exception as e:
+            logger.error(f"Incident store sync error: {e}")
+
+
+try:
+    loaded = sync_incident_store(full=True)
+    logger.info(f"Incident store loaded: {loaded} incidents")
+except Exception as e:
+    logger.error(f"Incident store load failed, routing will query MySQL until it syncs: {e}")
+
+# Searches read the store from a shared-memory copy republished when it changes,
+# instead of pickling the incident list into every submission
+shared_incidents = SharedIncidents(incident_store)
+atexit.register(shared_incidents.close)
+
+# ========== ROUTE WORKERS ==========
+# Searches run in worker processes so they never hold the GIL on web threads
+ROUTE_WORKERS = int(os.getenv("ROUTE_WORKERS", str(max(2, (os.cpu_count() or 2) - 1))))
+# Each multiple=true request queues up to three searches
+ROUTE_MAX_PENDING = int(os.getenv("ROUTE_MAX_PENDING", str(ROUTE_WORKERS * 12)))
+ROUTE_TIME_BUDGET = float(os.getenv("ROUTE_TIME_BUDGET", "2.0"))
+
+route_pool = RoutePool(
+    ROUTE_WORKERS,
+    ROUTE_MAX_PENDING,
+    initializer=init_route_worker,
+    initargs=(ROAD_NETWORK_PATH, ROAD_LANDMARKS),
+)
+try:
+    # Fork the workers once the store has loaded, before the request and background threads start
+    route_pool.warm_up()
+    logger.info(f"Route pool ready: {ROUTE_WORKERS} {route_pool.kind} workers")
+except Exception as e:
+    logger.error(f"Route pool warm-up failed: {e}")
+
+# Sessions keep D* Lite state between updates, so they need a single long-lived
+# process of their own rather than whichever route worker is free
+nav_pool = RoutePool(
+    1,
+    NAV_MAX_PENDING,
+    initializer=init_navigation_worker,
+    initargs=(ROAD_NETWORK_PATH, ROAD_LANDMARKS, NAV_MAX_SESSIONS, NAV_SESSION_TTL),
+)
+try:
+    nav_pool.warm_up()
+    logger.info(f"Navigation worker ready ({nav_pool.kind})")
+except Exception as e:
+    logger.error(f"Navigation worker warm-up failed: {e}")
+nav_sessions = NavigationClient(nav_pool, ROUTE_TIME_BUDGET)
+
+incident_sync_thread = threading.Thread(target=run_incident_sync_thread, daemon=True)
+incident_sync_thread.start()
 
 # ==========================FLASK APP============================
 app = Flask(__name__)
+# orjson-backed jsonify(); Decimal and datetime values serialize as float / ISO 8601
+app.json = FastJSONProvider(app)
 CORS(app)
 
 @app.route("/")
@@ -282,7 +486,23 @@ print(f"✅ SECRET_KEY: {app.config['SECRET_KEY'][:20]}...")
 print(f"✅ Ngrok Token: {'✅ Set' if NGROK_AUTHTOKEN else '❌ Missing'}")
 print(f"✅ Geoapify Key: {'✅ Set' if GEOAPIFY_API_KEY else '❌ Missing'}")
 
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True, async_mode='threading')
+# With several workers, room broadcasts go through a shared queue (defaults to the tracking Redis)
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", TRACKING_REDIS_URL)
+socketio = SocketIO(
+    app, cors_allowed_origins="*", logger=True, engineio_logger=True, async_mode='threading',
+    message_queue=SOCKETIO_MESSAGE_QUEUE or None,
+)
+
+# location_update emits per tracking room: at most TRACK_BROADCAST_HZ a second,
+# carrying the last TRACK_BROADCAST_TRAIL fixes; rooms without viewers are skipped
+TRACK_BROADCAST_HZ = float(os.getenv("TRACK_BROADCAST_HZ", "2"))
+TRACK_BROADCAST_TRAIL = int(os.getenv("TRACK_BROADCAST_TRAIL", "20"))
+location_broadcaster = RoomBroadcaster(
+    lambda event, payload, room: socketio.emit(event, payload, room=room),
+    tracking_store.viewers,
+    max_rate=TRACK_BROADCAST_HZ,
+    trail=TRACK_BROADCAST_TRAIL,
+)
 
 # Health check endpoint
 @app.route("/health", methods=["GET"])
@@ -354,19 +574,9 @@ def db_health_check():
 def cleanup_thread():
     while True:
         try:
-            now = datetime.now()
-            sessions_to_remove = []
-            
-            for session_id, session in list(tracking_sessions.items()):
-                if session["expires_at"] and now > datetime.fromisoformat(session["expires_at"]):
-                    sessions_to_remove.append(session_id)
-                    socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
-            
-            for session_id in sessions_to_remove:
-                if session_id in tracking_sessions:
-                    del tracking_sessions[session_id]
-                if session_id in active_connections:
-                    del active_connections[session_id]
+            # Each expired session is claimed (and announced) by exactly one worker
+            for session_id in tracking_store.pop_expired(time.time()):
+                socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
             
             time.sleep(60)
             
@@ -377,19 +587,9 @@ def run_cleanup_thread():
     """Background thread to clean up expired sessions"""
     while True:
         try:
-            now = datetime.now()
-            sessions_to_remove = []
-            
-            for session_id, session in list(tracking_sessions.items()):
-                if session["expires_at"] and now > datetime.fromisoformat(session["expires_at"]):
-                    sessions_to_remove.append(session_id)
-                    socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
-            
-            for session_id in sessions_to_remove:
-                if session_id in tracking_sessions:
-                    del tracking_sessions[session_id]
-                if session_id in active_connections:
-                    del active_connections[session_id]
+            # Each expired session is claimed (and announced) by exactly one worker
+            for session_id in tracking_store.pop_expired(time.time()):
+                socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
             
             time.sleep(60)
             
@@ -660,15 +860,34 @@ def remove_contact():
 # -------------------- SOS LOGS & MANUAL SOS --------
 @app.route("/sos_logs/<int:user_id>", methods=["GET"])
 def get_sos_logs(user_id):
+    """One newest-first page of a user's SOS logs (?limit=, ?before=<next_cursor>)."""
+    try:
+        limit, before = history_page_args()
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid limit or before cursor"}), 400
+
+    where, params = "user_id=%s", [user_id]
+    if before is not None:
+        where += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+        params += [before[0], before[0], before[1]]
+
     db = get_db()
     cursor = db.cursor(dictionary=True)
     cursor.execute(
-        "SELECT * FROM sos_logs WHERE user_id=%s ORDER BY TIMESTAMP DESC", (user_id,)
+        "SELECT * FROM sos_logs WHERE " + where + " ORDER BY created_at DESC, id DESC LIMIT %s",
+        params + [limit + 1],
     )
     logs = cursor.fetchall()
     cursor.close()
     db.close()
-    return jsonify({"logs": logs}), 200
+
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    return jsonify({
+        "logs": logs,
+        "has_more": has_more,
+        "next_cursor": format_cursor(created_cursor_key(logs[-1])) if has_more else None,
+    }), 200
 
 @app.route("/trigger_sos", methods=["POST"])
 def trigger_sos():
@@ -898,11 +1117,42 @@ def submit_report():
             ),
         )
         incident_report_id = cursor.lastrowid
+        # The DB's own timestamps, so cursors taken from the store copy match the row
+        cursor.execute(
+            "SELECT created_at, updated_at FROM incident_reports WHERE id = %s",
+            (incident_report_id,),
+        )
+        created_at, updated_at = cursor.fetchone()
 
         db.commit()
         cursor.close()
         db.close()
 
+        incident_store.add(
+            incident_report_id, float(latitude), float(longitude), severity, incident_type,
+            created_at=created_at.replace(tzinfo=timezone.utc).timestamp(),
+            details={
+                "id": incident_report_id,
+                "latitude": float(latitude),
+                "longitude": float(longitude),
+                "severity": severity,
+                "incident_type": incident_type,
+                "description": description or "",
+                "place_name": place_name or "",
+                "location_type": location_type,
+                "is_verified": False,
+                "created_at": created_at,
+                "updated_at": updated_at,
+            },
+        )
+        route_cache.invalidate_point(float(latitude), float(longitude))
+        invalidate_tiles(float(latitude), float(longitude))
+        nav_sessions.notify_incident(
+            float(latitude),
+            float(longitude),
+            float(severity) if severity is not None else INCIDENT_TYPE_SEVERITY.get(incident_type, 5),
+        )
+
         return jsonify(
             {
                 "success": True,
@@ -970,71 +1220,265 @@ def get_relative_time(created_at):
             return f"{years} years ago"
 
 
+# ==== cursors: incident delta sync and history paging ====
+# Cursors are a row's (timestamp, id) position, with the timestamp in UTC at the
+# DB's microsecond precision: `since` uses updated_at (rows added or changed after
+# it), `before` created_at (the next page of a newest-first history)
+CURSOR_TIME_FORMAT = "%Y%m%dT%H%M%S.%f"
+
+
+def incident_cursor_key(row):
+    return row["updated_at"] or row["created_at"], int(row["id"])
+
+
+def created_cursor_key(row):
+    return row["created_at"], int(row["id"])
+
+
+def format_cursor(key):
+    return f"{key[0].strftime(CURSOR_TIME_FORMAT)}-{key[1]}" if key else None
+
+
+def parse_cursor(value):
+    """(timestamp, id) from a cursor string; ValueError if malformed."""
+    stamp, _, row_id = value.rpartition("-")
+    if "." not in stamp:
+        # Whole-second cursor from an older server
+        stamp += ".0"
+    return datetime.strptime(stamp, CURSOR_TIME_FORMAT), int(row_id)
+
+
+def cursor_arg(name):
+    value = request.args.get(name)
+    return parse_cursor(value) if value else None
+
+
+def since_cursor_arg():
+    """The ?since= cursor, or None for a whole-second one.
+
+    Whole-second cursors were in the DB session's zone and can skip rows
+    changed within their second, so those clients get a full resync.
+    """
+    value = request.args.get("since")
+    if not value:
+        return None
+    since = parse_cursor(value)
+    return since if "." in value.rpartition("-")[0] else None
+
+
+# Per-user history endpoints page newest-first by (created_at, id)
+HISTORY_PAGE_SIZE = 20
+HISTORY_PAGE_MAX = 100
+
+
+def history_page_args():
+    """(limit, before cursor) from ?limit=&before=; ValueError if malformed."""
+    limit = int(request.args.get("limit", HISTORY_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, HISTORY_PAGE_MAX), cursor_arg("before")
+
+
+def conditional_json(payload):
+    """jsonify() with a strong ETag; answers 304 when If-None-Match still matches.
+
+    The ETag hashes the body bytes, so it only matches across processes that
+    serialize with the same JSON backend (see json_provider); a mismatch just
+    costs a full response.
+    """
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def public_incident(row):
+    """Finish an incident row (RECENT_INCIDENTS_SQL columns) for a response, in place.
+
+    Coordinates stay Decimal and timestamps datetime; the JSON provider
+    serializes them directly.
+    """
+    row["is_verified"] = bool(row["is_verified"])
+    row["relative_time"] = get_relative_time(row["created_at"])
+    return row
+
+
 # ==== recent incidents endpoint====
 @app.route("/incidents/recent", methods=["GET"])
 def get_recent_incidents():
+    """Newest incidents; with ?since=<cursor> only rows added or changed after it.
+
+    Every response carries the `cursor` to send as `since` next time; a
+    delta holds at most RECENT_INCIDENTS rows, and `has_more` says to ask
+    again right away.
+    """
     try:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                id,
-                latitude,
-                longitude,
-                severity,
-                incident_type,
-                description,
-                place_name,
-                location_type,
-                is_verified,
-                created_at,
-                updated_at
-            FROM incident_reports
-            ORDER BY created_at DESC
-            LIMIT 100  # Limit to 100 most recent incidents
-        """)
-        
-        incidents = cursor.fetchall()
-        cursor.close()
-        db.close()
+        since = since_cursor_arg()
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid since cursor"}), 400
 
-        formatted_incidents = []
-        for incident in incidents:
-            relative_time = get_relative_time(incident["created_at"])
-            
-            formatted_incidents.append({
-                "id": incident["id"],
-                "latitude": float(incident["latitude"]),
-                "longitude": float(incident["longitude"]),
-                "severity": incident["severity"],
-                "incident_type": incident["incident_type"],
-                "description": incident["description"] or "",
-                "place_name": incident["place_name"] or "",
-                "location_type": incident["location_type"],
-                "is_verified": bool(incident["is_verified"]),
-                "created_at": incident["created_at"].isoformat() if incident["created_at"] else None,
-                "relative_time": relative_time,
-                "updated_at": incident["updated_at"].isoformat() if incident["updated_at"] else None,
-            })
+    try:
+        has_more = False
+        if since is not None:
+            # Filtered in the query (idx_updated_at), so changes to rows older than
+            # the newest RECENT_INCIDENTS still come through, oldest change first
+            db = get_db()
+            cursor = db.cursor(dictionary=True)
+            cursor.execute(
+                RECENT_CHANGES_SQL,
+                (since[0], since[0], since[1], RECENT_INCIDENTS + 1),
+            )
+            incidents = cursor.fetchall()
+            cursor.close()
+            db.close()
+            has_more = len(incidents) > RECENT_INCIDENTS
+            incidents = incidents[:RECENT_INCIDENTS]
+        elif incident_store.ready:
+            # Store rows are shared between requests: finish shallow copies of them
+            incidents = [dict(i) for i in incident_store.recent(RECENT_INCIDENTS)]
+        else:
+            db = get_db()
+            cursor = db.cursor(dictionary=True)
+            cursor.execute(RECENT_INCIDENTS_SQL, (RECENT_INCIDENTS,))
+            incidents = cursor.fetchall()
+            cursor.close()
+            db.close()
+
+        next_cursor = max(map(incident_cursor_key, incidents), default=since)
+
+        formatted_incidents = [public_incident(incident) for incident in incidents]
         
-        return jsonify({
+        return conditional_json({
             "success": True, 
             "incidents": formatted_incidents,
-            "count": len(formatted_incidents)
-        }), 200
+            "count": len(formatted_incidents),
+            "cursor": format_cursor(next_cursor),
+            "delta": since is not None,
+            "has_more": has_more,
+        })
         
     except Exception as e:
         logger.error(f"Get recent incidents error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# ==== viewport incidents endpoint ====
+# Individual points from this zoom up (if few enough), grid clusters below it
+VIEWPORT_POINT_ZOOM = int(os.getenv("VIEWPORT_POINT_ZOOM", "14"))
+VIEWPORT_MAX_POINTS = int(os.getenv("VIEWPORT_MAX_POINTS", "300"))
+# Cluster cells per tile side, i.e. roughly one cluster per 64 px at 256 px tiles
+VIEWPORT_CLUSTERS_PER_TILE = 4
+
+
+def incident_details(ids):
+    """{id: description/place fields} for a bounded list of incident ids (PK lookup)."""
+    if not ids:
+        return {}
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT id, description, place_name, location_type, is_verified
+            FROM incident_reports
+            WHERE id IN (""" + ",".join(["%s"] * len(ids)) + ")",
+            list(ids),
+        )
+        return {row["id"]: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        db.close()
+
+
+@app.route("/incidents/viewport", methods=["GET"])
+def get_viewport_incidents():
+    """Incidents inside a map viewport at a zoom level.
+
+    Query: min_lat, min_lng, max_lat, max_lng, zoom and optional details=1.
+    Returns {"mode": "points", "incidents": [...]} at high zoom, otherwise
+    {"mode": "clusters", "clusters": [...]} with counts and max severity.
+    """
+    try:
+        bbox = tuple(float(request.args[k]) for k in ("min_lat", "min_lng", "max_lat", "max_lng"))
+        zoom = int(request.args.get("zoom", VIEWPORT_POINT_ZOOM))
+    except (KeyError, ValueError):
+        return jsonify({"success": False, "error": "min_lat, min_lng, max_lat, max_lng and zoom are required"}), 400
+    if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        return jsonify({"success": False, "error": "Invalid bbox"}), 400
+    zoom = max(0, min(zoom, 22))
+    details = request.args.get("details", "").lower() in ("1", "true", "yes")
+
+    if not incident_store.ready:
+        return jsonify({"success": False, "error": "Incident store is loading"}), 503, {"Retry-After": "5"}
+
+    try:
+        if zoom >= VIEWPORT_POINT_ZOOM:
+            total, incidents = incident_store.points(bbox, VIEWPORT_MAX_POINTS)
+            if total <= VIEWPORT_MAX_POINTS:
+                extra = incident_details([i["id"] for i in incidents]) if details else {}
+                for inc in incidents:
+                    inc["created_at"] = datetime.fromtimestamp(inc["created_at"], timezone.utc).isoformat()
+                    row = extra.get(inc["id"])
+                    if row is not None:
+                        inc.update(
+                            description=row["description"] or "",
+                            place_name=row["place_name"] or "",
+                            location_type=row["location_type"],
+                            is_verified=bool(row["is_verified"]),
+                        )
+                return conditional_json({
+                    "success": True,
+                    "mode": "points",
+                    "zoom": zoom,
+                    "total": total,
+                    "incidents": incidents,
+                })
+
+        cell_deg = 360.0 / 2 ** zoom / VIEWPORT_CLUSTERS_PER_TILE
+        total, clusters = incident_store.clusters(bbox, cell_deg)
+        return conditional_json({
+            "success": True,
+            "mode": "clusters",
+            "zoom": zoom,
+            "total": total,
+            "cell_deg": cell_deg,
+            "clusters": clusters,
+        })
+
+    except Exception as e:
+        logger.error(f"Viewport incidents error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ========== incident_reports ==========
 @app.route("/incident_reports/<int:user_id>", methods=["GET"])
 def get_user_incident_reports(user_id):
+    """One page of a user's reports.
+
+    Pages run newest-first by (created_at, id): pass `next_cursor` back as
+    ?before=. With ?since=<cursor> the pages instead hold rows added or
+    changed after it, oldest change first, and `cursor` advances with them.
+    """
+    try:
+        since = since_cursor_arg()
+        limit, before = history_page_args()
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid limit or cursor"}), 400
+
     try:
         db = get_db()
         cursor = db.cursor(dictionary=True)
+
+        where, params = "ir.user_id = %s", [user_id]
+        if since is not None:
+            where += " AND (ir.updated_at > %s OR (ir.updated_at = %s AND ir.id > %s))"
+            params += [since[0], since[0], since[1]]
+            order = "ir.updated_at ASC, ir.id ASC"
+        else:
+            if before is not None:
+                where += " AND (ir.created_at < %s OR (ir.created_at = %s AND ir.id < %s))"
+                params += [before[0], before[0], before[1]]
+            order = "ir.created_at DESC, ir.id DESC"
         
         cursor.execute(
             """
@@ -1044,47 +1488,57 @@ def get_user_incident_reports(user_id):
                 ir.longitude,
                 ir.severity,
                 ir.incident_type,
-                ir.description,
-                ir.place_name,
+                COALESCE(ir.description, '') AS description,
+                COALESCE(ir.place_name, '') AS place_name,
                 ir.location_type,
                 ir.is_verified,
                 ir.created_at,
                 ir.updated_at
             FROM incident_reports ir
-            WHERE ir.user_id = %s
-            ORDER BY ir.created_at DESC
+            WHERE """ + where + """
+            ORDER BY """ + order + """
+            LIMIT %s
             """,
-            (user_id,)
+            params + [limit + 1]
         )
         reports = cursor.fetchall()
+        has_more = len(reports) > limit
+        reports = reports[:limit]
+
+        if since is not None:
+            next_cursor = max(map(incident_cursor_key, reports), default=since)
+            next_page = None
+        else:
+            # Delta cursor covers the whole history, not just this page
+            next_cursor = None
+            if before is None:
+                cursor.execute(
+                    """
+                    SELECT id, created_at, updated_at FROM incident_reports
+                    WHERE user_id = %s
+                    ORDER BY updated_at DESC, id DESC
+                    LIMIT 1
+                    """,
+                    (user_id,)
+                )
+                newest = cursor.fetchone()
+                next_cursor = incident_cursor_key(newest) if newest else None
+            next_page = format_cursor(created_cursor_key(reports[-1])) if has_more else None
         
         cursor.close()
         db.close()
 
-        formatted_reports = []
-        for report in reports:
-            relative_time = get_relative_time(report["created_at"])
-            
-            formatted_reports.append({
-                "id": report["id"],
-                "latitude": float(report["latitude"]),
-                "longitude": float(report["longitude"]),
-                "severity": report["severity"],
-                "incident_type": report["incident_type"],
-                "description": report["description"] or "",
-                "place_name": report["place_name"] or "",
-                "location_type": report["location_type"],
-                "is_verified": bool(report["is_verified"]),
-                "created_at": report["created_at"].isoformat() if report["created_at"] else None,
-                "relative_time": relative_time, 
-                "updated_at": report["updated_at"].isoformat() if report["updated_at"] else None,
-            })
+        formatted_reports = [public_incident(report) for report in reports]
         
-        return jsonify({
+        return conditional_json({
             "success": True, 
             "reports": formatted_reports,
-            "count": len(formatted_reports)
-        }), 200
+            "count": len(formatted_reports),
+            "cursor": format_cursor(next_cursor),
+            "delta": since is not None,
+            "has_more": has_more,
+            "next_cursor": next_page,
+        })
         
     except Exception as e:
         logger.error(f"Get user reports error: {e}")
@@ -1107,29 +1561,8 @@ def create_tracking_session():
 
         session_id = secrets.token_urlsafe(16)
 
-        expires_at = None
-        if duration_minutes > 0:
-            expires_at = datetime.now() + timedelta(minutes=duration_minutes)
-
-        initial_location = {
-            "lat": float(latitude),
-            "lng": float(longitude),
-            "timestamp": datetime.now().isoformat(),
-            "speed": 0,
-            "accuracy": 0
-        }
-
-        tracking_sessions[session_id] = {
-            "user_id": user_id,
-            "user_name": user_name,
-            "locations": [initial_location],
-            "created_at": datetime.now().isoformat(),
-            "expires_at": expires_at.isoformat() if expires_at else None,
-            "is_active": True,
-            "last_updated": datetime.now().isoformat(),
-            "duration_minutes": duration_minutes,
-            "total_updates": 1
-        }
+        session = TrackingSession(user_id, user_name, float(latitude), float(longitude), duration_minutes)
+        tracking_store.create(session_id, session)
         
         # ====== accessible URL ======
         public_url = None
@@ -1179,7 +1612,7 @@ def create_tracking_session():
             "success": True,
             "session_id": session_id,
             "tracking_url": tracking_url,
-            "expires_at": expires_at.isoformat() if expires_at else None,
+            "expires_at": iso(session.expires_at),
             "message": "Tracking session created successfully"
         }), 200
         
@@ -1187,71 +1620,140 @@ def create_tracking_session():
         logger.error(f"Create tracking session error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Most fixes accepted in one /update_locations or location_batch call
+TRACK_BATCH_MAX = int(os.getenv("TRACK_BATCH_MAX", "500"))
+
+
+def tracking_session_error(session_id, now):
+    """(payload, status) when the session cannot take fixes, else None."""
+    session = tracking_store.get(session_id, locations=False) if session_id else None
+    if session is None:
+        return {"success": False, "error": "Invalid session"}, 404
+    if session.expired(now):
+        tracking_store.stop(session_id)
+        socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
+        return {"success": False, "error": "Session expired"}, 400
+    if not session.is_active:
+        return {"success": False, "error": "Session stopped"}, 400
+    return None
+
+
+def parse_fixes(items, now):
+    """(seq, lat, lng, ts, speed, accuracy) tuples from a batch's fixes; raises on a bad fix."""
+    return [
+        (
+            int(item["seq"]),
+            float(item["latitude"]),
+            float(item["longitude"]),
+            parse_timestamp(item.get("timestamp"), now),
+            float(item.get("speed") or 0),
+            float(item.get("accuracy") or 0),
+        )
+        for item in items
+    ]
+
+
+def ingest_location_batch(session_id, data):
+    """Apply a batch of sequenced fixes and publish them as one location_update.
+
+    Fixes at or below the session's last_seq (retransmits) are dropped and
+    the rest applied in seq order, so a phone can resend its whole buffer
+    until a response acknowledges it. Returns (payload, status).
+    """
+    now = time.time()
+    error = tracking_session_error(session_id, now)
+    if error:
+        return error
+
+    items = data.get("fixes")
+    if not isinstance(items, list) or not items:
+        return {"success": False, "error": "fixes required"}, 400
+    if len(items) > TRACK_BATCH_MAX:
+        return {"success": False, "error": f"At most {TRACK_BATCH_MAX} fixes per batch"}, 400
+    try:
+        fixes = parse_fixes(items, now)
+    except (KeyError, TypeError, ValueError):
+        return {"success": False, "error": "Each fix needs seq, latitude and longitude"}, 400
+
+    added = tracking_store.add_locations(session_id, fixes, now=now)
+    if added is None:
+        return {"success": False, "error": "Invalid session"}, 404
+    records, total_updates, last_seq = added
+
+    if records:
+        location_broadcaster.publish(session_id, [location_dict(record) for record in records], total_updates)
+
+    return {
+        "success": True,
+        "accepted": len(records),
+        "duplicates": len(fixes) - len(records),
+        "last_seq": last_seq,
+        "total_updates": total_updates,
+    }, 200
+
+
 @app.route("/update_location/<session_id>", methods=["POST"])
 def update_location(session_id):
     try:
         data = request.json or {}
-        
-        if session_id not in tracking_sessions:
-            return jsonify({"success": False, "error": "Invalid session"}), 404
-        
-        session = tracking_sessions[session_id]
 
-        if session["expires_at"]:
-            if datetime.now() > datetime.fromisoformat(session["expires_at"]):
-                session["is_active"] = False
-                socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
-                return jsonify({"success": False, "error": "Session expired"}), 400
-        
-        if not session["is_active"]:
-            return jsonify({"success": False, "error": "Session stopped"}), 400
+        now = time.time()
+        error = tracking_session_error(session_id, now)
+        if error:
+            payload, status = error
+            return jsonify(payload), status
         
         latitude = data.get("latitude")
         longitude = data.get("longitude")
-        timestamp = data.get("timestamp", datetime.now().isoformat())
         
         if not all([latitude, longitude]):
             return jsonify({"success": False, "error": "Location required"}), 400
 
-        new_location = {
-            "lat": float(latitude),
-            "lng": float(longitude),
-            "timestamp": timestamp,
-            "speed": data.get("speed", 0),
-            "accuracy": data.get("accuracy", 0)
-        }
-
-        session["locations"].append(new_location)
-        if len(session["locations"]) > 100:
-            session["locations"] = session["locations"][-100:]
-        
-        session["last_updated"] = datetime.now().isoformat()
-        session["total_updates"] += 1
+        added = tracking_store.add_location(
+            session_id,
+            float(latitude),
+            float(longitude),
+            parse_timestamp(data.get("timestamp"), now),
+            float(data.get("speed") or 0),
+            float(data.get("accuracy") or 0),
+            now=now,
+        )
+        if added is None:
+            return jsonify({"success": False, "error": "Invalid session"}), 404
+        record, total_updates = added
+        new_location = location_dict(record)
 
-        socketio.emit('location_update', {
-            'session_id': session_id,
-            'location': new_location,
-            'total_updates': session["total_updates"]
-        }, room=session_id)
+        location_broadcaster.publish(session_id, [new_location], total_updates)
         
         logger.debug(f"Location updated for session {session_id}: {latitude}, {longitude}")
         
         return jsonify({
             "success": True,
             "message": "Location updated",
-            "total_updates": session["total_updates"],
-            "timestamp": timestamp
+            "total_updates": total_updates,
+            "timestamp": new_location["timestamp"]
         }), 200
         
     except Exception as e:
         logger.error(f"Update location error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/update_locations/<session_id>", methods=["POST"])
+def update_locations(session_id):
+    """Batch of buffered fixes: {"fixes": [{seq, latitude, longitude, timestamp, ...}]}"""
+    try:
+        payload, status = ingest_location_batch(session_id, request.json or {})
+        return jsonify(payload), status
+    except Exception as e:
+        logger.error(f"Update locations error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route("/track/<session_id>", methods=["GET"])
 def view_tracking(session_id):
     """Render live tracking page"""
     try:
-        if session_id not in tracking_sessions:
+        session = tracking_store.get(session_id)
+        if session is None:
             html_404 = '''<!DOCTYPE html>
 <html>
 <head>
@@ -1288,8 +1790,7 @@ def view_tracking(session_id):
 </html>'''
             return html_404, 404
         
-        session = tracking_sessions[session_id]
-        latest_location = session["locations"][-1] if session["locations"] else None
+        latest_location = session.latest_location()
 
         server_host = request.host
         if ':' not in server_host:
@@ -1303,7 +1804,7 @@ def view_tracking(session_id):
         initial_lat = latest_location['lat'] if latest_location else 0
         initial_lng = latest_location['lng'] if latest_location else 0
         
-        user_name = session['user_name'].replace('"', '&quot;').replace("'", "&#39;")
+        user_name = session.user_name.replace('"', '&quot;').replace("'", "&#39;")
         
         html_content = f'''<!DOCTYPE html>
 <html>
@@ -1510,7 +2011,7 @@ def view_tracking(session_id):
             </div>
             <div class="location-item">
                 <span class="location-label">UPDATES</span>
-                <span class="location-value" id="updateCount">{session['total_updates']}</span>
+                <span class="location-value" id="updateCount">{session.total_updates}</span>
             </div>
             <div class="location-item">
                 <span class="location-label">STATUS</span>
@@ -1595,6 +2096,10 @@ def view_tracking(session_id):
             socket.on('location_update', function(data) {{
                 console.log('Location update received:', data);
                 if (data.session_id === '{session_id}') {{
+                    // Batched updates carry every new fix; the last one moves the marker
+                    (data.fixes || []).slice(0, -1).forEach(function(fix) {{
+                        locationsHistory.push([fix.lat, fix.lng]);
+                    }});
                     updateLocation(
                         data.location.lat,
                         data.location.lng,
@@ -1650,7 +2155,7 @@ def view_tracking(session_id):
 
             locationsHistory.push([lat, lng]);
             if (locationsHistory.length > 100) {{
-                locationsHistory.shift();
+                locationsHistory = locationsHistory.slice(-100);
             }}
             updatePolyline();
 
@@ -1727,23 +2232,24 @@ def view_tracking_debug(session_id):
     """Debug version to see what's happening"""
     try:
         logger.info(f"Tracking page requested for: {session_id}")
-        logger.info(f"Active sessions: {list(tracking_sessions.keys())}")
+        available = tracking_store.ids()
+        logger.info(f"Active sessions: {available}")
         
-        if session_id not in tracking_sessions:
+        session = tracking_store.get(session_id)
+        if session is None:
             return jsonify({
                 "error": "Session not found",
                 "requested_session": session_id,
-                "available_sessions": list(tracking_sessions.keys())
+                "available_sessions": available
             }), 404
         
-        session = tracking_sessions[session_id]
         return jsonify({
             "success": True,
             "session_exists": True,
-            "user_name": session['user_name'],
-            "is_active": session['is_active'],
-            "total_updates": session['total_updates'],
-            "locations_count": len(session['locations'])
+            "user_name": session.user_name,
+            "is_active": session.is_active,
+            "total_updates": session.total_updates,
+            "locations_count": len(session.locations)
         }), 200
         
     except Exception as e:
@@ -1754,17 +2260,15 @@ def view_tracking_debug(session_id):
 @app.route("/get_latest_location/<session_id>", methods=["GET"])
 def get_latest_location(session_id):
     """Get the latest location for a session (for HTTP polling fallback)"""
-    if session_id not in tracking_sessions:
+    session = tracking_store.get(session_id)
+    if session is None:
         return jsonify({"success": False, "error": "Session not found"}), 404
     
-    session = tracking_sessions[session_id]
-    latest_location = session["locations"][-1] if session["locations"] else None
-    
     return jsonify({
         "success": True,
-        "latest_location": latest_location,
-        "total_updates": session["total_updates"],
-        "is_active": session["is_active"]
+        "latest_location": session.latest_location(),
+        "total_updates": session.total_updates,
+        "is_active": session.is_active
     }), 200
 
 
@@ -1777,36 +2281,50 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """When a WebSocket client disconnects"""
+    tracking_store.disconnected(request.sid)
     logger.info(f"Client disconnected: {request.sid}")
 
 @socketio.on('join_session')
 def handle_join_session(data):
     """Client joins a specific tracking session"""
     session_id = data.get('session_id')
-    if session_id in tracking_sessions:
+    session = tracking_store.get(session_id) if session_id else None
+    if session is not None:
         join_room(session_id)
-        active_connections[session_id] = active_connections.get(session_id, 0) + 1
+        tracking_store.joined(session_id, request.sid)
 
-        session = tracking_sessions[session_id]
-        if session["locations"]:
-            latest = session["locations"][-1]
+        latest = session.latest_location()
+        if latest:
             emit('session_joined', {
                 'session_id': session_id,
-                'user_name': session['user_name'],
+                'user_name': session.user_name,
                 'latest_location': latest,
-                'total_updates': session['total_updates'],
-                'is_active': session['is_active']
+                'total_updates': session.total_updates,
+                'is_active': session.is_active
             }, room=request.sid)  # Send only to this client
         
         logger.info(f"Client joined session: {session_id}")
 
 
+@socketio.on('location_batch')
+def handle_location_batch(data):
+    """Phone streams a batch of fixes over its socket; the result is the ack"""
+    data = data or {}
+    try:
+        payload, _ = ingest_location_batch(data.get('session_id'), data)
+    except Exception as e:
+        logger.error(f"Location batch error: {e}")
+        payload = {"success": False, "error": str(e)}
+    return payload
+
+
 @socketio.on('leave_session')
 def handle_leave_session(data):
     """Client leaves a tracking session"""
     session_id = data.get('session_id')
-    if session_id in tracking_sessions:
+    if session_id:
         leave_room(session_id)
+        tracking_store.left(session_id, request.sid)
         logger.info(f"Client left session: {session_id}")
 
 
@@ -1816,10 +2334,8 @@ def stop_tracking_session():
         data = request.json or {}
         session_id = data.get("session_id")
         
-        if session_id not in tracking_sessions:
+        if not session_id or not tracking_store.stop(session_id):
             return jsonify({"success": False, "error": "Invalid session"}), 404
-        
-        tracking_sessions[session_id]["is_active"] = False
 
         socketio.emit('session_ended', {'session_id': session_id}, room=session_id)
         
@@ -1847,49 +2363,92 @@ def safe_route():
     if not start or not end:
         return jsonify({"success": False, "error": "Invalid coordinates"}), 400
 
+    try:
+        geometry, tolerance_m = geometry_options(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
     speed = TRAVEL_SPEEDS.get(mode, 4.5)
-    print(f"SafeRoute | mode={mode} | multiple={multiple}")
-
-    INCIDENT_TYPE_SEVERITY = {
-        "physical_assault": 10,
-        "stalking": 9,
-        "theft": 8,
-        "harassment": 6,
-        "eve_teasing": 5,
-        "verbal_abuse": 4,
-        "suspicious": 3,
-        "other": 5,
-    }
+    print(f"SafeRoute | mode={mode} | multiple={multiple} | geometry={geometry}")
+
+    direct_distance = float(haversine_km(
+        start["lat"], start["lng"],
+        end["lat"], end["lng"]
+    ))
 
-    direct_distance = geodesic(
-        (start["lat"], start["lng"]),
-        (end["lat"], end["lng"])
-    ).km
+    start_pt = (start["lat"], start["lng"])
+    end_pt = (end["lat"], end["lng"])
 
     # ---------- SHORT ROUTE ----------
-    if direct_distance < 0.1:
-        route = {
-            "type": "recommended",
-            "distance_km": round(direct_distance, 2),
-            "duration_min": int((direct_distance / speed) * 60),
-            "safety_score": 100,
-            "incident_count": 0,
-            "coords": [
-                (start["lat"], start["lng"]),
-                (end["lat"], end["lng"])
-            ]
-        }
+    if direct_distance < SHORT_ROUTE_KM:
         return jsonify({
             "success": True,
-            "routes": [route]
+            "routes": [direct_route(start_pt, end_pt, direct_distance, speed, geometry, tolerance_m)]
         }), 200
 
-    # ---------- INCIDENT FETCH ----------
-    buffer = 0.03
-    min_lat = min(start["lat"], end["lat"]) - buffer
-    max_lat = max(start["lat"], end["lat"]) + buffer
-    min_lng = min(start["lng"], end["lng"]) - buffer
-    max_lng = max(start["lng"], end["lng"]) + buffer
+    bbox = route_bbox(start_pt, end_pt)
+
+    key = route_cache.make_key(start_pt, end_pt, mode, bool(multiple), geometry, tolerance_m)
+    try:
+        routes = route_cache.get_or_compute(
+            key, bbox, lambda: compute_safe_routes(
+                start_pt, end_pt, bbox, speed, multiple, geometry=geometry, tolerance_m=tolerance_m
+            )
+        )
+    except RoutePoolBusy:
+        return jsonify({"success": False, "error": "Route service busy, please retry"}), 503, {"Retry-After": "1"}
+    except RouteTimeout:
+        return jsonify({"success": False, "error": "Route computation timed out"}), 503, {"Retry-After": "1"}
+
+    return jsonify({
+        "success": True,
+        "routes": routes
+    }), 200
+
+
+# Below this straight-line distance (km) the route is just the segment
+SHORT_ROUTE_KM = 0.1
+
+
+# Largest Douglas-Peucker tolerance a client may ask for, in metres
+MAX_SIMPLIFY_TOLERANCE_M = 100.0
+
+
+def geometry_options(data):
+    """(geometry, tolerance_m) requested for route output; ValueError if invalid."""
+    geometry = data.get("geometry", "coords")
+    if geometry not in ROUTE_GEOMETRIES:
+        raise ValueError(f"geometry must be one of {', '.join(ROUTE_GEOMETRIES)}")
+    try:
+        tolerance_m = float(data.get("tolerance_m", SIMPLIFY_TOLERANCE_M))
+    except (TypeError, ValueError):
+        raise ValueError("tolerance_m must be a number")
+    return geometry, min(max(tolerance_m, 0.0), MAX_SIMPLIFY_TOLERANCE_M)
+
+
+def direct_route(start, end, distance_km, speed, geometry="coords", tolerance_m=SIMPLIFY_TOLERANCE_M):
+    route = {
+        "type": "recommended",
+        "distance_km": round(distance_km, 2),
+        "duration_min": int((distance_km / speed) * 60),
+        "safety_score": 100,
+        "incident_count": 0,
+        "exposure": 0.0,
+        "minutes_near_incidents": 0.0,
+        "hotspots": [],
+    }
+    route.update(route_geometry([start, end], geometry, tolerance_m))
+    return route
+
+
+def fetch_route_incidents(bbox, limit=50):
+    """Decayed incidents inside bbox, as [{"lat", "lng", "severity"}, ...].
+
+    Served from the in-memory incident store (no row cap); the MySQL query,
+    capped at `limit` rows, is only used until the store has loaded.
+    """
+    if incident_store.ready:
+        return incident_store.route_incidents(bbox)
 
     db = get_db()
     cursor = db.cursor(dictionary=True)
@@ -1900,11 +2459,10 @@ def safe_route():
                    COALESCE(severity, NULL) AS severity,
                    TIMESTAMPDIFF(HOUR, created_at, NOW()) AS hours_old
             FROM incident_reports
-            WHERE latitude BETWEEN %s AND %s
-              AND longitude BETWEEN %s AND %s
+            WHERE """ + INCIDENT_BBOX_SQL + """
               AND created_at >= NOW() - INTERVAL 180 DAY
-            LIMIT 50
-        """, (min_lat, max_lat, min_lng, max_lng))
+            LIMIT %s
+        """, incident_bbox_params(bbox) + (limit,))
         rows = cursor.fetchall()
     finally:
         cursor.close()
@@ -1918,113 +2476,322 @@ def safe_route():
             else INCIDENT_TYPE_SEVERITY.get(r["incident_type"], 5)
         )
 
-        days_old = (r["hours_old"] or 0) / 24
-        decay = 1.0 if days_old <= 7 else 0.7 if days_old <= 30 else 0.4 if days_old <= 90 else 0.2
+        decay = float(decay_weights((r["hours_old"] or 0) / 24))
 
         incidents.append({
             "lat": float(r["latitude"]),
             "lng": float(r["longitude"]),
             "severity": base_sev * decay
         })
+    return incidents
 
-    try:
-        path = a_star_safe_path(
-            (start["lat"], start["lng"]),
-            (end["lat"], end["lng"]),
-            incidents,
-            max_time=2.0
+
+def compute_safe_routes(start, end, bbox, speed, multiple=False, incidents=None, incident_index=None,
+                        geometry="coords", tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """Uncached /safe_route work: incident fetch, search(es) and scoring.
+
+    Batch requests pass incidents already fetched for a larger area and the
+    index built over them; searches then only get the ones inside `bbox`.
+    """
+    if incidents is None:
+        incidents = fetch_route_incidents(bbox)
+    if incident_index is None:
+        incident_index = IncidentIndex.from_incidents(incidents)
+
+    if incident_store.ready:
+        # Workers read the bbox from the published store themselves
+        local = shared_incidents.publish()
+    else:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        inside = np.flatnonzero(
+            (incident_index.lats >= min_lat) & (incident_index.lats <= max_lat)
+            & (incident_index.lngs >= min_lng) & (incident_index.lngs <= max_lng)
         )
-    except:
-        path = [(start["lat"], start["lng"]), (end["lat"], end["lng"])]
+        local = [incidents[i] for i in inside] if len(inside) < len(incidents) else incidents
+
+    return [
+        summarize_route(route_type, path, incident_index, speed, geometry, tolerance_m)
+        for route_type, path in find_routes(
+            start, end, local, bbox, route_pool, multiple=multiple, time_budget=ROUTE_TIME_BUDGET
+        )
+    ]
+
+
+# Upper bound on origin/destination pairs per /safe_route/batch request
+ROUTE_BATCH_MAX = int(os.getenv("ROUTE_BATCH_MAX", "50"))
+
+
+@app.route("/safe_route/batch", methods=["POST"])
+def safe_route_batch():
+    """Route many OD pairs with one incident query, streamed as NDJSON.
+
+    Each line is {"index", "id"?, "success", "routes" | "error"} with routes
+    in the /safe_route schema, written as soon as that pair is done.
+    """
+    data = request.json or {}
+    pairs = data.get("pairs")
+    mode = data.get("mode", "walk")
+    multiple = bool(data.get("multiple", False))
+
+    try:
+        geometry, tolerance_m = geometry_options(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({"success": False, "error": "pairs must be a non-empty list"}), 400
+    if len(pairs) > ROUTE_BATCH_MAX:
+        return jsonify({"success": False, "error": f"At most {ROUTE_BATCH_MAX} pairs per batch"}), 400
+
+    try:
+        points = [
+            ((float(p["start"]["lat"]), float(p["start"]["lng"])),
+             (float(p["end"]["lat"]), float(p["end"]["lng"])))
+            for p in pairs
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid coordinates"}), 400
+
+    speed = TRAVEL_SPEEDS.get(mode, 4.5)
+    print(f"SafeRoute batch | pairs={len(points)} | mode={mode} | multiple={multiple}")
 
-    distance_km = sum(
-        geodesic(path[i], path[i + 1]).km
-        for i in range(len(path) - 1)
+    bboxes = [route_bbox(start, end) for start, end in points]
+    union = (
+        min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes), max(b[3] for b in bboxes),
     )
+    try:
+        incidents = fetch_route_incidents(union, limit=50 * len(points))
+    except Exception as e:
+        logger.error(f"Batch incident fetch error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    incident_index = IncidentIndex.from_incidents(incidents)
+
+    def route_pair(k):
+        start, end = points[k]
+        distance = float(haversine_km(start[0], start[1], end[0], end[1]))
+        if distance < SHORT_ROUTE_KM:
+            return [direct_route(start, end, distance, speed, geometry, tolerance_m)]
+        return route_cache.get_or_compute(
+            route_cache.make_key(start, end, mode, multiple, geometry, tolerance_m),
+            bboxes[k],
+            lambda: compute_safe_routes(
+                start, end, bboxes[k], speed, multiple,
+                incidents=incidents, incident_index=incident_index,
+                geometry=geometry, tolerance_m=tolerance_m,
+            ),
+        )
 
-    duration_min = int((distance_km / speed) * 60)
+    def generate():
+        # Threads only wait on route_pool futures; the searches run in its workers
+        with ThreadPoolExecutor(max_workers=min(len(points), ROUTE_WORKERS)) as executor:
+            futures = {executor.submit(route_pair, k): k for k in range(len(points))}
+            for fut in as_completed(futures):
+                k = futures[fut]
+                line = {"index": k}
+                if isinstance(pairs[k], dict) and "id" in pairs[k]:
+                    line["id"] = pairs[k]["id"]
+                try:
+                    line.update(success=True, routes=fut.result())
+                except RoutePoolBusy:
+                    line.update(success=False, error="Route service busy, please retry")
+                except RouteTimeout:
+                    line.update(success=False, error="Route computation timed out")
+                except Exception as e:
+                    logger.error(f"Batch route error: {e}")
+                    line.update(success=False, error=str(e))
+                yield app.json.dumps(line) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+# ========== HEATMAP TILES ==========
+@app.route("/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+@app.route("/tiles/<int:z>/<int:x>/<int:y>.<fmt>", methods=["GET"])
+def incident_tile(z, x, y, fmt=None):
+    """Time-decayed incident density for one slippy-map tile (PNG or JSON grid)."""
+    fmt = (fmt or request.args.get("format", "png")).lower()
+    if fmt not in tiles.TILE_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {sorted(tiles.TILE_FORMATS)}"}), 400
+    if not tiles.valid_tile(z, x, y):
+        return jsonify({
+            "success": False,
+            "error": f"Tile out of range (zoom {tiles.MIN_ZOOM}-{tiles.MAX_ZOOM})",
+        }), 404
+    if not incident_store.ready:
+        return jsonify({"success": False, "error": "Incident store is loading"}), 503, {"Retry-After": "5"}
 
-    incident_hits = set()
-    for p in path[::max(1, len(path)//5)]:
-        for inc in incidents:
-            if geodesic(p, (inc["lat"], inc["lng"])).km < 1.5:
-                incident_hits.add((inc["lat"], inc["lng"]))
+    try:
+        body, etag = tile_cache.get_or_render(
+            (z, x, y, fmt),
+            lambda: tiles.render_tile(z, x, y, fmt, incident_store.query_bbox),
+        )
+    except Exception as e:
+        logger.error(f"Tile render error {z}/{x}/{y}.{fmt}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
-    incident_count = len(incident_hits)
+    response = Response(body, mimetype=tiles.TILE_FORMATS[fmt])
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={TILE_MAX_AGE}"
+    return response.make_conditional(request)
 
-    safety_score = 100
-    if incident_count >= 12: safety_score -= 80
-    elif incident_count >= 8: safety_score -= 60
-    elif incident_count >= 5: safety_score -= 40
-    elif incident_count >= 3: safety_score -= 20
-    elif incident_count >= 1: safety_score -= 10
 
-    safety_score = max(0, min(100, safety_score))
+@app.route("/metrics/route_cache", methods=["GET"])
+def route_cache_metrics():
+    return jsonify({"success": True, "route_cache": route_cache.stats()}), 200
 
-    base_route = {
-        "type": "recommended",
-        "distance_km": round(distance_km, 2),
-        "duration_min": duration_min,
-        "safety_score": safety_score,
-        "incident_count": incident_count,
-        "coords": path[:100],
+
+@app.route("/metrics/incident_store", methods=["GET"])
+def incident_store_metrics():
+    return jsonify({"success": True, "incident_store": incident_store.stats()}), 200
+
+
+@app.route("/metrics/tiles", methods=["GET"])
+def tile_cache_metrics():
+    return jsonify({"success": True, "tiles": tile_cache.stats()}), 200
+
+
+@app.route("/metrics/tracking", methods=["GET"])
+def tracking_metrics():
+    return jsonify({
+        "success": True,
+        "tracking": tracking_store.stats(),
+        "broadcast": location_broadcaster.stats(),
+    }), 200
+
+
+@app.route("/metrics/route_pool", methods=["GET"])
+def route_pool_metrics():
+    return jsonify({
+        "success": True,
+        "route_pool": route_pool.stats(),
+        "shared_incidents": shared_incidents.stats(),
+    }), 200
+
+
+# ========== NAVIGATION (INCREMENTAL REROUTE) ==========
+@app.route("/navigation/start", methods=["POST"])
+def start_navigation():
+    data = request.json or {}
+
+    start = data.get("start")
+    end = data.get("end")
+    mode = data.get("mode", "walk")
+
+    if not start or not end:
+        return jsonify({"success": False, "error": "Invalid coordinates"}), 400
+
+    try:
+        geometry, tolerance_m = geometry_options(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        start_pt = (float(start["lat"]), float(start["lng"]))
+        end_pt = (float(end["lat"]), float(end["lng"]))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid coordinates"}), 400
+
+    meta = {
+        "mode": mode,
+        "user_id": data.get("user_id"),
+        "speed": TRAVEL_SPEEDS.get(mode, 4.5),
+        "geometry": geometry,
+        "tolerance_m": tolerance_m,
     }
+    try:
+        nav_id, route, stats = nav_sessions.start(start_pt, end_pt, navigation_incidents(route_bbox(start_pt, end_pt)), meta)
+    except (RoutePoolBusy, FutureTimeout):
+        return jsonify({"success": False, "error": "Navigation service busy, please retry"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        logger.error(f"Navigation start error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
-    routes = [base_route]
+    if route is None:
+        return jsonify({"success": False, "error": "Route computation timed out"}), 503, {"Retry-After": "1"}
 
-    if multiple:
+    return jsonify({
+        "success": True,
+        "nav_session_id": nav_id,
+        "route": route,
+        "repair": stats,
+    }), 201
 
-        # ----- Shorter route -----
-        short_distance = distance_km * 0.95
-        short_duration = int((short_distance / speed) * 60)
 
-        routes.append({
-            **base_route,
-            "type": "shorter",
-            "distance_km": round(short_distance, 2),
-            "duration_min": short_duration,
-            "incident_count": incident_count + 2,
-            "safety_score": max(0, safety_score - 15),
-        })
+@app.route("/navigation/<nav_id>/position", methods=["POST"])
+def update_navigation_position(nav_id):
+    data = request.json or {}
+    lat = data.get("lat", data.get("latitude"))
+    lng = data.get("lng", data.get("longitude"))
 
-        # ----- Fastest route -----
-        fast_distance = distance_km * 0.9
-        fast_duration = int((fast_distance / speed) * 60)
-
-        routes.append({
-            **base_route,
-            "type": "fastest",
-            "distance_km": round(fast_distance, 2),
-            "duration_min": fast_duration,
-            "incident_count": incident_count + 4,
-            "safety_score": max(0, safety_score - 30),
-        })
+    try:
+        position = (float(lat), float(lng))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid coordinates"}), 400
+
+    try:
+        result = nav_sessions.update(nav_id, position, navigation_incidents())
+    except (RoutePoolBusy, FutureTimeout):
+        # Search state is kept; the next update resumes the repair
+        return jsonify({"success": False, "error": "Route repair in progress"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        logger.error(f"Navigation update error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    if result is None:
+        return jsonify({"success": False, "error": "Navigation session not found"}), 404
+
+    route, stats, replanned = result
+    if route is None:
+        return jsonify({"success": False, "error": "Route repair in progress"}), 503, {"Retry-After": "1"}
 
     return jsonify({
         "success": True,
-        "routes": routes
+        "route": route,
+        "replanned": replanned,
+        "repair": stats,
     }), 200
-    
+
+
+def navigation_incidents(bbox=None):
+    """Incident source for navigation jobs: the shared store once loaded, else rows from the DB.
+
+    Updates pass no bbox; until the store loads, a replan keeps the session's incidents.
+    """
+    if incident_store.ready:
+        return shared_incidents.publish()
+    return fetch_route_incidents(bbox) if bbox is not None else None
+
+
+@app.route("/navigation/<nav_id>/stop", methods=["POST"])
+def stop_navigation(nav_id):
+    try:
+        removed = nav_sessions.stop(nav_id)
+    except (RoutePoolBusy, FutureTimeout):
+        return jsonify({"success": False, "error": "Navigation service busy, please retry"}), 503, {"Retry-After": "1"}
+    if not removed:
+        return jsonify({"success": False, "error": "Navigation session not found"}), 404
+    return jsonify({"success": True, "message": "Navigation stopped"}), 200
+
+
+@app.route("/metrics/navigation", methods=["GET"])
+def navigation_metrics():
+    try:
+        stats = nav_sessions.stats()
+    except (RoutePoolBusy, FutureTimeout):
+        return jsonify({"success": False, "error": "Navigation service busy, please retry"}), 503, {"Retry-After": "1"}
+    return jsonify({"success": True, "navigation": stats}), 200
+
 
 
 @app.route("/get_session_info/<session_id>", methods=["GET"])
 def get_session_info(session_id):
     """API endpoint to get session info (for mobile app)"""
-    if session_id not in tracking_sessions:
+    session = tracking_store.get(session_id)
+    if session is None:
         return jsonify({"success": False, "error": "Session not found"}), 404
     
-    session = tracking_sessions[session_id]
-    return jsonify({
-        "success": True,
-        "session": {
-            "user_name": session["user_name"],
-            "created_at": session["created_at"],
-            "last_updated": session["last_updated"],
-            "is_active": session["is_active"],
-            "total_updates": session["total_updates"],
-            "latest_location": session["locations"][-1] if session["locations"] else None
-        }
-    }), 200
+    return jsonify({"success": True, "session": session.info()}), 200
 
 
 # ========message generation endpoints==========
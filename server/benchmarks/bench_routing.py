@@ -0,0 +1,335 @@
+"""Offline routing benchmark on synthetic incident datasets.
+
+Generates reproducible incident distributions over a city-sized area and
+times the safe-route search on a fixed set of origin/destination pairs,
+without MySQL or Flask. Reports latency percentiles, nodes expanded,
+distance-function calls and path quality per (dataset, size, method), and
+writes everything to JSON so runs on different commits can be compared:
+
+    python server/benchmarks/bench_routing.py --out before.json
+    git checkout <other commit>
+    python server/benchmarks/bench_routing.py --out after.json --compare before.json
+
+Pass ``--road-network roads.geojson`` to include the road-graph search.
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo_math  # noqa: E402
+from exposure import score_path  # noqa: E402
+from geo_math import haversine_km, path_length_km  # noqa: E402
+from incident_index import IncidentIndex  # noqa: E402
+from road_graph import load_road_graph  # noqa: E402
+from routing import (  # noqa: E402
+    a_star_safe_path,
+    build_risk_field,
+    search_route,
+    set_road_graph,
+)
+
+# Calls and evaluated point pairs per distance function during a search
+_calls = Counter()
+
+
+def _counted(name, fn):
+    @functools.wraps(fn)
+    def wrapper(lat1, lng1, lat2, lng2, *args, **kwargs):
+        _calls[name] += 1
+        _calls[name + "_points"] += np.broadcast(lat1, lng1, lat2, lng2).size
+        return fn(lat1, lng1, lat2, lng2, *args, **kwargs)
+    return wrapper
+
+
+def count_distance_calls():
+    """Wrap geo_math's distance functions with counters, here only.
+
+    The routing modules bind them with ``from geo_math import ...``, so
+    every loaded module holding the original function gets the wrapper.
+    """
+    for name in ("haversine", "equirectangular"):
+        attr = name + "_km"
+        original = getattr(geo_math, attr)
+        wrapped = _counted(name, original)
+        for module in list(sys.modules.values()):
+            if getattr(module, attr, None) is original:
+                setattr(module, attr, wrapped)
+
+
+def call_counts():
+    return dict(_calls)
+
+
+def reset_call_counts():
+    _calls.clear()
+
+
+# Bengaluru-sized study area: (min_lat, min_lng, max_lat, max_lng)
+AREA = (12.85, 77.45, 13.10, 77.75)
+DATASETS = ("uniform", "clustered", "hotspot")
+SIZES = (10, 100, 1000, 10000, 100000)
+METHODS = ("lattice", "lattice_bidir", "search")
+
+# Same incident area as app.route_bbox, and app.TRAVEL_SPEEDS["walk"]
+ROUTE_BUFFER = 0.03
+WALK_SPEED_KMH = 4.5
+
+
+def make_incidents(kind, size, rng):
+    """Synthetic [{"lat", "lng", "severity"}, ...] of the given distribution."""
+    min_lat, min_lng, max_lat, max_lng = AREA
+    if kind == "uniform":
+        lats = rng.uniform(min_lat, max_lat, size)
+        lngs = rng.uniform(min_lng, max_lng, size)
+        sev = rng.uniform(0.2, 5.0, size)
+    elif kind == "clustered":
+        # Neighbourhood-scale clusters (~1 km spread)
+        centers = rng.uniform((min_lat, min_lng), (max_lat, max_lng), (max(1, size // 50), 2))
+        pick = rng.integers(len(centers), size=size)
+        lats = centers[pick, 0] + rng.normal(0, 0.01, size)
+        lngs = centers[pick, 1] + rng.normal(0, 0.01, size)
+        sev = rng.uniform(0.2, 5.0, size)
+    elif kind == "hotspot":
+        # A handful of very dense, severe hotspots over a sparse background
+        centers = rng.uniform((min_lat, min_lng), (max_lat, max_lng), (5, 2))
+        hot = size * 4 // 5
+        pick = rng.integers(len(centers), size=hot)
+        lats = np.concatenate([centers[pick, 0] + rng.normal(0, 0.003, hot), rng.uniform(min_lat, max_lat, size - hot)])
+        lngs = np.concatenate([centers[pick, 1] + rng.normal(0, 0.003, hot), rng.uniform(min_lng, max_lng, size - hot)])
+        sev = np.concatenate([rng.uniform(3.0, 8.0, hot), rng.uniform(0.2, 2.0, size - hot)])
+    else:
+        raise ValueError(f"unknown dataset {kind!r}")
+    return [
+        {"lat": float(a), "lng": float(b), "severity": float(s)}
+        for a, b, s in zip(lats, lngs, sev)
+    ]
+
+
+def make_pairs(count, rng, min_km=1.0, max_km=10.0):
+    """Origin/destination pairs inside AREA with straight-line length in [min_km, max_km]."""
+    min_lat, min_lng, max_lat, max_lng = AREA
+    pairs = []
+    while len(pairs) < count:
+        start = (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+        end = (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+        if min_km <= float(haversine_km(start[0], start[1], end[0], end[1])) <= max_km:
+            pairs.append((start, end))
+    return pairs
+
+
+def route_bbox(start, end, buffer=ROUTE_BUFFER):
+    return (
+        min(start[0], end[0]) - buffer,
+        min(start[1], end[1]) - buffer,
+        max(start[0], end[0]) + buffer,
+        max(start[1], end[1]) + buffer,
+    )
+
+
+def incidents_in(incidents, lats, lngs, bbox):
+    min_lat, min_lng, max_lat, max_lng = bbox
+    inside = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng))
+    return [incidents[i] for i in inside]
+
+
+def path_risk(path, index):
+    """Accumulated risk: sum of risk at each segment midpoint times its length."""
+    if len(path) < 2 or not len(index):
+        return 0.0
+    pts = np.asarray(path, dtype=float)
+    legs = haversine_km(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+    mids = (pts[:-1] + pts[1:]) / 2
+    return float(np.sum(index.risk_at(mids[:, 0], mids[:, 1]) * legs))
+
+
+def run_one(method, start, end, incidents, bbox, max_time):
+    """(path, stats) for one search with `method`; prints are swallowed."""
+    stats = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        if method == "search":
+            path = search_route(start, end, incidents, bbox, max_time=max_time)
+        else:
+            t0 = time.perf_counter()
+            field = build_risk_field(start, end, incidents, bbox=bbox)
+            stats["field_ms"] = (time.perf_counter() - t0) * 1000
+            bidir = method == "lattice_bidir"
+            path = a_star_safe_path(
+                start, end, incidents, max_time=max_time, risk_field=field,
+                bidirectional=bidir, stats=stats,
+            )
+    return path, stats
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return None
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p90": round(float(np.percentile(values, 90)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def bench_case(method, pairs, incidents, max_time):
+    lats = np.array([inc["lat"] for inc in incidents])
+    lngs = np.array([inc["lng"] for inc in incidents])
+    rows = []
+    for start, end in pairs:
+        bbox = route_bbox(start, end)
+        local = incidents_in(incidents, lats, lngs, bbox)
+
+        reset_call_counts()
+        t0 = time.perf_counter()
+        path, stats = run_one(method, start, end, local, bbox, max_time)
+        elapsed = (time.perf_counter() - t0) * 1000
+        calls = call_counts()
+
+        straight = float(haversine_km(start[0], start[1], end[0], end[1]))
+        index = IncidentIndex.from_incidents(local)
+        exposure = score_path(path, index, WALK_SPEED_KMH)
+        rows.append({
+            "latency_ms": elapsed,
+            "field_ms": stats.get("field_ms"),
+            "expanded": stats.get("expanded"),
+            "lattice_nodes": stats.get("lattice_nodes"),
+            "reached": stats.get("reached", len(path) > 2),
+            "fallback": len(path) <= 2,
+            "haversine_calls": calls.get("haversine", 0),
+            "haversine_points": calls.get("haversine_points", 0),
+            "stretch": path_length_km(path) / straight,
+            "risk": path_risk(path, index),
+            "exposure": exposure["exposure"],
+            "safety_score": exposure["safety_score"],
+            "incidents": len(local),
+        })
+
+    def col(name):
+        return [r[name] for r in rows if r[name] is not None]
+
+    return {
+        "routes": len(rows),
+        "incidents_per_route": _summary(col("incidents")),
+        "latency_ms": _summary(col("latency_ms")),
+        "field_ms": _summary(col("field_ms")),
+        "expanded": _summary(col("expanded")),
+        "lattice_nodes": _summary(col("lattice_nodes")),
+        "haversine_calls": _summary(col("haversine_calls")),
+        "haversine_points": _summary(col("haversine_points")),
+        "stretch": _summary(col("stretch")),
+        "risk": _summary(col("risk")),
+        "exposure": _summary(col("exposure")),
+        "safety_score": _summary(col("safety_score")),
+        "reached_rate": round(float(np.mean(col("reached"))), 3),
+        "fallback_rate": round(float(np.mean(col("fallback"))), 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline):
+    """Print p50/p90 latency and expanded-node deltas against a baseline run."""
+    old = {(r["dataset"], r["size"], r["method"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline['meta'].get('commit')}:")
+    print(f"{'dataset':<10} {'size':>7} {'method':<14} {'p50 ms':>16} {'p90 ms':>16} {'expanded':>16}")
+
+    def delta(new, prev, field, stat):
+        a = (new.get(field) or {}).get(stat)
+        b = (prev.get(field) or {}).get(stat)
+        if a is None or b is None:
+            return "-"
+        pct = (a - b) / b * 100 if b else 0.0
+        return f"{a:.1f} ({pct:+.0f}%)"
+
+    for r in results:
+        prev = old.get((r["dataset"], r["size"], r["method"]))
+        if prev is None:
+            continue
+        print(
+            f"{r['dataset']:<10} {r['size']:>7} {r['method']:<14} "
+            f"{delta(r, prev, 'latency_ms', 'p50'):>16} {delta(r, prev, 'latency_ms', 'p90'):>16} "
+            f"{delta(r, prev, 'expanded', 'mean'):>16}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--datasets", default=",".join(DATASETS))
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--methods", default=",".join(METHODS))
+    parser.add_argument("--routes", type=int, default=20, help="OD pairs per case")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-time", type=float, default=2.0, help="per-search budget (s)")
+    parser.add_argument("--road-network", help="GeoJSON road extract for the 'search' method")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    if args.road_network:
+        set_road_graph(load_road_graph(args.road_network))
+    count_distance_calls()
+
+    pairs = make_pairs(args.routes, np.random.default_rng(args.seed))
+    results = []
+    print(f"{'dataset':<10} {'size':>7} {'method':<14} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'expanded':>9} {'stretch':>8} {'risk':>9} {'fallback':>8}")
+    for dataset in args.datasets.split(","):
+        for size in map(int, args.sizes.split(",")):
+            # Seeded per (dataset, size) so every case is reproducible on its own
+            incidents = make_incidents(dataset, size, np.random.default_rng([args.seed, size, DATASETS.index(dataset)]))
+            for method in args.methods.split(","):
+                case = bench_case(method, pairs, incidents, args.max_time)
+                case.update(dataset=dataset, size=size, method=method)
+                results.append(case)
+                lat = case["latency_ms"]
+                expanded = (case["expanded"] or {}).get("mean")
+                print(
+                    f"{dataset:<10} {size:>7} {method:<14} {lat['p50']:>9.1f} {lat['p90']:>9.1f} {lat['p99']:>9.1f} "
+                    f"{expanded if expanded is not None else '-':>9} {case['stretch']['mean']:>8.3f} "
+                    f"{case['risk']['mean']:>9.2f} {case['fallback_rate']:>8.2f}"
+                )
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "road_network": args.road_network,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    main()
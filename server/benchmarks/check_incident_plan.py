@@ -0,0 +1,171 @@
+"""Query-plan check for the incident_reports bbox query on a large table.
+
+Seeds a scratch copy of incident_reports (``CREATE TABLE ... LIKE``, so it
+has the same generated ``location`` column and SPATIAL index) with 1M+
+synthetic rows, then EXPLAINs and times the bbox query the server uses
+(INCIDENT_BBOX_SQL) next to the legacy latitude/longitude BETWEEN query.
+Exits non-zero if the spatial query does not use ``idx_location``:
+
+    python server/benchmarks/check_incident_plan.py --rows 1000000
+
+Uses the DB_* settings from server/.env. Pass ``--keep`` to leave the
+scratch table in place so later runs skip the seeding.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import mysql.connector
+import numpy as np
+from dotenv import load_dotenv
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from incident_store import INCIDENT_BBOX_SQL, incident_bbox_params  # noqa: E402
+
+SCRATCH_TABLE = "incident_reports_plan_check"
+SPATIAL_INDEX = "idx_location"
+INCIDENT_TYPES = ("harassment", "theft", "assault", "suspicious_activity", "stalking")
+
+# Dense city (Bengaluru) over a sparse state-wide (Karnataka) background
+CITY = (12.85, 77.45, 13.10, 77.75)
+STATE = (11.5, 74.0, 18.45, 78.6)
+
+# (name, bbox): a short walking route (app.route_bbox), a long route and a map viewport
+QUERIES = (
+    ("route", (12.94, 77.57, 13.01, 77.64)),
+    ("long_route", (12.88, 77.48, 13.06, 77.72)),
+    ("viewport_sparse", (15.0, 75.0, 15.3, 75.3)),
+)
+
+LEGACY_BBOX_SQL = "latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s"
+
+
+def legacy_params(bbox):
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return (min_lat, max_lat, min_lng, max_lng)
+
+
+def connect():
+    load_dotenv(os.path.join(SERVER_DIR, ".env"))
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+    )
+
+
+def seed(db, rows, batch=10000, seed=0):
+    """Create the scratch table and fill it up to `rows` synthetic incidents."""
+    cursor = db.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {SCRATCH_TABLE} LIKE incident_reports")
+    cursor.execute(f"SELECT COUNT(*) FROM {SCRATCH_TABLE}")
+    have = cursor.fetchone()[0]
+    missing = rows - have
+    if missing <= 0:
+        print(f"{SCRATCH_TABLE}: {have} rows already present")
+        return have
+
+    rng = np.random.default_rng(seed + have)
+    print(f"Seeding {missing} rows into {SCRATCH_TABLE} ...")
+    started = time.perf_counter()
+    sql = (
+        f"INSERT INTO {SCRATCH_TABLE} (latitude, longitude, severity, incident_type, created_at) "
+        "VALUES (%s, %s, %s, %s, NOW() - INTERVAL %s HOUR)"
+    )
+    for offset in range(0, missing, batch):
+        k = min(batch, missing - offset)
+        area = np.where(rng.random(k) < 0.7, 0, 1)
+        lo = np.array([CITY[:2], STATE[:2]])[area]
+        hi = np.array([CITY[2:], STATE[2:]])[area]
+        pts = rng.uniform(lo, hi)
+        cursor.executemany(sql, [
+            (round(float(lat), 7), round(float(lng), 7), int(sev), INCIDENT_TYPES[t], int(age))
+            for lat, lng, sev, t, age in zip(
+                pts[:, 0], pts[:, 1],
+                rng.integers(1, 5, k), rng.integers(len(INCIDENT_TYPES), size=k),
+                rng.integers(0, 365 * 24, k),
+            )
+        ])
+        db.commit()
+    cursor.execute(f"ANALYZE TABLE {SCRATCH_TABLE}")
+    cursor.fetchall()
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    return rows
+
+
+def _plan_keys(node, found):
+    """Every index ("key") and row estimate in an EXPLAIN FORMAT=JSON tree."""
+    if isinstance(node, dict):
+        if "table_name" in node:
+            found.append((node.get("key"), node.get("access_type"), node.get("rows_examined_per_scan")))
+        for value in node.values():
+            _plan_keys(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_keys(value, found)
+    return found
+
+
+def check(db, where, params, repeats=5):
+    """(plan [(key, access_type, rows)], median ms, result rows) for one bbox query."""
+    sql = (
+        f"SELECT latitude, longitude, incident_type, severity FROM {SCRATCH_TABLE} "
+        f"WHERE {where} AND created_at >= NOW() - INTERVAL 180 DAY"
+    )
+    cursor = db.cursor()
+    cursor.execute("EXPLAIN FORMAT=JSON " + sql, params)
+    plan = _plan_keys(json.loads(cursor.fetchone()[0]), [])
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        found = len(cursor.fetchall())
+        timings.append((time.perf_counter() - started) * 1000)
+    cursor.close()
+    return plan, statistics.median(timings), found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table for later runs")
+    args = parser.parse_args(argv)
+
+    db = connect()
+    ok = True
+    try:
+        total = seed(db, args.rows)
+        print(f"\n{total} rows")
+        print(f"{'query':<16} {'variant':<8} {'index':<14} {'access':<8} {'est.rows':>9} {'found':>7} {'ms':>8}")
+        for name, bbox in QUERIES:
+            for variant, where, params in (
+                ("spatial", INCIDENT_BBOX_SQL, incident_bbox_params(bbox)),
+                ("legacy", LEGACY_BBOX_SQL, legacy_params(bbox)),
+            ):
+                plan, ms, found = check(db, where, params)
+                key, access, est = plan[0] if plan else (None, None, None)
+                print(f"{name:<16} {variant:<8} {str(key):<14} {str(access):<8} "
+                      f"{str(est):>9} {found:>7} {ms:>8.1f}")
+                if variant == "spatial" and key != SPATIAL_INDEX:
+                    ok = False
+                    print(f"  !! expected {SPATIAL_INDEX}, plan was {plan}")
+    finally:
+        if not args.keep:
+            cursor = db.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+            cursor.close()
+        db.close()
+
+    print("\nOK: bbox queries use the spatial index" if ok else "\nFAIL: spatial index not used")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Rate-coalesced location_update broadcasts for tracking rooms.
+
+Each room gets at most ``max_rate`` location_update emits per second.
+Updates arriving in between are merged latest-wins: the newest location
+and total_updates replace the pending ones, and new fixes are appended to a
+short trail (the last ``trail`` points) so viewers can still draw the path.
+When a room's slot comes up and nobody is watching it (per the session
+store's presence counts), the update is dropped instead of emitted.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often stale per-room send times are pruned
+_PRUNE_SECONDS = 60
+
+
+class RoomBroadcaster:
+    """Coalesces location updates per room and emits them from one thread."""
+
+    def __init__(self, emit, viewers, max_rate=2.0, trail=20):
+        self.emit = emit  # emit(event, payload, room)
+        self.viewers = viewers  # viewers(room) -> number of clients in the room
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.trail = trail
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last = {}  # room -> monotonic time of its last emit
+        self._pending = {}  # room -> merged payload waiting for its slot
+        self._pruned = time.monotonic()
+        self.published = 0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self._in_flight = 0  # popped payloads whose emit has not been counted yet
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def publish(self, room, fixes, total_updates):
+        """Queue new fixes (location dicts, oldest first) for the room's viewers."""
+        now = time.monotonic()
+        with self._lock:
+            self.published += 1
+            pending = self._pending.get(room)
+            if pending is None:
+                pending = self._pending[room] = {"session_id": room, "fixes": []}
+            pending["location"] = fixes[-1]
+            pending["fixes"] = (pending["fixes"] + fixes)[-self.trail:]
+            pending["total_updates"] = total_updates
+            if now < self._last.get(room, float("-inf")) + self.interval:
+                # Sent recently; the flush thread emits the merged update when due
+                self._wake.set()
+                return
+            payload = self._pending.pop(room)
+            self._last[room] = now
+            self._in_flight += 1
+        self._send(room, payload)
+
+    def _send(self, room, payload):
+        outcome = "failed"
+        try:
+            if not self.viewers(room):
+                outcome = "skipped"
+                return
+            self.emit("location_update", payload, room)
+            outcome = "sent"
+        finally:
+            # Counted under the lock, together with leaving _in_flight, so
+            # stats() always adds up
+            with self._lock:
+                self._in_flight -= 1
+                if outcome == "sent":
+                    self.sent += 1
+                elif outcome == "skipped":
+                    self.skipped += 1
+                else:
+                    self.failed += 1
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                now = time.monotonic()
+                due = [room for room in self._pending if now >= self._last.get(room, 0.0) + self.interval]
+                ready = [(room, self._pending.pop(room)) for room in due]
+                for room in due:
+                    self._last[room] = now
+                self._in_flight += len(ready)
+                if now - self._pruned > _PRUNE_SECONDS:
+                    self._last = {room: t for room, t in self._last.items() if now - t < self.interval}
+                    self._pruned = now
+                if self._pending:
+                    next_due = min(self._last.get(room, 0.0) for room in self._pending) + self.interval
+                else:
+                    next_due = None
+                    self._wake.clear()
+            for room, payload in ready:
+                try:
+                    self._send(room, payload)
+                except Exception as e:
+                    logger.error(f"Broadcast to {room} failed: {e}")
+            if next_due is not None:
+                time.sleep(max(0.0, next_due - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_rate": round(1.0 / self.interval, 3) if self.interval else None,
+                "published": self.published,
+                "sent": self.sent,
+                "skipped_empty": self.skipped,
+                "failed": self.failed,
+                "coalesced": (self.published - self.sent - self.skipped - self.failed
+                              - len(self._pending) - self._in_flight),
+                "pending_rooms": len(self._pending),
+            }
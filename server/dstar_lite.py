@@ -0,0 +1,186 @@
+"""D* Lite incremental shortest paths for in-navigation re-routing.
+
+The search runs backward from the goal, so when the traveller moves only
+the heuristic offset ``km`` changes and the existing g/rhs values stay
+valid; when edge costs change (a new incident nearby) only the affected
+vertices are repaired. Koenig & Likhachev's optimized D* Lite, over a
+directed graph in CSR form whose edge cost array can be updated in place.
+"""
+import heapq
+import time
+
+import numpy as np
+
+from geo_math import haversine_km
+
+# Keys within this of each other tie on the first component; without it
+# haversine rounding can end a search with nodes on the path inconsistent
+KEY_EPS = 1e-9
+
+
+def _key_less(a, b):
+    if a[0] < b[0] - KEY_EPS:
+        return True
+    return a[0] <= b[0] + KEY_EPS and a[1] < b[1]
+
+
+class DStarLite:
+    """Incremental goal-directed search over a CSR graph.
+
+    `indptr`/`indices`/`costs` describe directed edges u -> v, `lats`/`lngs`
+    the node coordinates used by the haversine heuristic, which stays
+    consistent as long as no edge costs less than its great-circle length.
+    """
+
+    def __init__(self, indptr, indices, costs, lats, lngs, start, goal):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.costs = np.asarray(costs, dtype=float).copy()
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        n = len(self.lats)
+
+        # Reverse adjacency (sources only: costs are read from the successor side)
+        sources = np.repeat(np.arange(n), np.diff(self.indptr))
+        self._rev_edges = np.argsort(self.indices, kind="stable")
+        self._rev_sources = sources[self._rev_edges]
+        self._rev_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.indices, minlength=n))])
+        self._edge_sources = sources
+
+        self.goal = int(goal)
+        self.start = int(start)
+        self._last = self.start
+        self.km = 0.0
+        self.g = np.full(n, np.inf)
+        self.rhs = np.full(n, np.inf)
+        self.rhs[self.goal] = 0.0
+        self._h = self._heuristic(self.start)
+
+        # Lazy-deletion heap; _queued holds each vertex's live key (nan = not queued)
+        self._queued = np.full((n, 2), np.nan)
+        self._heap = []
+        self._push(self.goal, self._key(self.goal))
+
+        self.expanded = 0
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _heuristic(self, source):
+        return haversine_km(self.lats, self.lngs, self.lats[source], self.lngs[source])
+
+    def _key(self, u):
+        m = min(self.g[u], self.rhs[u])
+        return (m + self._h[u] + self.km, m)
+
+    def _push(self, u, key):
+        self._queued[u] = key
+        heapq.heappush(self._heap, (key[0], key[1], u))
+
+    def _top(self):
+        while self._heap:
+            k1, k2, u = self._heap[0]
+            q1, q2 = self._queued[u]
+            if q1 == k1 and q2 == k2:
+                return (k1, k2), u
+            heapq.heappop(self._heap)
+        return (np.inf, np.inf), -1
+
+    def successors(self, u):
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        return self.indices[lo:hi], self.costs[lo:hi]
+
+    def predecessors(self, v):
+        lo, hi = self._rev_indptr[v], self._rev_indptr[v + 1]
+        return self._rev_sources[lo:hi]
+
+    def _update_vertex(self, u):
+        if u != self.goal:
+            v, c = self.successors(u)
+            self.rhs[u] = float(np.min(c + self.g[v])) if len(v) else np.inf
+        if self.g[u] != self.rhs[u]:
+            self._push(u, self._key(u))
+        else:
+            self._queued[u] = np.nan
+
+    def compute(self, deadline=None):
+        """Repair the search until the start is locally consistent.
+
+        Returns False if `deadline` (time.monotonic()) passed first; the
+        state is kept, so the next call resumes where this one stopped.
+        """
+        s = self.start
+        while True:
+            key, u = self._top()
+            if u < 0 or (not _key_less(key, self._key(s)) and self.rhs[s] == self.g[s]):
+                return True
+            if deadline is not None and self.expanded % 64 == 0 and time.monotonic() > deadline:
+                return False
+
+            self.expanded += 1
+            new_key = self._key(u)
+            if _key_less(key, new_key):
+                self._push(u, new_key)
+            elif self.g[u] > self.rhs[u]:
+                self.g[u] = self.rhs[u]
+                self._queued[u] = np.nan
+                for p in self.predecessors(u).tolist():
+                    self._update_vertex(p)
+            else:
+                self.g[u] = np.inf
+                for p in self.predecessors(u).tolist() + [u]:
+                    self._update_vertex(p)
+
+    def move_start(self, start):
+        """The traveller is now at vertex `start`; keeps all search state."""
+        start = int(start)
+        if start == self.start:
+            return
+        self.km += float(haversine_km(
+            self.lats[self._last], self.lngs[self._last], self.lats[start], self.lngs[start]
+        ))
+        self._last = self.start = start
+        self._h = self._heuristic(start)
+
+    def update_costs(self, costs):
+        """Replace the edge cost array; returns the number of edges that changed."""
+        return self.update_edges(np.arange(len(self.costs)), costs)
+
+    def update_edges(self, edges, costs):
+        """Set the cost of the given edge positions; returns how many changed."""
+        edges = np.asarray(edges, dtype=np.int64)
+        costs = np.asarray(costs, dtype=float)
+        diff = costs != self.costs[edges]
+        edges, costs = edges[diff], costs[diff]
+        if not len(edges):
+            return 0
+        self.costs[edges] = costs
+        for u in np.unique(self._edge_sources[edges]).tolist():
+            self._update_vertex(u)
+        return len(edges)
+
+    def edges_into(self, vertices):
+        """Positions in the cost array of every edge entering `vertices`."""
+        vertices = np.asarray(vertices, dtype=np.int64)
+        starts = self._rev_indptr[vertices]
+        counts = self._rev_indptr[vertices + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return self._rev_edges[offsets]
+
+    def path(self):
+        """Vertex path start -> goal by greedy descent on g, or None if unreachable."""
+        u = self.start
+        if not np.isfinite(self.g[u]) and u != self.goal:
+            return None
+        nodes = [u]
+        seen = {u}
+        while u != self.goal:
+            v, c = self.successors(u)
+            if not len(v):
+                return None
+            u = int(v[np.argmin(c + self.g[v])])
+            if u in seen or not np.isfinite(self.g[u]):
+                return None
+            seen.add(u)
+            nodes.append(u)
+        return nodes
@@ -0,0 +1,144 @@
+"""Route exposure scoring over the whole polyline.
+
+For every (segment, incident) pair near the route this computes, in a
+local planar projection, the closest approach of the segment to the
+incident and the length of the segment that lies within the exposure
+radius. Exposure is ``severity * length_within_radius / (1 + distance)``
+summed over all pairs, so long stretches close to severe (and recent:
+severities arrive already time-decayed) incidents dominate the score.
+"""
+import math
+
+import numpy as np
+
+from geo_math import haversine_km, local_xy_km
+
+# Incidents further than this from every point of the route do not count
+EXPOSURE_RADIUS_KM = 1.5
+
+# safety_score = 100 * exp(-exposure / EXPOSURE_SCALE)
+EXPOSURE_SCALE = 40.0
+
+# (segment, incident) pairs evaluated per vectorized block
+_BLOCK_PAIRS = 1 << 20
+
+
+def _segment_hits(ax, ay, dx, dy, px, py, radius_km):
+    """(closest distance, length within radius) per segment x incident pair.
+
+    Arguments are (S, 1) segment starts/directions and (1, C) incident
+    coordinates in km; results have shape (S, C).
+    """
+    fx, fy = ax - px, ay - py
+    a = dx * dx + dy * dy
+    safe_a = np.where(a > 0, a, 1.0)
+    fd = fx * dx + fy * dy
+
+    t = np.clip(-fd / safe_a, 0.0, 1.0)
+    closest = np.hypot(fx + t * dx, fy + t * dy)
+
+    # |f + t d| = r  ->  a t^2 + 2 fd t + (f.f - r^2) = 0
+    disc = fd * fd - a * (fx * fx + fy * fy - radius_km * radius_km)
+    root = np.sqrt(np.maximum(disc, 0.0))
+    t1 = np.clip((-fd - root) / safe_a, 0.0, 1.0)
+    t2 = np.clip((-fd + root) / safe_a, 0.0, 1.0)
+    inside = np.where((disc > 0) & (a > 0), t2 - t1, 0.0)
+    return closest, inside * np.sqrt(a), t1, t2
+
+
+def _covered_fraction(t1, t2):
+    """Length fraction of [0, 1] covered by the union of intervals [t1, t2]."""
+    order = np.argsort(t1)
+    covered, end = 0.0, 0.0
+    for lo, hi in zip(t1[order].tolist(), t2[order].tolist()):
+        if hi <= end:
+            continue
+        covered += hi - max(lo, end)
+        end = hi
+    return covered
+
+
+def score_path(path, incident_index, speed_kmh, radius_km=EXPOSURE_RADIUS_KM, top_hotspots=3):
+    """Exposure summary for a [(lat, lng), ...] route.
+
+    Returns a dict with ``safety_score`` (0-100), ``exposure``,
+    ``incident_count`` (distinct incidents within radius of any point of
+    the route), ``minutes_near_incidents`` (time inside the radius of at
+    least one incident at `speed_kmh`) and the top ``hotspots`` by
+    contribution, each with its closest approach and minutes nearby.
+    """
+    empty = {
+        "safety_score": 100,
+        "exposure": 0.0,
+        "incident_count": 0,
+        "minutes_near_incidents": 0.0,
+        "hotspots": [],
+    }
+    if len(path) < 2 or incident_index is None or not len(incident_index):
+        return empty
+
+    pts = np.asarray(path, dtype=float)
+    legs = haversine_km(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+    mid_lats = (pts[:-1, 0] + pts[1:, 0]) / 2
+    mid_lngs = (pts[:-1, 1] + pts[1:, 1]) / 2
+    candidates = incident_index.within(mid_lats, mid_lngs, radius_km + float(legs.max()) / 2)
+    if not len(candidates):
+        return empty
+
+    x, y = local_xy_km(pts[:, 0], pts[:, 1], float(pts[:, 0].mean()))
+    px, py = local_xy_km(
+        incident_index.lats[candidates], incident_index.lngs[candidates], float(pts[:, 0].mean())
+    )
+    severity = incident_index.severities[candidates]
+    ax, ay = x[:-1, None], y[:-1, None]
+    dx, dy = np.diff(x)[:, None], np.diff(y)[:, None]
+
+    n_seg, n_inc = len(legs), len(candidates)
+    closest = np.full(n_inc, np.inf)
+    near_km = np.zeros(n_inc)
+    contribution = np.zeros(n_inc)
+    seg_intervals = [[] for _ in range(n_seg)]
+
+    block = max(1, _BLOCK_PAIRS // n_seg)
+    for lo in range(0, n_inc, block):
+        hi = min(lo + block, n_inc)
+        dist, inside, t1, t2 = _segment_hits(
+            ax, ay, dx, dy, px[None, lo:hi], py[None, lo:hi], radius_km
+        )
+        closest[lo:hi] = dist.min(axis=0)
+        near_km[lo:hi] = inside.sum(axis=0)
+        contribution[lo:hi] = severity[lo:hi] * (inside / (1 + dist)).sum(axis=0)
+        for s, c in zip(*np.nonzero(inside > 0)):
+            seg_intervals[s].append((t1[s, c], t2[s, c]))
+
+    # Time inside at least one radius: per-segment union of the hit intervals
+    near_route_km = 0.0
+    for s, intervals in enumerate(seg_intervals):
+        if intervals:
+            lo, hi = np.array(intervals).T
+            near_route_km += _covered_fraction(lo, hi) * float(legs[s])
+
+    hit = closest <= radius_km
+    exposure = float(contribution.sum())
+    minutes = lambda km: round(km / speed_kmh * 60, 1) if speed_kmh > 0 else 0.0
+
+    hotspots = []
+    for k in np.argsort(-contribution)[:top_hotspots]:
+        if contribution[k] <= 0:
+            break
+        i = candidates[k]
+        hotspots.append({
+            "lat": float(incident_index.lats[i]),
+            "lng": float(incident_index.lngs[i]),
+            "severity": round(float(severity[k]), 2),
+            "closest_km": round(float(closest[k]), 3),
+            "minutes_near": minutes(float(near_km[k])),
+        })
+
+    return {
+        "safety_score": int(round(100 * math.exp(-exposure / EXPOSURE_SCALE))),
+        "exposure": round(exposure, 3),
+        "incident_count": int(hit.sum()),
+        "minutes_near_incidents": minutes(near_route_km),
+        "hotspots": hotspots,
+    }
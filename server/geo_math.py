@@ -0,0 +1,87 @@
+"""Vectorized great-circle helpers used by the routing code.
+
+All functions accept scalars or NumPy arrays and broadcast like regular
+NumPy arithmetic, so a whole neighbour set or incident list can be measured
+in one call instead of looping over geopy's ellipsoidal solver.
+Distances use a spherical Earth, which stays within ~0.5% of WGS84.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Worst observed relative error of the equirectangular approximation is
+# ~0.031 * span^2 * sec^2(lat) (span in radians); 0.05 keeps a safety margin.
+_EQUIRECT_ERROR_COEFF = 0.05
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km between (lat1, lng1) and (lat2, lng2)."""
+    p1 = np.radians(lat1)
+    p2 = np.radians(lat2)
+    dp = p2 - p1
+    dl = np.radians(np.subtract(lng2, lng1))
+    h = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def equirectangular_km(lat1, lng1, lat2, lng2):
+    """Flat-earth approximation in km; cheap and accurate for short spans."""
+    x = np.radians(np.subtract(lng2, lng1)) * np.cos(np.radians(np.add(lat1, lat2) / 2))
+    y = np.radians(np.subtract(lat2, lat1))
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def equirectangular_error_km(lat1, lng1, lat2, lng2, dist_km=None):
+    """Upper bound on |equirectangular - haversine| for the given pairs."""
+    if dist_km is None:
+        dist_km = equirectangular_km(lat1, lng1, lat2, lng2)
+    span = np.radians(np.maximum(np.abs(np.subtract(lat2, lat1)), np.abs(np.subtract(lng2, lng1))))
+    phi = np.radians(np.minimum(np.maximum(np.abs(lat1), np.abs(lat2)), 89.0))
+    return dist_km * _EQUIRECT_ERROR_COEFF * span ** 2 / np.cos(phi) ** 2
+
+
+def distance_km(lat1, lng1, lat2, lng2, max_error_km=None):
+    """Distance in km, optionally trading accuracy for speed.
+
+    With ``max_error_km=None`` this is plain haversine. Otherwise the
+    equirectangular approximation is used and only the pairs whose error
+    bound exceeds ``max_error_km`` are recomputed with haversine.
+    """
+    if max_error_km is None:
+        return haversine_km(lat1, lng1, lat2, lng2)
+
+    lat1, lng1, lat2, lng2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lng1, dtype=float),
+        np.asarray(lat2, dtype=float), np.asarray(lng2, dtype=float),
+    )
+    dist = equirectangular_km(lat1, lng1, lat2, lng2)
+    loose = equirectangular_error_km(lat1, lng1, lat2, lng2, dist) > max_error_km
+    if np.any(loose):
+        dist = np.array(dist, dtype=float)
+        dist[loose] = haversine_km(lat1[loose], lng1[loose], lat2[loose], lng2[loose])
+    return dist
+
+
+def local_xy_km(lats, lngs, ref_lat):
+    """Equirectangular (x, y) in km around `ref_lat`, for planar geometry on city-sized areas."""
+    scale = EARTH_RADIUS_KM * np.pi / 180
+    x = np.asarray(lngs, dtype=float) * scale * np.cos(np.radians(ref_lat))
+    y = np.asarray(lats, dtype=float) * scale
+    return x, y
+
+
+def path_length_km(path, max_error_km=None):
+    """Total length in km of a [(lat, lng), ...] polyline."""
+    if len(path) < 2:
+        return 0.0
+    pts = np.asarray(path, dtype=float)
+    legs = distance_km(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1], max_error_km)
+    return float(np.sum(legs))
+
+
+def pairwise_km(lats_a, lngs_a, lats_b, lngs_b, max_error_km=None):
+    """Distance matrix of shape (len(a), len(b)) in km."""
+    lats_a = np.asarray(lats_a, dtype=float)[:, None]
+    lngs_a = np.asarray(lngs_a, dtype=float)[:, None]
+    lats_b = np.asarray(lats_b, dtype=float)[None, :]
+    lngs_b = np.asarray(lngs_b, dtype=float)[None, :]
+    return distance_km(lats_a, lngs_a, lats_b, lngs_b, max_error_km)
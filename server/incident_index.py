@@ -0,0 +1,85 @@
+"""Spatial index over incident coordinates for batched radius / k-NN queries.
+
+Wraps scikit-learn's haversine BallTree so every routing and scoring pass
+can ask "which incidents are near these points" for a whole array of points
+at once, in O(log n) per query point instead of a scan over all incidents.
+"""
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from geo_math import EARTH_RADIUS_KM
+
+
+def _to_radians(lats, lngs):
+    return np.radians(np.column_stack([
+        np.atleast_1d(np.asarray(lats, dtype=float)),
+        np.atleast_1d(np.asarray(lngs, dtype=float)),
+    ]))
+
+
+class IncidentIndex:
+    """Immutable BallTree over incident points with their severities."""
+
+    def __init__(self, lats, lngs, severities=None, leaf_size=40):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        if severities is None:
+            severities = np.ones(len(self.lats))
+        self.severities = np.asarray(severities, dtype=float)
+        self._tree = (
+            BallTree(_to_radians(self.lats, self.lngs), leaf_size=leaf_size, metric="haversine")
+            if len(self.lats) else None
+        )
+
+    @classmethod
+    def from_incidents(cls, incidents):
+        """Build from safe_route style [{"lat", "lng", "severity"}, ...] dicts."""
+        return cls(
+            [inc["lat"] for inc in incidents],
+            [inc["lng"] for inc in incidents],
+            [inc["severity"] for inc in incidents],
+        )
+
+    def __len__(self):
+        return len(self.lats)
+
+    def query_radius(self, lats, lngs, radius_km, return_distance=False):
+        """Incident indices (and km distances) within radius_km of each point."""
+        pts = _to_radians(lats, lngs)
+        if self._tree is None:
+            empty = [np.empty(0, dtype=int) for _ in range(len(pts))]
+            if return_distance:
+                return empty, [np.empty(0) for _ in range(len(pts))]
+            return empty
+        res = self._tree.query_radius(
+            pts, r=radius_km / EARTH_RADIUS_KM, return_distance=return_distance
+        )
+        if return_distance:
+            idx, dist = res
+            return list(idx), [d * EARTH_RADIUS_KM for d in dist]
+        return list(res)
+
+    def query_nearest(self, lats, lngs, k=1):
+        """(distances_km, indices) of the k nearest incidents, shape (n_points, k)."""
+        pts = _to_radians(lats, lngs)
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty((len(pts), 0)), np.empty((len(pts), 0), dtype=int)
+        dist, idx = self._tree.query(pts, k=k)
+        return dist * EARTH_RADIUS_KM, idx
+
+    def within(self, lats, lngs, radius_km):
+        """Sorted unique indices of incidents within radius_km of any point."""
+        hits = self.query_radius(lats, lngs, radius_km)
+        if not hits:
+            return np.empty(0, dtype=int)
+        return np.unique(np.concatenate(hits))
+
+    def risk_at(self, lats, lngs, radius_km=1.0):
+        """sum(severity / (1 + d)) over incidents within radius_km, per point."""
+        idx, dist = self.query_radius(lats, lngs, radius_km, return_distance=True)
+        out = np.zeros(len(idx))
+        for n, (i, d) in enumerate(zip(idx, dist)):
+            if len(i):
+                out[n] = np.sum(self.severities[i] / (1 + d))
+        return out
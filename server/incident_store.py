@@ -0,0 +1,522 @@
+"""In-process incident store backing routing and the incident endpoints.
+
+Incidents live in compact NumPy columns (id, lat, lng, severity, type code,
+created_at epoch seconds) that are loaded once at startup, appended to by
+/submit_report and reconciled with MySQL in the background. Routing reads
+decayed severities for a bbox with one vectorized scan instead of a DB
+round trip, and without a row cap. The newest reports are also kept with
+their full details so /incidents/recent needs no query either.
+"""
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DAY_SECONDS = 86400.0
+
+# (max age in days, weight) for the severity decay; older incidents get the last weight
+DECAY_STEPS = ((7, 1.0), (30, 0.7), (90, 0.4))
+DECAY_FLOOR = 0.2
+
+# Spatial index: rows are sorted by the key of the INDEX_CELL_DEG cell they fall in
+INDEX_CELL_DEG = 0.05
+_INDEX_COLS = int(round(360 / INDEX_CELL_DEG))
+# Appended rows stay in an unsorted tail until it grows past this (or 1/8 of the store)
+INDEX_TAIL_ROWS = 4096
+
+# MySQL counterpart of a bbox read: uses the SPATIAL index on incident_reports.location
+# (POINT(longitude, latitude), SRID 0). MBRIntersects keeps edge points, like BETWEEN.
+INCIDENT_BBOX_SQL = "MBRIntersects(location, ST_MakeEnvelope(POINT(%s, %s), POINT(%s, %s)))"
+
+_Snapshot = namedtuple(
+    "_Snapshot", "ids lats lngs severity types created type_default type_names order keys indexed version"
+)
+
+# Handle of a SharedIncidents block, small enough to send with every route search
+IncidentsRef = namedtuple("IncidentsRef", "name version rows indexed type_default retention_days owner_pid")
+
+# Columns copied into a shared block; the index columns have `indexed` rows, the rest `rows`
+_SHARED_COLUMNS = (
+    ("lats", np.float64), ("lngs", np.float64), ("severity", np.float32), ("types", np.int16),
+    ("created", np.float64), ("order", np.int64), ("keys", np.int64),
+)
+
+
+def decay_weights(age_days):
+    """Age-based severity weights, vectorized over an array of ages in days."""
+    return np.select([age_days <= days for days, _ in DECAY_STEPS], [w for _, w in DECAY_STEPS], DECAY_FLOOR)
+
+
+def incident_bbox_params(bbox):
+    """INCIDENT_BBOX_SQL parameters for a (min_lat, min_lng, max_lat, max_lng) bbox."""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return (min_lng, min_lat, max_lng, max_lat)
+
+
+def _select_rows(snap, bbox, retention_days, now=None):
+    """(row indices, age in days) of live incidents of `snap` inside bbox."""
+    now = time.time() if now is None else now
+    min_lat, min_lng, max_lat, max_lng = bbox
+    idx = IncidentStore._candidates(snap, bbox)
+    lats, lngs = snap.lats[idx], snap.lngs[idx]
+    age_days = (now - snap.created[idx]) / DAY_SECONDS
+    mask = (
+        (lats >= min_lat) & (lats <= max_lat)
+        & (lngs >= min_lng) & (lngs <= max_lng)
+        & (age_days <= retention_days)
+    )
+    return idx[mask], age_days[mask]
+
+
+def _route_dicts(snap, idx, age_days):
+    sev = IncidentStore._base_severity(snap, idx) * decay_weights(age_days)
+    return [
+        {"lat": a, "lng": b, "severity": s}
+        for a, b, s in zip(snap.lats[idx].tolist(), snap.lngs[idx].tolist(), sev.tolist())
+    ]
+
+
+def cell_keys(lats, lngs, cell_deg=INDEX_CELL_DEG):
+    """Row-major key of the cell_deg x cell_deg grid cell each point falls in."""
+    cols = int(round(360 / cell_deg))
+    rows = np.floor((np.asarray(lats) + 90.0) / cell_deg).astype(np.int64)
+    col = np.clip(np.floor((np.asarray(lngs) + 180.0) / cell_deg).astype(np.int64), 0, cols - 1)
+    return rows * cols + col
+
+
+class IncidentStore:
+    """Thread-safe, array-backed incident columns with amortized O(1) appends.
+
+    Readers take a consistent snapshot of the column arrays under the lock
+    and compute outside it: appends only write past the snapshot's length
+    and growth or reloads swap in new arrays.
+
+    Bbox reads go through a grid index (row order sorted by cell key), so
+    they touch only the cells overlapping the bbox plus a short unsorted
+    tail of recent appends, whatever the store size.
+    """
+
+    def __init__(self, retention_days=180, type_severity=None, default_severity=5, recent_size=500):
+        self.retention_days = retention_days
+        self.type_severity = dict(type_severity or {})
+        self.default_severity = default_severity
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent_size)
+        self._type_codes = {}
+        self._type_names = []
+        self._type_default = np.empty(0)
+        self._reset(0)
+        self.ready = False
+        # DB clock (epoch seconds) when the last sync started; incremental syncs
+        # re-read rows updated since shortly before it
+        self.db_synced_at = None
+        self.loaded_at = None
+        self.synced_at = None
+        self.appended = 0
+        self.merged = 0
+        self.updated = 0
+        self.reindexes = 0
+        # Bumped on every change, so published copies (SharedIncidents) know they are stale
+        self.version = 0
+
+    def _reset(self, capacity):
+        self._n = 0
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._lats = np.empty(capacity)
+        self._lngs = np.empty(capacity)
+        self._severity = np.empty(capacity, dtype=np.float32)
+        self._types = np.empty(capacity, dtype=np.int16)
+        self._created = np.empty(capacity)
+        self._order = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._indexed = 0
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in ("_ids", "_lats", "_lngs", "_severity", "_types", "_created"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _type_code(self, incident_type):
+        code = self._type_codes.get(incident_type)
+        if code is None:
+            code = self._type_codes[incident_type] = len(self._type_names)
+            self._type_names.append(incident_type)
+            self._type_default = np.append(
+                self._type_default, float(self.type_severity.get(incident_type, self.default_severity))
+            )
+        return code
+
+    def _append_rows(self, rows):
+        """rows: [(id, lat, lng, severity or None, type, created_at epoch), ...]"""
+        if not rows:
+            return
+        n, k = self._n, len(rows)
+        self._grow(n + k)
+        ids, lats, lngs, sev, types, created = zip(*rows)
+        self._ids[n:n + k] = ids
+        self._lats[n:n + k] = lats
+        self._lngs[n:n + k] = lngs
+        self._severity[n:n + k] = [np.nan if s is None else float(s) for s in sev]
+        self._types[n:n + k] = [self._type_code(t) for t in types]
+        self._created[n:n + k] = created
+        self._n = n + k
+        self.version += 1
+        if self._n - self._indexed > max(INDEX_TAIL_ROWS, self._n // 8):
+            self._reindex()
+
+    def _reindex(self):
+        keys = cell_keys(self._lats[:self._n], self._lngs[:self._n])
+        order = np.argsort(keys, kind="stable")
+        self._order, self._keys, self._indexed = order, keys[order], self._n
+        self.reindexes += 1
+
+    def load(self, rows, recent=(), db_time=None):
+        """Replace everything with a full DB snapshot (startup / full reconcile)."""
+        rows = list(rows)
+        with self._lock:
+            self._reset(max(len(rows), 1024))
+            self._append_rows(rows)
+            self._reindex()
+            self.version += 1
+            self._recent.clear()
+            self._recent.extend(recent)
+            self.db_synced_at = db_time
+            self.ready = True
+            self.loaded_at = self.synced_at = time.time()
+
+    def _rewrite_rows(self, updates):
+        """Overwrite rows in place: updates is [(row index, DB row), ...]."""
+        # Fresh copies, so snapshots readers already hold never change under them
+        for name in ("_lats", "_lngs", "_severity", "_types", "_created"):
+            setattr(self, name, getattr(self, name).copy())
+        moved = False
+        for i, (_, lat, lng, sev, incident_type, _created) in updates:
+            moved = moved or (lat, lng) != (self._lats[i], self._lngs[i])
+            self._lats[i] = lat
+            self._lngs[i] = lng
+            self._severity[i] = np.nan if sev is None else float(sev)
+            self._types[i] = self._type_code(incident_type)
+        self.version += 1
+        if moved:
+            self._reindex()
+
+    def _row(self, i):
+        """Stored (id, lat, lng, severity or None, type, created) of row i."""
+        sev = float(self._severity[i])
+        return (
+            int(self._ids[i]), float(self._lats[i]), float(self._lngs[i]),
+            None if np.isnan(sev) else sev, self._type_names[self._types[i]], float(self._created[i]),
+        )
+
+    def merge(self, rows, db_time=None):
+        """Upsert DB rows changed since the last sync (incremental reconcile).
+
+        Sync windows overlap, so rows already stored with the same values are
+        skipped. Returns the rows whose area changed: added and updated rows,
+        plus the previous values of updated ones.
+        """
+        rows = list(rows)
+        changed = []
+        with self._lock:
+            if rows:
+                n = self._n
+                ids = np.array([r[0] for r in rows], dtype=np.int64)
+                order = np.argsort(self._ids[:n], kind="stable")
+                sorted_ids = self._ids[:n][order]
+                pos = np.minimum(np.searchsorted(sorted_ids, ids), max(n - 1, 0))
+                found = sorted_ids[pos] == ids if n else np.zeros(len(ids), dtype=bool)
+                added, updates = [], []
+                for r, seen, i in zip(rows, found.tolist(), order[pos].tolist() if n else [0] * len(rows)):
+                    if not seen:
+                        added.append(r)
+                        continue
+                    old = self._row(i)
+                    # created_at is fixed at insert; the in-process copy of a report may differ by sub-seconds
+                    if old[1:5] != (r[1], r[2], None if r[3] is None else float(r[3]), r[4]):
+                        updates.append((i, r))
+                        changed.append(old)
+                if updates:
+                    self._rewrite_rows(updates)
+                self._append_rows(added)
+                changed.extend(added)
+                changed.extend(r for _, r in updates)
+                self.merged += len(added)
+                self.updated += len(updates)
+            if db_time is not None:
+                self.db_synced_at = db_time
+            self.synced_at = time.time()
+        return changed
+
+    def add(self, incident_id, lat, lng, severity, incident_type, created_at=None, details=None):
+        """Append one freshly reported incident; `details` feeds recent()."""
+        created_at = time.time() if created_at is None else created_at
+        with self._lock:
+            self._append_rows([(incident_id, lat, lng, severity, incident_type, created_at)])
+            if details is not None:
+                self._recent.appendleft(details)
+            self.appended += 1
+
+    def replace_recent(self, recent):
+        with self._lock:
+            self._recent.clear()
+            self._recent.extend(recent)
+
+    def __len__(self):
+        return self._n
+
+    def _snapshot(self):
+        with self._lock:
+            n = self._n
+            return _Snapshot(
+                self._ids[:n], self._lats[:n], self._lngs[:n], self._severity[:n],
+                self._types[:n], self._created[:n], self._type_default, list(self._type_names),
+                self._order, self._keys, self._indexed, self.version,
+            )
+
+    @staticmethod
+    def _candidates(snap, bbox):
+        """Row indices in the index cells overlapping bbox, plus the unindexed tail."""
+        min_lat, min_lng, max_lat, max_lng = bbox
+        lo = cell_keys([min_lat, max_lat], [min_lng, max_lng])
+        row0, col0 = divmod(int(lo[0]), _INDEX_COLS)
+        row1, col1 = divmod(int(lo[1]), _INDEX_COLS)
+        bands = np.arange(row0, row1 + 1, dtype=np.int64) * _INDEX_COLS
+        starts = np.searchsorted(snap.keys, bands + col0, side="left")
+        ends = np.searchsorted(snap.keys, bands + col1, side="right")
+        parts = [snap.order[a:b] for a, b in zip(starts.tolist(), ends.tolist()) if b > a]
+        parts.append(np.arange(snap.indexed, len(snap.lats), dtype=np.int64))
+        return np.concatenate(parts)
+
+    def _select(self, bbox, now=None):
+        """(snapshot, row indices, age in days) of live incidents inside bbox."""
+        snap = self._snapshot()
+        idx, age_days = _select_rows(snap, bbox, self.retention_days, now)
+        return snap, idx, age_days
+
+    @staticmethod
+    def _base_severity(snap, idx):
+        base = snap.severity[idx].astype(float)
+        missing = np.isnan(base)
+        base[missing] = snap.type_default[snap.types[idx][missing]]
+        return base
+
+    def query_bbox(self, bbox, now=None):
+        """(lats, lngs, decayed severities) of live incidents inside bbox."""
+        snap, idx, age_days = self._select(bbox, now)
+        return snap.lats[idx], snap.lngs[idx], self._base_severity(snap, idx) * decay_weights(age_days)
+
+    def route_incidents(self, bbox, now=None):
+        """query_bbox() as safe-route [{"lat", "lng", "severity"}, ...] dicts."""
+        return _route_dicts(*self._select(bbox, now))
+
+    def points(self, bbox, limit, now=None):
+        """(total, newest `limit` incidents in bbox as dicts).
+
+        `severity` is the reported (or type default) severity, `weight` the
+        decayed one routing uses; created_at is epoch seconds.
+        """
+        snap, idx, age_days = self._select(bbox, now)
+        total = len(idx)
+        if total > limit:
+            newest = np.argpartition(age_days, limit - 1)[:limit]
+            idx, age_days = idx[newest], age_days[newest]
+        newest = np.argsort(age_days, kind="stable")
+        idx, age_days = idx[newest], age_days[newest]
+        base = self._base_severity(snap, idx)
+        weight = base * decay_weights(age_days)
+        return total, [
+            {
+                "id": int(i),
+                "latitude": float(lat),
+                "longitude": float(lng),
+                "severity": float(s),
+                "weight": round(float(w), 3),
+                "incident_type": snap.type_names[t],
+                "created_at": float(c),
+            }
+            for i, lat, lng, s, w, t, c in zip(
+                snap.ids[idx], snap.lats[idx], snap.lngs[idx], base, weight,
+                snap.types[idx], snap.created[idx],
+            )
+        ]
+
+    def clusters(self, bbox, cell_deg, now=None):
+        """(total, grid clusters of live incidents in bbox).
+
+        Incidents are grouped into cell_deg x cell_deg cells; each cluster
+        has its centroid, count, max reported severity and summed decayed
+        weight.
+        """
+        snap, idx, age_days = self._select(bbox, now)
+        if not len(idx):
+            return 0, []
+        lats, lngs = snap.lats[idx], snap.lngs[idx]
+        base = self._base_severity(snap, idx)
+        weight = base * decay_weights(age_days)
+        cells, inverse, counts = np.unique(
+            cell_keys(lats, lngs, cell_deg), return_inverse=True, return_counts=True
+        )
+        sum_lat = np.bincount(inverse, lats, minlength=len(cells))
+        sum_lng = np.bincount(inverse, lngs, minlength=len(cells))
+        sum_weight = np.bincount(inverse, weight, minlength=len(cells))
+        max_sev = np.full(len(cells), -np.inf)
+        np.maximum.at(max_sev, inverse, base)
+        return len(idx), [
+            {
+                "latitude": round(float(a / c), 6),
+                "longitude": round(float(b / c), 6),
+                "count": int(c),
+                "max_severity": float(m),
+                "weight": round(float(w), 3),
+            }
+            for a, b, c, m, w in zip(sum_lat, sum_lng, counts, max_sev, sum_weight)
+        ]
+
+    def recent(self, limit=100):
+        """Newest reports with full details, newest first."""
+        with self._lock:
+            return list(self._recent)[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "incidents": self._n,
+                "capacity": len(self._ids),
+                "types": len(self._type_names),
+                "recent": len(self._recent),
+                "appended": self.appended,
+                "merged": self.merged,
+                "updated": self.updated,
+                "indexed": self._indexed,
+                "reindexes": self.reindexes,
+                "loaded_at": self.loaded_at,
+                "synced_at": self.synced_at,
+                "db_synced_at": self.db_synced_at,
+            }
+
+
+def _shared_layout(rows, indexed):
+    """([(column, dtype, byte offset, count)], total bytes) of a shared block."""
+    layout, offset = [], 0
+    for name, dtype in _SHARED_COLUMNS:
+        count = indexed if name in ("order", "keys") else rows
+        layout.append((name, dtype, offset, count))
+        offset += -(-count * np.dtype(dtype).itemsize // 8) * 8
+    return layout, max(offset, 8)
+
+
+class SharedIncidents:
+    """Publishes an IncidentStore to route worker processes through shared memory.
+
+    publish() copies the store's columns and index into a new block when the
+    store's version has moved (at most every `min_interval` seconds) and
+    returns an IncidentsRef. Searches carry that handle instead of a pickled
+    incident list; a worker attaches each version's block once and answers
+    route_incidents() from it (shared_route_incidents). The newest `keep`
+    blocks stay linked so searches queued against an older version can
+    still attach it.
+    """
+
+    def __init__(self, store, min_interval=1.0, keep=4):
+        self.store = store
+        self.min_interval = min_interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._blocks = deque()
+        self._ref = None
+        self._published_at = 0.0
+        self.publishes = 0
+
+    def publish(self):
+        """IncidentsRef of the current (or at most min_interval old) store contents."""
+        with self._lock:
+            ref = self._ref
+            if ref is not None and (
+                ref.version == self.store.version or time.monotonic() - self._published_at < self.min_interval
+            ):
+                return ref
+            snap = self.store._snapshot()
+            layout, size = _shared_layout(len(snap.lats), snap.indexed)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            for name, dtype, offset, count in layout:
+                np.ndarray(count, dtype, buffer=block.buf, offset=offset)[:] = getattr(snap, name)[:count]
+            self._blocks.append(block)
+            while len(self._blocks) > self.keep:
+                old = self._blocks.popleft()
+                old.close()
+                old.unlink()
+            self._ref = IncidentsRef(
+                block.name, snap.version, len(snap.lats), snap.indexed,
+                tuple(snap.type_default.tolist()), self.store.retention_days, os.getpid(),
+            )
+            self._published_at = time.monotonic()
+            self.publishes += 1
+            return self._ref
+
+    def close(self):
+        with self._lock:
+            while self._blocks:
+                block = self._blocks.popleft()
+                block.close()
+                block.unlink()
+            self._ref = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._ref.version if self._ref else None,
+                "rows": self._ref.rows if self._ref else 0,
+                "blocks": len(self._blocks),
+                "publishes": self.publishes,
+            }
+
+
+# Worker side: the block attached for the version last asked for, as (block, snapshot)
+_attached = None
+_attach_lock = threading.Lock()
+
+
+def shared_route_incidents(ref, bbox, now=None):
+    """IncidentStore.route_incidents() answered from a published IncidentsRef."""
+    with _attach_lock:
+        if _attached is None or _attached[1].version != ref.version:
+            _attach(ref)
+        snap = _attached[1]
+    return _route_dicts(snap, *_select_rows(snap, bbox, ref.retention_days, now))
+
+
+def _attach(ref):
+    global _attached
+    block = shared_memory.SharedMemory(name=ref.name)
+    if os.getpid() != ref.owner_pid:
+        # Attaching registers the block with this process's resource tracker, which
+        # would unlink it when the worker exits; the publisher owns its lifetime
+        resource_tracker.unregister(block._name, "shared_memory")
+    layout, _ = _shared_layout(ref.rows, ref.indexed)
+    cols = {
+        name: np.ndarray(count, dtype, buffer=block.buf, offset=offset)
+        for name, dtype, offset, count in layout
+    }
+    snap = _Snapshot(
+        None, cols["lats"], cols["lngs"], cols["severity"], cols["types"], cols["created"],
+        np.array(ref.type_default, dtype=float), None, cols["order"], cols["keys"],
+        ref.indexed, ref.version,
+    )
+    previous, _attached = _attached, (block, snap)
+    if previous is not None:
+        old_block = previous[0]
+        del previous
+        try:
+            old_block.close()
+        except BufferError:
+            pass  # still read by a concurrent search (thread pool); unmapped when collected
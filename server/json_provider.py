@@ -0,0 +1,74 @@
+"""Flask JSON provider that serializes responses with orjson when available.
+
+orjson writes bytes straight into the response and handles datetime and
+NumPy values natively; Decimal (MySQL DECIMAL columns) goes through a small
+`default` hook. Without orjson the stdlib encoder is used with the same
+hook, so rows can be returned as fetched instead of being copied into
+dicts of floats and ISO strings first. Both paths emit datetimes as ISO
+8601, naive ones as UTC with an explicit +00:00 offset, and keep dict
+insertion order, but their bytes can differ (float formatting,
+NaN/Infinity, non-string keys), so nothing should expect a body or its
+hash to be stable across backends.
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Naive datetimes are UTC (DB sessions run in UTC) and go out with an explicit +00:00
+ORJSON_OPTIONS = (
+    orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC if orjson is not None else 0
+)
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.datetime) and obj.tzinfo is None:
+        return obj.replace(tzinfo=datetime.timezone.utc).isoformat()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with an orjson fast path and Decimal/datetime/NumPy support."""
+
+    sort_keys = False
+    backend = "orjson" if orjson is not None else "json"
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", _default)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,59 @@
+"""Landmark (ALT) lower bounds for the A* searches over the undirected road graph.
+
+For a landmark L the triangle inequality gives d(v, t) >= |d(L, t) - d(L, v)|.
+Distance tables from a few well-spread landmarks are computed once with
+scipy's C Dijkstra, after which every bound is a couple of array lookups.
+"""
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+
+def select_landmarks(matrix, count, first=0):
+    """Farthest-point landmark selection.
+
+    Returns (landmarks, tables) where tables[k] holds d(L_k, v) for every
+    node v of the symmetric sparse weight `matrix`.
+    """
+    n = matrix.shape[0]
+    if n == 0 or count <= 0:
+        return [], np.empty((0, n))
+
+    landmarks = [int(first)]
+    tables = [dijkstra(matrix, directed=False, indices=landmarks[0])]
+    nearest = tables[0].copy()
+    while len(landmarks) < min(count, n):
+        candidate = np.where(np.isfinite(nearest), nearest, -1.0)
+        nxt = int(np.argmax(candidate))
+        if candidate[nxt] <= 0:
+            break
+        landmarks.append(nxt)
+        tables.append(dijkstra(matrix, directed=False, indices=nxt))
+        nearest = np.minimum(nearest, tables[-1])
+    return landmarks, np.vstack(tables)
+
+
+class LandmarkBounds:
+    """ALT lower bounds from an (L, n) table, `dist[k, v]` = d(L_k, v)."""
+
+    def __init__(self, landmarks, dist):
+        self.landmarks = list(landmarks)
+        self.dist = dist
+
+    @classmethod
+    def build(cls, matrix, count, first=0):
+        return cls(*select_landmarks(matrix, count, first=first))
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    def to_target(self, target, nodes=slice(None)):
+        """Lower bounds on d(v, target) for `nodes` (all nodes by default)."""
+        if not self.landmarks:
+            return 0.0
+        at_target = self.dist[:, target]
+        at_nodes = self.dist[:, nodes]
+        if at_nodes.ndim > at_target.ndim:
+            at_target = at_target[:, None]
+        # Landmarks that cannot reach both ends give no bound
+        ok = np.isfinite(at_target) & np.isfinite(at_nodes)
+        return np.where(ok, np.abs(at_target - at_nodes), 0.0).max(axis=0)
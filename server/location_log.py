@@ -0,0 +1,446 @@
+"""Append-only on-disk log of tracking sessions for warm restarts.
+
+A segment is a pair of files:
+
+* ``<seq>.sessions``: CRC-framed records, one per session state change
+  (start or snapshot, batch sequence number, stop, end). Only starts and
+  snapshots carry JSON (a snapshot is one record for every live session);
+  the rest are a few packed bytes, and replay decodes a segment's JSON
+  with a single json.loads. Small.
+* ``<seq>.fixes``: fixed-size binary location records (FIX_DTYPE) that
+  refer to sessions by a per-segment slot number. Replay maps the file and
+  parses it with one ``np.frombuffer``, whatever its length.
+
+Writes go to buffered files and a background thread flushes and fsyncs
+them every ``fsync_interval`` seconds, so a crash loses at most that much.
+Once ``segment_bytes`` of fixes follow a segment's opening snapshot, that
+thread starts the next segment with a snapshot of every live session
+(fields plus its ring of fixes). Older segments are then redundant and
+deleted once the snapshot is on disk, so replay reads at most a couple of
+segments.
+
+One process owns a log directory at a time: acquire() takes an exclusive
+lock on ``<directory>/LOCK`` and raises LocationLogBusy if another process
+(another worker, or the debug reloader's parent) already holds it.
+"""
+import json
+import mmap
+import operator
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from tracking import TRACK_CAPACITY, TrackingSession
+
+FIX_MAGIC = 0x4C46
+FIX_DTYPE = np.dtype([
+    ("magic", "<u2"), ("reserved", "<u2"), ("slot", "<u4"),
+    ("lat", "<f8"), ("lng", "<f8"), ("ts", "<f8"),
+    ("speed", "<f8"), ("accuracy", "<f8"), ("now", "<f8"),
+])
+_FIX = struct.Struct("<HHI6d")
+_FIX_COLUMNS = ("lat", "lng", "ts", "speed", "accuracy")
+assert _FIX.size == FIX_DTYPE.itemsize == 7 * 8
+
+# crc32 of the payload, payload length
+_FRAME = struct.Struct("<II")
+# Payload: an op byte, then
+#   OP_SESSIONS  JSON [[slot, session id, *_SESSION_FIELDS, base_updates], ...]
+#   OP_SEQ       slot, batch sequence number
+#   OP_STOP/END  slot
+OP_SESSIONS, OP_SEQ, OP_STOP, OP_END = 1, 2, 3, 4
+_OP = struct.Struct("<BI")
+_SEQ = struct.Struct("<BIq")
+
+# Fields persisted per session; the ring of fixes is written as fix records
+_SESSION_FIELDS = (
+    "user_id", "user_name", "duration_minutes", "created_at", "expires_at",
+    "last_updated", "is_active", "last_seq",
+)
+_SESSION_FIELDS_LOGGED = _SESSION_FIELDS + ("base_updates",)
+_session_values = operator.attrgetter(*_SESSION_FIELDS)
+
+
+class LocationLogBusy(Exception):
+    """Raised when another process holds the log directory's lock."""
+
+
+class LocationLog:
+    """Writer for the segment files; replay() rebuilds sessions from them."""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync_interval=0.5,
+                 capacity=TRACK_CAPACITY):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._seq = None
+        self._sessions_file = None
+        self._fixes_file = None
+        self._fixes_written = 0
+        self._snapshot_bytes = 0
+        self._slots = {}
+        self._next_slot = 0
+        self._dirty = False
+        self._closed = False
+        self._lock_file = None
+        # Live sessions (the caller's dict and the lock guarding it), read when rotating
+        self._live = {}
+        self._live_lock = threading.Lock()
+        self._rotate_due = False
+        # Segments replaced by the current one, deleted once its snapshot is fsynced
+        self._retired = []
+        self.records = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.replayed_sessions = 0
+        self.replay_seconds = None
+
+    # ---------- segments ----------
+    def _segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted({int(name.split(".")[0]) for name in names if name.endswith((".sessions", ".fixes"))
+                       and name.split(".")[0].isdigit()})
+
+    def _path(self, seq, ext):
+        return os.path.join(self.directory, f"{seq:08d}.{ext}")
+
+    def acquire(self):
+        """Lock the directory for this process; raises LocationLogBusy if taken."""
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(os.path.join(self.directory, "LOCK"), "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            raise LocationLogBusy(f"Tracking log {self.directory} is in use by another process")
+        # Held (file kept open) for the life of the process
+        self._lock_file = f
+
+    def _fsync(self):
+        for f in (self._sessions_file, self._fixes_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self._dirty = False
+        self.fsyncs += 1
+        self._drop_retired()
+
+    def _drop_retired(self):
+        for seq in self._retired:
+            for ext in ("sessions", "fixes"):
+                try:
+                    os.remove(self._path(seq, ext))
+                except OSError:
+                    pass
+        self._retired = []
+
+    def _sync(self):
+        """Flush under the lock, fsync outside it, then drop retired segments."""
+        with self._lock:
+            if self._closed or not self._dirty:
+                return
+            files = (self._sessions_file, self._fixes_file)
+            for f in files:
+                f.flush()
+            self._dirty = False
+            retired = self._retired
+        try:
+            # Writers keep appending meanwhile; fsync covers what was flushed above
+            for f in files:
+                os.fsync(f.fileno())
+        except (OSError, ValueError):
+            # Closed underneath us (close()); it fsyncs itself
+            return
+        with self._lock:
+            self.fsyncs += 1
+            if retired is self._retired:
+                self._drop_retired()
+
+    def _start_segment(self, live_sessions):
+        """Open the next segment and snapshot `live_sessions` into it.
+
+        The older segments are retired: deleted by the next fsync, once the
+        snapshot that replaces them is durable.
+        """
+        old = self._segments()
+        if self._sessions_file is not None:
+            self._sessions_file.close()
+            self._fixes_file.close()
+        self._seq = (old[-1] + 1) if old else 1
+        self._sessions_file = open(self._path(self._seq, "sessions"), "ab")
+        self._fixes_file = open(self._path(self._seq, "fixes"), "ab")
+        self._fixes_written = 0
+        self._slots = {}
+        self._next_slot = 0
+        self._write_sessions(live_sessions)
+        self._snapshot_bytes = self._fixes_written
+        self._dirty = True
+        self._retired = old
+
+    def _write_frame(self, payload):
+        self._sessions_file.write(_FRAME.pack(zlib.crc32(payload), len(payload)) + payload)
+        self._dirty = True
+        self.records += 1
+
+    def _write_op(self, op, session_id):
+        slot = self._slots.get(session_id)
+        if slot is not None:
+            self._write_frame(_OP.pack(op, slot))
+
+    def _write_fix(self, slot, record, now):
+        self._fixes_file.write(_FIX.pack(FIX_MAGIC, 0, slot, *record, now))
+        self._fixes_written += _FIX.size
+        self._dirty = True
+        self.records += 1
+
+    def _write_sessions(self, items):
+        """One record for the (session_id, session) pairs plus their rings as one block of fixes."""
+        rings = array("d")
+        entries, counts, nows = [], [], []
+        for session_id, session in items:
+            # Never reused within a segment: replay maps fixes by slot
+            slot = self._slots[session_id] = self._next_slot
+            self._next_slot += 1
+            ring = session.locations.ordered()
+            count = len(ring) // len(_FIX_COLUMNS)
+            # total_updates is rebuilt as base + number of fix records that follow
+            entries.append([slot, session_id, *_session_values(session), session.total_updates - count])
+            rings.extend(ring)
+            counts.append(count)
+            nows.append(session.last_updated)
+        if not entries:
+            return
+        self._write_frame(bytes([OP_SESSIONS]) + json.dumps(entries, separators=(",", ":")).encode())
+        rows = np.frombuffer(rings, dtype=np.float64).reshape(-1, len(_FIX_COLUMNS))
+        block = np.zeros(len(rows), dtype=FIX_DTYPE)
+        block["magic"] = FIX_MAGIC
+        block["slot"] = np.repeat([entry[0] for entry in entries], counts)
+        for i, name in enumerate(_FIX_COLUMNS):
+            block[name] = rows[:, i]
+        block["now"] = np.repeat(nows, counts)
+        self._fixes_file.write(block.tobytes())
+        self._fixes_written += block.nbytes
+        self.records += len(block)
+
+    # ---------- writer API (callers serialize these, e.g. under their store lock) ----------
+    def open(self, sessions, sessions_lock):
+        """Start writing: a fresh segment seeded with `sessions` (id -> session).
+
+        `sessions` is the caller's live dict and `sessions_lock` the lock its
+        writes hold; the flush thread takes it when rotating, so snapshots
+        match what has been logged. Call acquire() first.
+        """
+        with sessions_lock:
+            with self._lock:
+                self._live, self._live_lock = sessions, sessions_lock
+                self._start_segment(list(sessions.items()))
+                self._fsync()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def session_created(self, session_id, session):
+        with self._lock:
+            self._write_sessions([(session_id, session)])
+
+    def location_added(self, session_id, record, now):
+        """Log one fix; a full segment is rotated by the flush thread."""
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is not None:
+                self._write_fix(slot, record, now)
+            # Counted past the snapshot, so a large snapshot cannot trigger rotation by itself
+            if self._fixes_written - self._snapshot_bytes >= self.segment_bytes:
+                self._rotate_due = True
+
+    def sequence(self, session_id, last_seq):
+        """Record the session's batch high-water mark (dedupe survives restarts)."""
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is not None:
+                self._write_frame(_SEQ.pack(OP_SEQ, slot, last_seq))
+
+    def session_stopped(self, session_id):
+        with self._lock:
+            self._write_op(OP_STOP, session_id)
+
+    def session_ended(self, session_id):
+        with self._lock:
+            self._write_op(OP_END, session_id)
+            self._slots.pop(session_id, None)
+
+    def rotate(self):
+        """Start the next segment with a snapshot of the live sessions."""
+        # Same lock order as the writers: the caller's lock, then ours
+        with self._live_lock:
+            with self._lock:
+                if self._closed:
+                    return
+                self._start_segment(list(self._live.items()))
+                self._rotate_due = False
+                self.rotations += 1
+
+    def _flush_loop(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            if self._rotate_due:
+                self.rotate()
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._sessions_file is not None and not self._closed:
+                self._fsync()
+                self._sessions_file.close()
+                self._fixes_file.close()
+            self._closed = True
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    # ---------- replay ----------
+    def _read_sessions(self, seq):
+        """Valid (op, slot, value) records of a .sessions file, stopping at a torn tail.
+
+        Sessions come out one record each, as (OP_SESSIONS, slot, (session
+        id, fields)); value is the sequence number for OP_SEQ, else None.
+        """
+        try:
+            with open(self._path(seq, "sessions"), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        frames, pos = [], 0
+        while pos + _FRAME.size <= len(data):
+            crc, length = _FRAME.unpack_from(data, pos)
+            start = pos + _FRAME.size
+            payload = data[start:start + length]
+            if not length or len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            frames.append(payload)
+            pos = start + length
+
+        # All of the segment's session JSON in one decode
+        decoded = iter(json.loads(b"[" + b",".join(p[1:] for p in frames if p[0] == OP_SESSIONS) + b"]"))
+        records = []
+        for payload in frames:
+            op = payload[0]
+            if op == OP_SESSIONS:
+                for slot, session_id, *values in next(decoded):
+                    records.append((op, slot, (session_id, dict(zip(_SESSION_FIELDS_LOGGED, values)))))
+            elif op == OP_SEQ:
+                records.append(_SEQ.unpack(payload))
+            else:
+                records.append((*_OP.unpack(payload), None))
+        return records
+
+    def _read_fixes(self, seq):
+        """(slots, rows) of a memory-mapped .fixes file, grouped by slot in write order.
+
+        rows[:, 1:6] are the (lat, lng, ts, speed, accuracy) fixes and rows[:, 6]
+        the update times; a record is 7 doubles with the header in the first.
+        """
+        path = self._path(seq, "fixes")
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        count = size // FIX_DTYPE.itemsize
+        if not count:
+            return np.empty(0, dtype=np.uint32), np.empty((0, 7))
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            words = np.frombuffer(mm, dtype="<u4", count=count * 14).reshape(count, 14)
+            # Torn or zero-filled tail after a crash fails the magic check
+            valid = np.flatnonzero((words[:, 0] & 0xFFFF) == FIX_MAGIC)
+            order = valid[np.argsort(words[valid, 1], kind="stable")]
+            slots = words[order, 1]
+            rows = np.frombuffer(mm, dtype="<f8", count=count * 7).reshape(count, 7)[order]
+            del words
+        return slots, rows
+
+    def replay(self, window_seconds, now=None):
+        """[(session_id, TrackingSession)] live within the last window_seconds."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        state = {}  # session_id -> [fields, [fix arrays], fix count, last fix time]
+        for seq in self._segments():
+            slot_ids = {}
+            for op, slot, value in self._read_sessions(seq):
+                if op == OP_SESSIONS:
+                    session_id, fields = value
+                    slot_ids[slot] = session_id
+                    state[session_id] = [fields, [], 0, None]
+                    continue
+                session_id = slot_ids.get(slot)
+                if op == OP_END:
+                    state.pop(session_id, None)
+                elif session_id in state:
+                    if op == OP_STOP:
+                        state[session_id][0]["is_active"] = False
+                    elif op == OP_SEQ:
+                        state[session_id][0]["last_seq"] = value
+
+            slots, rows = self._read_fixes(seq)
+            if not len(slots):
+                continue
+            starts = np.flatnonzero(np.diff(slots, prepend=-1))
+            ends = np.append(starts[1:], len(slots))
+            groups = zip(
+                slots[starts].tolist(), np.maximum(starts, ends - self.capacity).tolist(), ends.tolist(),
+                (ends - starts).tolist(), rows[ends - 1, 6].tolist(),
+            )
+            for slot, a, b, count, last_fix in groups:
+                entry = state.get(slot_ids.get(slot))
+                if entry is None:
+                    continue
+                entry[1].append(rows[a:b, 1:6])
+                entry[2] += count
+                entry[3] = last_fix
+
+        sessions = []
+        for session_id, (fields, chunks, count, last_fix) in state.items():
+            expires_at = fields["expires_at"]
+            last_updated = max(fields["last_updated"], float(last_fix or 0.0))
+            if (expires_at is not None and expires_at < now) or last_updated < now - window_seconds:
+                continue
+            fields = dict(fields, last_updated=last_updated, total_updates=fields["base_updates"] + count)
+            if len(chunks) == 1:
+                ring = chunks[0]
+            else:
+                ring = np.concatenate(chunks)[-self.capacity:] if chunks else np.empty((0, 5))
+            session = TrackingSession.restore(fields, capacity=self.capacity)
+            session.locations.load(ring)
+            sessions.append((session_id, session))
+
+        self.replayed_sessions = len(sessions)
+        self.replay_seconds = round(time.perf_counter() - started, 4)
+        return sessions
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segment": self._seq,
+                "segment_fix_bytes": self._fixes_written,
+                "records": self.records,
+                "fsyncs": self.fsyncs,
+                "rotations": self.rotations,
+                "retired_segments": len(self._retired),
+                "replayed_sessions": self.replayed_sessions,
+                "replay_seconds": self.replay_seconds,
+            }
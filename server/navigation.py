@@ -0,0 +1,461 @@
+"""Stateful navigation sessions with incremental re-routing.
+
+A session keeps a D* Lite search (dstar_lite.py) over the area between the
+traveller and the destination: the road network when both ends snap to it,
+the risk lattice otherwise. Position updates only move the search start and
+incidents reported nearby only re-cost the edges they touch, so a reroute
+costs a fraction of a fresh /safe_route search and needs no DB round trip.
+
+Sessions live in a navigation worker process: a one-worker RoutePool, so
+planning and repair never hold the GIL on web threads and every session
+stays pinned to the process that has its search state. NavigationClient is
+the web side; it submits jobs and queues reported incidents for them.
+"""
+import math
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from dstar_lite import DStarLite
+from incident_index import IncidentIndex
+from incident_store import IncidentsRef, shared_route_incidents
+from risk_field import KM_PER_DEG, RiskField
+from road_graph import RISK_RADIUS_KM
+from route_pool import RoutePoolBusy
+from routing import (
+    ROAD_SNAP_MAX_KM,
+    ROUTE_STEP,
+    get_road_graph,
+    init_route_worker,
+    lattice_cost_graph,
+    route_bbox,
+    summarize_route,
+)
+
+
+def _bbox_contains(bbox, lat, lng):
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+class _RoadArea:
+    """Road-graph vertices inside a bbox as a local CSR graph."""
+
+    kind = "road"
+
+    def __init__(self, graph, bbox, risk_weight):
+        self.graph = graph
+        self.risk_weight = risk_weight
+        min_lat, min_lng, max_lat, max_lng = bbox
+        self.nodes = np.flatnonzero(
+            (graph.lats >= min_lat) & (graph.lats <= max_lat)
+            & (graph.lngs >= min_lng) & (graph.lngs <= max_lng)
+        )
+        self.lats = graph.lats[self.nodes]
+        self.lngs = graph.lngs[self.nodes]
+
+        u = self._local(graph.edge_u)
+        v = self._local(graph.edge_v)
+        keep = (u >= 0) & (v >= 0)
+        self.eids = np.flatnonzero(keep)
+        u, v = u[keep], v[keep]
+
+        # Both directions of every road edge, in CSR (row-major) order
+        src = np.concatenate([u, v])
+        dst = np.concatenate([v, u])
+        order = np.lexsort((dst, src))
+        self.indices = dst[order]
+        self.edge_ids = np.concatenate([self.eids, self.eids])[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(self.nodes)))])
+
+    def _local(self, global_ids):
+        if not len(self.nodes):
+            return np.full(len(global_ids), -1)
+        pos = np.minimum(np.searchsorted(self.nodes, global_ids), len(self.nodes) - 1)
+        return np.where(self.nodes[pos] == global_ids, pos, -1)
+
+    def costs(self, incidents, incident_index):
+        length = self.graph.edge_length[self.edge_ids]
+        mids = np.unique(self.edge_ids)
+        risk = np.zeros(self.graph.edge_count)
+        if len(incident_index) and len(mids):
+            risk[mids] = incident_index.risk_at(
+                self.graph.mid_lats[mids], self.graph.mid_lngs[mids], RISK_RADIUS_KM
+            )
+        return length * (1 + self.risk_weight * risk[self.edge_ids])
+
+    def add_incidents(self, new, incident_index, search):
+        """(edge positions, costs) re-costed for edges within the risk radius of `new`."""
+        lats = np.array([inc["lat"] for inc in new])
+        lngs = np.array([inc["lng"] for inc in new])
+        lat_pad = RISK_RADIUS_KM / KM_PER_DEG
+        lng_pad = lat_pad / math.cos(math.radians(min(float(np.max(np.abs(lats))) + lat_pad, 89.0)))
+        mids = np.unique(self.edge_ids)
+        mid_lats, mid_lngs = self.graph.mid_lats[mids], self.graph.mid_lngs[mids]
+        near = mids[
+            (mid_lats >= lats.min() - lat_pad) & (mid_lats <= lats.max() + lat_pad)
+            & (mid_lngs >= lngs.min() - lng_pad) & (mid_lngs <= lngs.max() + lng_pad)
+        ]
+        if not len(near):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        risk = incident_index.risk_at(self.graph.mid_lats[near], self.graph.mid_lngs[near], RISK_RADIUS_KM)
+        edges = np.flatnonzero(np.isin(self.edge_ids, near))
+        eids = self.edge_ids[edges]
+        return edges, self.graph.edge_length[eids] * (1 + self.risk_weight * risk[np.searchsorted(near, eids)])
+
+    def locate(self, lat, lng):
+        """Local vertex for a coordinate, or None when off the area's roads."""
+        node, gap = self.graph.nearest_node(lat, lng)
+        if node is None or gap > ROAD_SNAP_MAX_KM:
+            return None
+        local = int(self._local(np.array([node]))[0])
+        return local if local >= 0 else None
+
+    def path(self, nodes, start, end):
+        return [start] + [(float(self.lats[v]), float(self.lngs[v])) for v in nodes] + [end]
+
+
+class _LatticeArea:
+    """Risk lattice over a bbox, anchored at the session's first start."""
+
+    kind = "lattice"
+
+    def __init__(self, origin, bbox, risk_weight):
+        self.origin = origin
+        self.bbox = bbox
+        self.risk_weight = risk_weight
+        self.field = None
+
+    def costs(self, incidents, incident_index):
+        # Same origin and bbox every time, so the CSR structure never changes
+        self.field = RiskField.build(
+            self.origin, ROUTE_STEP, self.bbox,
+            [inc["lat"] for inc in incidents],
+            [inc["lng"] for inc in incidents],
+            [inc["severity"] for inc in incidents],
+        )
+        matrix, self.lats, self.lngs = lattice_cost_graph(self.field, self.risk_weight)
+        self.indptr, self.indices = matrix.indptr, matrix.indices
+        return matrix.data
+
+    def add_incidents(self, new, incident_index, search):
+        """(edge positions, costs) for edges into nodes whose risk `new` changes.
+
+        Only the raster window around the new incidents is restamped; an
+        edge's cost is its length plus risk_weight * risk at its target.
+        """
+        lats = [inc["lat"] for inc in new]
+        lngs = [inc["lng"] for inc in new]
+        r0, r1, c0, c1 = self.field.window(lats, lngs)
+        before = self.field.values[r0:r1, c0:c1].copy()
+        self.field.stamp(lats, lngs, [inc["severity"] for inc in new])
+        delta = self.field.values[r0:r1, c0:c1] - before
+        rr, cc = np.nonzero(delta)
+        # Row-major, so `nodes` is sorted
+        nodes = (rr + r0) * self.field.shape[1] + (cc + c0)
+        edges = search.edges_into(nodes)
+        rise = delta[rr, cc][np.searchsorted(nodes, self.indices[edges])]
+        return edges, search.costs[edges] + self.risk_weight * rise
+
+    def locate(self, lat, lng):
+        i, j = self.field.node_index(lat, lng)
+        rows, cols = self.field.shape
+        r, c = i - self.field.i0, j - self.field.j0
+        if 0 <= r < rows and 0 <= c < cols:
+            return r * cols + c
+        return None
+
+    def path(self, nodes, start, end):
+        path = [(float(self.lats[v]), float(self.lngs[v])) for v in nodes]
+        path[0] = start
+        if path[-1] != tuple(end):
+            path.append(end)
+        return path
+
+
+class NavigationSession:
+    """One traveller's route to a fixed destination, repaired incrementally."""
+
+    def __init__(self, session_id, start, end, incidents, bbox, risk_weight=2.0, meta=None):
+        self.id = session_id
+        self.end = tuple(end)
+        self.risk_weight = risk_weight
+        self.meta = meta or {}
+        self.created_at = self.touched_at = time.monotonic()
+        self.reroutes = 0
+        self._pending = []
+        self._plan(tuple(start), incidents, bbox)
+
+    def _plan(self, start, incidents, bbox):
+        self.start = start
+        self.bbox = bbox
+        self.incidents = list(incidents)
+        self.incident_index = IncidentIndex.from_incidents(self.incidents)
+        # `incidents` is a fresh fetch, so it already covers anything queued
+        self._pending = []
+
+        graph = get_road_graph()
+        area = None
+        if graph is not None:
+            area = _RoadArea(graph, bbox, self.risk_weight)
+            costs = area.costs(self.incidents, self.incident_index)
+            source, goal = area.locate(*start), area.locate(*self.end)
+        if area is None or source is None or goal is None:
+            area = _LatticeArea(start, bbox, self.risk_weight)
+            costs = area.costs(self.incidents, self.incident_index)
+            source, goal = area.locate(*start), area.locate(*self.end)
+
+        self.area = area
+        self.search = DStarLite(area.indptr, area.indices, costs, area.lats, area.lngs, source, goal)
+
+    def replan(self, start, incidents, bbox):
+        """Start over from scratch, e.g. after leaving the planned area."""
+        self._plan(tuple(start), incidents, bbox)
+        self.reroutes += 1
+
+    def locate(self, lat, lng):
+        """Search vertex for a position, or None when outside the planned area."""
+        if not _bbox_contains(self.bbox, lat, lng):
+            return None
+        return self.area.locate(lat, lng)
+
+    def add_incident(self, incident):
+        """Queue a newly reported incident; applied on the next update."""
+        self._pending.append(incident)
+
+    def update(self, position, deadline=None):
+        """Move to `position` (inside the area) and repair the route.
+
+        Returns (path, stats); path is None if the repair did not finish
+        before `deadline` or the destination is unreachable.
+        """
+        expanded = self.search.expanded
+        t0 = time.perf_counter()
+        self.touched_at = time.monotonic()
+
+        node = self.locate(*position)
+        if node is not None:
+            self.start = tuple(position)
+            self.search.move_start(node)
+
+        changed = 0
+        if self._pending:
+            new, self._pending = self._pending, []
+            self.incidents.extend(new)
+            self.incident_index = IncidentIndex.from_incidents(self.incidents)
+            edges, costs = self.area.add_incidents(new, self.incident_index, self.search)
+            changed = self.search.update_edges(edges, costs)
+
+        done = self.search.compute(deadline)
+        nodes = self.search.path() if done else None
+        stats = {
+            "graph": self.area.kind,
+            "expanded": self.search.expanded - expanded,
+            "changed_edges": changed,
+            "ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if nodes is None:
+            return None, stats
+        return self.area.path(nodes, self.start, self.end), stats
+
+
+class NavigationSessions:
+    """Registry of navigation sessions with idle expiry (navigation worker side)."""
+
+    def __init__(self, max_sessions=200, ttl_seconds=1800):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.incidents_routed = 0
+
+    def _expire(self, now):
+        stale = [sid for sid, s in self._sessions.items() if now - s.touched_at > self.ttl_seconds]
+        for sid in stale:
+            del self._sessions[sid]
+        self.expired += len(stale)
+
+    def create(self, start, end, incidents, bbox, risk_weight=2.0, meta=None):
+        """New session with its search initialized (not yet computed)."""
+        session = NavigationSession(
+            secrets.token_urlsafe(12), start, end, incidents, bbox, risk_weight, meta
+        )
+        with self._lock:
+            self._expire(time.monotonic())
+            if len(self._sessions) >= self.max_sessions:
+                # Drop the least recently used session to make room
+                oldest = min(self._sessions.values(), key=lambda s: s.touched_at)
+                del self._sessions[oldest.id]
+                self.expired += 1
+            self._sessions[session.id] = session
+            self.created += 1
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.monotonic() - session.touched_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                self.expired += 1
+                return None
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def notify_incident(self, lat, lng, severity):
+        """Queue a new incident on every session whose area it falls in."""
+        incident = {"lat": lat, "lng": lng, "severity": severity}
+        with self._lock:
+            affected = [s for s in self._sessions.values() if _bbox_contains(s.bbox, lat, lng)]
+            for session in affected:
+                session.add_incident(incident)
+            self.incidents_routed += len(affected)
+        return len(affected)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "expired": self.expired,
+                "incidents_routed": self.incidents_routed,
+            }
+
+
+# ---------- navigation worker process ----------
+_sessions = None
+
+
+def init_navigation_worker(road_network_path=None, num_landmarks=8, max_sessions=200, ttl_seconds=1800):
+    """Pool initializer: the road graph (unless inherited) and an empty registry."""
+    global _sessions
+    init_route_worker(road_network_path, num_landmarks)
+    _sessions = NavigationSessions(max_sessions, ttl_seconds)
+
+
+def _incidents(source, bbox, fallback=()):
+    """Route incidents for bbox from a published IncidentsRef.
+
+    Until the web process has published one, `source` is the incident list
+    it fetched itself (or None, leaving `fallback` in use).
+    """
+    if isinstance(source, IncidentsRef):
+        return shared_route_incidents(source, bbox)
+    return source if source is not None else list(fallback)
+
+
+def _summary(session, path):
+    meta = session.meta
+    return summarize_route(
+        "recommended", path, session.incident_index, meta["speed"], meta["geometry"], meta["tolerance_m"]
+    )
+
+
+def _notify(reported):
+    for incident in reported:
+        _sessions.notify_incident(incident["lat"], incident["lng"], incident["severity"])
+
+
+def plan_session(start, end, source, meta, time_budget, reported=()):
+    """Worker job: (session id, route, stats); id and route are None on timeout."""
+    _notify(reported)
+    bbox = route_bbox(start, end)
+    session = _sessions.create(start, end, _incidents(source, bbox), bbox, meta=meta)
+    path, stats = session.update(start, deadline=time.monotonic() + time_budget)
+    if path is None:
+        _sessions.remove(session.id)
+        return None, None, stats
+    return session.id, _summary(session, path), stats
+
+
+def update_session(session_id, position, source, time_budget, reported=()):
+    """Worker job: (route or None, stats, replanned), or None for an unknown session."""
+    _notify(reported)
+    session = _sessions.get(session_id)
+    if session is None:
+        return None
+    replanned = False
+    if session.locate(*position) is None:
+        # Left the planned area: start a fresh search from here
+        bbox = route_bbox(position, session.end)
+        session.replan(position, _incidents(source, bbox, session.incidents), bbox)
+        replanned = True
+    path, stats = session.update(position, deadline=time.monotonic() + time_budget)
+    # Search state is kept on timeout; the next update resumes the repair
+    return (_summary(session, path) if path is not None else None), stats, replanned
+
+
+def stop_session(session_id, reported=()):
+    _notify(reported)
+    return _sessions.remove(session_id)
+
+
+def session_stats(reported=()):
+    _notify(reported)
+    return _sessions.stats()
+
+
+class NavigationClient:
+    """Web-process handle on the navigation worker.
+
+    `pool` is a one-worker RoutePool started with init_navigation_worker.
+    Incidents reported here are queued (never waiting on the worker) and
+    handed over with the next job, before it runs. Job methods raise
+    RoutePoolBusy or concurrent.futures.TimeoutError when the worker is
+    backed up; a timed-out job that never started gives its incidents back.
+    """
+
+    def __init__(self, pool, time_budget, max_reported=4096):
+        self.pool = pool
+        self.time_budget = time_budget
+        self._reported = deque(maxlen=max_reported)
+
+    def notify_incident(self, lat, lng, severity):
+        self._reported.append({"lat": lat, "lng": lng, "severity": severity})
+
+    def _run(self, fn, *args):
+        reported = []
+        while self._reported:
+            try:
+                reported.append(self._reported.popleft())
+            except IndexError:
+                break
+        try:
+            future = self.pool.submit(fn, *args, reported)
+        except RoutePoolBusy:
+            self._reported.extendleft(reversed(reported))
+            raise
+        try:
+            # Up to two search budgets: queueing plus the search itself
+            return future.result(timeout=2 * self.time_budget)
+        except FutureTimeout:
+            self.pool.record_timeout()
+            if future.cancel():
+                self._reported.extendleft(reversed(reported))
+            raise
+
+    def start(self, start, end, source, meta):
+        """(session id, route, stats) for a new session; id is None if planning timed out."""
+        return self._run(plan_session, tuple(start), tuple(end), source, meta, self.time_budget)
+
+    def update(self, session_id, position, source):
+        """(route or None, stats, replanned), or None if the session is gone."""
+        return self._run(update_session, session_id, tuple(position), source, self.time_budget)
+
+    def stop(self, session_id):
+        return self._run(stop_session, session_id)
+
+    def stats(self):
+        stats = self._run(session_stats)
+        stats.update(queued_incidents=len(self._reported), pool=self.pool.stats())
+        return stats
@@ -0,0 +1,80 @@
+"""Route geometry compaction: Douglas-Peucker simplification and Google
+encoded polylines (https://developers.google.com/maps/documentation/utilities/polylinealgorithm).
+"""
+import numpy as np
+
+from geo_math import local_xy_km
+
+
+def _local_meters(pts):
+    """Equirectangular projection around the path's mean latitude, in metres."""
+    x, y = local_xy_km(pts[:, 0], pts[:, 1], pts[:, 0].mean())
+    return np.column_stack([x, y]) * 1000
+
+
+def _segment_distances(xy, a, b):
+    """Distance of every point in xy to the segment a-b."""
+    ab = b - a
+    denom = float(ab @ ab)
+    if denom == 0.0:
+        return np.hypot(*(xy - a).T)
+    t = np.clip(((xy - a) @ ab) / denom, 0.0, 1.0)
+    return np.hypot(*(xy - (a + t[:, None] * ab)).T)
+
+
+def simplify(path, tolerance_m=5.0):
+    """Douglas-Peucker: drop points within `tolerance_m` of the simplified line.
+
+    Endpoints are always kept; returns a list of the kept (lat, lng) points.
+    """
+    if len(path) <= 2 or tolerance_m <= 0:
+        return list(path)
+    xy = _local_meters(np.asarray(path, dtype=float))
+    keep = np.zeros(len(path), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(path) - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        if hi - lo < 2:
+            continue
+        dist = _segment_distances(xy[lo + 1:hi], xy[lo], xy[hi])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance_m:
+            mid = lo + 1 + k
+            keep[mid] = True
+            stack.append((lo, mid))
+            stack.append((mid, hi))
+    return [path[i] for i in np.flatnonzero(keep)]
+
+
+def encode(path, precision=5):
+    """Google encoded polyline string for a [(lat, lng), ...] path."""
+    if not len(path):
+        return ""
+    values = np.round(np.asarray(path, dtype=float) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=0).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    out = []
+    for v in zigzag.tolist():
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def decode(encoded, precision=5):
+    """Inverse of encode(): [(lat, lng), ...]."""
+    values = []
+    shift = result = 0
+    for ch in encoded:
+        b = ord(ch) - 63
+        result |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            shift = result = 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [(float(lat), float(lng)) for lat, lng in coords]
@@ -0,0 +1,134 @@
+"""Incident risk precomputed on the safe-route search lattice.
+
+The A* search in app.py walks a lattice of ``step``-degree cells anchored at
+the route start. RiskField evaluates ``sum(severity / (1 + d))`` over every
+incident within ``radius_km`` once per lattice node, so the search reads a
+node's risk with a single array index regardless of the incident count.
+"""
+import math
+
+import numpy as np
+
+from geo_math import EARTH_RADIUS_KM, haversine_km
+
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+class RiskField:
+    """Dense risk raster over lattice indices [i0, i0 + rows) x [j0, j0 + cols)."""
+
+    def __init__(self, origin, step, i0, j0, values):
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.step = step
+        self.i0 = i0
+        self.j0 = j0
+        self.values = values
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def node_coords(self, i, j):
+        """Lat/lng of lattice node(s) (i, j)."""
+        return (
+            self.origin[0] + np.asarray(i) * self.step,
+            self.origin[1] + np.asarray(j) * self.step,
+        )
+
+    def node_index(self, lat, lng):
+        """Nearest lattice node (i, j) for a coordinate."""
+        return (
+            int(round((lat - self.origin[0]) / self.step)),
+            int(round((lng - self.origin[1]) / self.step)),
+        )
+
+    def risk(self, i, j):
+        """Risk at a single node; nodes outside the raster carry no risk."""
+        r, c = i - self.i0, j - self.j0
+        if 0 <= r < self.values.shape[0] and 0 <= c < self.values.shape[1]:
+            return float(self.values[r, c])
+        return 0.0
+
+    def risk_many(self, ii, jj):
+        """Vectorized ``risk`` for arrays of node indices."""
+        r = np.asarray(ii) - self.i0
+        c = np.asarray(jj) - self.j0
+        inside = (r >= 0) & (r < self.values.shape[0]) & (c >= 0) & (c < self.values.shape[1])
+        out = np.zeros(np.shape(r), dtype=float)
+        out[inside] = self.values[r[inside], c[inside]]
+        return out
+
+    @classmethod
+    def build(cls, origin, step, bbox, lats, lngs, severities, radius_km=1.0):
+        """Rasterize incidents over ``bbox`` = (min_lat, min_lng, max_lat, max_lng).
+
+        The raster is padded by ``radius_km`` so every node that can see an
+        incident inside the bbox is covered; incidents are then stamp()ed.
+        """
+        min_lat, min_lng, max_lat, max_lng = bbox
+
+        lat_pad = radius_km / KM_PER_DEG
+        max_abs_lat = min(max(abs(min_lat), abs(max_lat)) + lat_pad, 89.0)
+        lng_pad = radius_km / (KM_PER_DEG * math.cos(math.radians(max_abs_lat)))
+
+        i0 = math.floor((min_lat - lat_pad - origin[0]) / step)
+        i1 = math.ceil((max_lat + lat_pad - origin[0]) / step)
+        j0 = math.floor((min_lng - lng_pad - origin[1]) / step)
+        j1 = math.ceil((max_lng + lng_pad - origin[1]) / step)
+        field = cls(origin, step, i0, j0, np.zeros((i1 - i0 + 1, j1 - j0 + 1)))
+        field.stamp(lats, lngs, severities, radius_km)
+        return field
+
+    def _kernel(self, lats, lngs, radius_km):
+        """(nearest node rows, cols, window half-height, half-width) per incident."""
+        lat_pad = radius_km / KM_PER_DEG
+        max_abs_lat = min(float(np.max(np.abs(lats))) + lat_pad, 89.0)
+        lng_pad = radius_km / (KM_PER_DEG * math.cos(math.radians(max_abs_lat)))
+        # Nearest node per incident; the incident sits at most half a cell away
+        ci = np.rint((lats - self.origin[0]) / self.step).astype(int)
+        cj = np.rint((lngs - self.origin[1]) / self.step).astype(int)
+        return ci, cj, math.ceil(lat_pad / self.step + 0.5), math.ceil(lng_pad / self.step + 0.5)
+
+    def window(self, lats, lngs, radius_km=1.0):
+        """(row_start, row_stop, col_start, col_stop) of the raster stamp() can touch."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        if len(lats) == 0:
+            return 0, 0, 0, 0
+        ci, cj, wi, wj = self._kernel(lats, lngs, radius_km)
+        rows, cols = self.values.shape
+        r, c = ci - self.i0, cj - self.j0
+        return (
+            min(max(int(r.min()) - wi, 0), rows), min(max(int(r.max()) + wi + 1, 0), rows),
+            min(max(int(c.min()) - wj, 0), cols), min(max(int(c.max()) + wj + 1, 0), cols),
+        )
+
+    def stamp(self, lats, lngs, severities, radius_km=1.0):
+        """Add incidents' risk onto the raster in place.
+
+        Each incident is stamped onto the nodes in its kernel window with
+        the exact haversine decay, one vectorized pass per window offset.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        severities = np.asarray(severities, dtype=float)
+        if len(lats) == 0:
+            return
+        values = self.values
+        ci, cj, wi, wj = self._kernel(lats, lngs, radius_km)
+
+        for di in range(-wi, wi + 1):
+            for dj in range(-wj, wj + 1):
+                ii = ci + di
+                jj = cj + dj
+                node_lat, node_lng = self.node_coords(ii, jj)
+                d = haversine_km(lats, lngs, node_lat, node_lng)
+                r = ii - self.i0
+                c = jj - self.j0
+                hit = (
+                    (d < radius_km)
+                    & (r >= 0) & (r < values.shape[0])
+                    & (c >= 0) & (c < values.shape[1])
+                )
+                if np.any(hit):
+                    np.add.at(values, (r[hit], c[hit]), severities[hit] / (1 + d[hit]))
@@ -0,0 +1,209 @@
+"""Road-network routing on networkx for the safe-route engine.
+
+Loads a GeoJSON road extract (LineString / MultiLineString features, e.g.
+an OSM extract exported with ``osmium export -f geojson``) into an
+undirected networkx graph. Node coordinates, edge endpoints and edge
+midpoints are kept in NumPy arrays so per-request risk weighting and
+snapping stay vectorized, and landmark distance tables for the A*
+heuristic are computed once at load time.
+"""
+import json
+import math
+import os
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+from geo_math import EARTH_RADIUS_KM, haversine_km
+from landmarks import LandmarkBounds
+
+# Risk is looked up at edge midpoints, so pad the bbox by the risk radius
+RISK_RADIUS_KM = 1.0
+
+
+def _unit_xyz(lats, lngs):
+    lat = np.radians(lats)
+    lng = np.radians(lngs)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def _iter_lines(geometry):
+    if not geometry:
+        return
+    if geometry.get("type") == "LineString":
+        yield geometry.get("coordinates") or []
+    elif geometry.get("type") == "MultiLineString":
+        for line in geometry.get("coordinates") or []:
+            yield line
+
+
+class RoadGraph:
+    """Shared, read-only road graph with risk-aware shortest-path queries."""
+
+    def __init__(self, lats, lngs, edge_u, edge_v, num_landmarks=8):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.edge_u = np.asarray(edge_u, dtype=np.int64)
+        self.edge_v = np.asarray(edge_v, dtype=np.int64)
+        self.edge_length = haversine_km(
+            self.lats[self.edge_u], self.lngs[self.edge_u],
+            self.lats[self.edge_v], self.lngs[self.edge_v],
+        )
+        self.mid_lats = (self.lats[self.edge_u] + self.lats[self.edge_v]) / 2
+        self.mid_lngs = (self.lngs[self.edge_u] + self.lngs[self.edge_v]) / 2
+
+        self.graph = nx.Graph()
+        self.graph.add_nodes_from(range(len(self.lats)))
+        self.graph.add_edges_from(
+            (int(u), int(v), {"length": float(length), "eid": eid})
+            for eid, (u, v, length) in enumerate(zip(self.edge_u, self.edge_v, self.edge_length))
+        )
+
+        self._kdtree = cKDTree(_unit_xyz(self.lats, self.lngs)) if len(self.lats) else None
+        self.landmark_bounds = self._build_landmarks(num_landmarks)
+
+    @classmethod
+    def from_geojson(cls, path, precision=6, num_landmarks=8):
+        """Parse a GeoJSON road extract; vertices are merged at `precision` decimals."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        node_ids = {}
+        lats, lngs, edge_u, edge_v = [], [], [], []
+
+        def node_for(coord):
+            key = (round(coord[1], precision), round(coord[0], precision))
+            nid = node_ids.get(key)
+            if nid is None:
+                nid = node_ids[key] = len(lats)
+                lats.append(key[0])
+                lngs.append(key[1])
+            return nid
+
+        for feature in data.get("features", []):
+            for line in _iter_lines(feature.get("geometry")):
+                prev = None
+                for coord in line:
+                    nid = node_for(coord)
+                    if prev is not None and prev != nid:
+                        edge_u.append(prev)
+                        edge_v.append(nid)
+                    prev = nid
+
+        return cls(lats, lngs, edge_u, edge_v, num_landmarks=num_landmarks)
+
+    @property
+    def node_count(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_u)
+
+    @property
+    def landmarks(self):
+        return self.landmark_bounds.landmarks
+
+    def _length_matrix(self):
+        n = self.node_count
+        return csr_matrix(
+            (
+                np.concatenate([self.edge_length, self.edge_length]),
+                (np.concatenate([self.edge_u, self.edge_v]), np.concatenate([self.edge_v, self.edge_u])),
+            ),
+            shape=(n, n),
+        )
+
+    def _build_landmarks(self, count):
+        """Landmark distance tables over edge lengths (see landmarks.py)."""
+        if self.node_count == 0 or self.edge_count == 0:
+            return LandmarkBounds([], np.empty((0, self.node_count)))
+        return LandmarkBounds.build(
+            self._length_matrix(), count, first=int(np.argmax(self.lats + self.lngs))
+        )
+
+    def nearest_node(self, lat, lng):
+        """(node, distance_km) of the graph vertex closest to a coordinate."""
+        if self._kdtree is None:
+            return None, math.inf
+        chord, node = self._kdtree.query(_unit_xyz([lat], [lng])[0])
+        return int(node), 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+    def lower_bound(self, u, target):
+        """Admissible length bound: max of haversine and the landmark (ALT) bound."""
+        bound = float(haversine_km(self.lats[u], self.lngs[u], self.lats[target], self.lngs[target]))
+        return max(bound, float(self.landmark_bounds.to_target(target, u)))
+
+    def edge_risks(self, incident_index, bbox, radius_km=RISK_RADIUS_KM):
+        """{eid: risk} for edges whose midpoint lies in the padded bbox."""
+        if incident_index is None or len(incident_index) == 0:
+            return {}
+        min_lat, min_lng, max_lat, max_lng = bbox
+        pad = radius_km / 111.0
+        lng_pad = pad / max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 0.01)
+        mask = (
+            (self.mid_lats >= min_lat - pad) & (self.mid_lats <= max_lat + pad)
+            & (self.mid_lngs >= min_lng - lng_pad) & (self.mid_lngs <= max_lng + lng_pad)
+        )
+        eids = np.flatnonzero(mask)
+        if not len(eids):
+            return {}
+        risk = incident_index.risk_at(self.mid_lats[eids], self.mid_lngs[eids], radius_km)
+        return {int(e): float(r) for e, r in zip(eids, risk) if r > 0}
+
+    def route(self, start, end, incident_index=None, bbox=None, risk_weight=2.0, method="astar",
+              avoid=None, avoid_factor=2.5):
+        """Risk-weighted shortest path between two (lat, lng) points.
+
+        Edge cost is ``length * (1 + risk_weight * risk)`` so it never drops
+        below the edge length and the length-based heuristic stays admissible.
+        Edges between vertices nearest to the ``avoid`` points cost
+        ``avoid_factor`` times more, which is how alternatives are diversified.
+        Returns a [(lat, lng), ...] path, or None when no path exists.
+        """
+        source, _ = self.nearest_node(*start)
+        target, _ = self.nearest_node(*end)
+        if source is None or target is None:
+            return None
+
+        if bbox is None:
+            bbox = (
+                min(start[0], end[0]), min(start[1], end[1]),
+                max(start[0], end[0]), max(start[1], end[1]),
+            )
+        risks = self.edge_risks(incident_index, bbox)
+        avoided = set()
+        if avoid:
+            pts = np.asarray(avoid, dtype=float)
+            _, nodes = self._kdtree.query(_unit_xyz(pts[:, 0], pts[:, 1]))
+            avoided = set(int(n) for n in np.atleast_1d(nodes))
+
+        def weight(u, v, d):
+            cost = d["length"] * (1 + risk_weight * risks.get(d["eid"], 0.0))
+            if u in avoided and v in avoided:
+                cost *= avoid_factor
+            return cost
+
+        try:
+            if method == "dijkstra":
+                nodes = nx.dijkstra_path(self.graph, source, target, weight=weight)
+            else:
+                nodes = nx.astar_path(
+                    self.graph, source, target, heuristic=self.lower_bound, weight=weight
+                )
+        except nx.NetworkXNoPath:
+            return None
+
+        return [(float(self.lats[n]), float(self.lngs[n])) for n in nodes]
+
+
+def load_road_graph(path, num_landmarks=8):
+    """Load the road graph once at startup; None when no extract is configured."""
+    if not path or not os.path.exists(path):
+        return None
+    graph = RoadGraph.from_geojson(path, num_landmarks=num_landmarks)
+    if graph.edge_count == 0:
+        return None
+    return graph
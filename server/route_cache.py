@@ -0,0 +1,136 @@
+"""In-process cache for /safe_route results.
+
+Entries are keyed on grid-snapped endpoints plus request options, expire
+after a TTL, are evicted LRU-first, and are dropped when a new incident is
+reported inside the bbox they were computed from. Concurrent misses for the
+same key are coalesced so only one search runs.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error", "bbox", "stale")
+
+    def __init__(self, bbox):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.bbox = bbox
+        self.stale = False
+
+
+def _bbox_contains(bbox, lat, lng):
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+class RouteCache:
+    """Thread-safe LRU/TTL cache with request coalescing and bbox invalidation."""
+
+    def __init__(self, max_entries=512, ttl_seconds=300, grid_step=0.004):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.grid_step = grid_step
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, start, end, *options):
+        """Key on start/end snapped to the search grid plus request options."""
+        snap = lambda v: int(round(v / self.grid_step))
+        return (snap(start[0]), snap(start[1]), snap(end[0]), snap(end[1])) + tuple(options)
+
+    def get_or_compute(self, key, bbox, compute):
+        """Return the cached value for `key`, computing it at most once concurrently.
+
+        `bbox` is the area whose incidents the value depends on; a report
+        inside it invalidates the entry (or discards an in-flight result).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight(bbox)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if flight.error is None and not flight.stale:
+                    self._entries[key] = (time.monotonic() + self.ttl_seconds, bbox, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            flight.event.set()
+
+        return flight.value
+
+    def invalidate_point(self, lat, lng):
+        """Drop every entry (and in-flight result) whose bbox contains the point."""
+        with self._lock:
+            self.epoch += 1
+            stale = [k for k, (_, bbox, _) in self._entries.items() if _bbox_contains(bbox, lat, lng)]
+            for k in stale:
+                del self._entries[k]
+            for flight in self._inflight.values():
+                if _bbox_contains(flight.bbox, lat, lng):
+                    flight.stale = True
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            for flight in self._inflight.values():
+                flight.stale = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "in_flight": len(self._inflight),
+                "epoch": self.epoch,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,94 @@
+"""Bounded worker pool for CPU-bound route searches.
+
+Route searches are pure-Python/NumPy work that holds the GIL, so running
+them on the Flask/SocketIO threads stalls every other client. RoutePool
+runs them in forked worker processes (threads where fork is unavailable),
+caps the number of queued searches and reports its load for /metrics.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class RoutePoolBusy(Exception):
+    """Raised when accepting more searches would exceed the queue limit."""
+
+
+def _noop():
+    return None
+
+
+class RoutePool:
+    """Process pool with queue-depth admission control."""
+
+    def __init__(self, workers, max_pending, initializer=None, initargs=()):
+        self.workers = workers
+        self.max_pending = max_pending
+        if "fork" in multiprocessing.get_all_start_methods():
+            # Forked workers inherit the road graph and other startup state copy-on-write
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=initializer,
+                initargs=initargs,
+            )
+            self.kind = "process"
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, initializer=initializer, initargs=initargs
+            )
+            self.kind = "thread"
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def warm_up(self):
+        """Start the workers now, before request-serving threads exist."""
+        self._executor.submit(_noop).result()
+
+    def _done(self, _future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def submit_batch(self, calls):
+        """Submit [(fn, args), ...] all-or-nothing; raises RoutePoolBusy if full."""
+        with self._lock:
+            if self.pending + len(calls) > self.max_pending:
+                self.rejected += len(calls)
+                raise RoutePoolBusy(f"{self.pending} route searches already queued")
+            self.pending += len(calls)
+            self.submitted += len(calls)
+
+        futures = []
+        for fn, args in calls:
+            future = self._executor.submit(fn, *args)
+            future.add_done_callback(self._done)
+            futures.append(future)
+        return futures
+
+    def submit(self, fn, *args):
+        return self.submit_batch([(fn, args)])[0]
+
+    def record_timeout(self, count=1):
+        with self._lock:
+            self.timeouts += count
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
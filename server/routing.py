@@ -0,0 +1,533 @@
+"""Safe-route search: lattice A*, road-network routing and route alternatives.
+
+Kept free of Flask/MySQL imports so searches can run in worker processes.
+"""
+import heapq
+import logging
+import time
+from concurrent.futures import TimeoutError
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from exposure import score_path
+from geo_math import haversine_km, path_length_km
+from incident_index import IncidentIndex
+from incident_store import IncidentsRef, shared_route_incidents
+from polyline import encode, simplify
+from risk_field import RiskField
+from road_graph import load_road_graph
+from route_pool import RoutePoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Lattice spacing of the safe-route search, in degrees (~440 m)
+ROUTE_STEP = 0.004
+
+# Endpoints further than this (km) from the road network fall back to the lattice search
+ROAD_SNAP_MAX_KM = 0.5
+
+# (route type, risk weight) per returned route; the first one is always computed
+ROUTE_PROFILES = (
+    ("recommended", 2.0),
+    ("shorter", 0.5),
+    ("fastest", 0.0),
+)
+
+# Alternatives sharing more than this fraction of cells with an earlier
+# route are searched again with that route penalized
+MAX_ROUTE_OVERLAP = 0.8
+AVOID_PENALTY = 1.5
+
+# Lattice routes longer than this (straight-line km) use bidirectional A*
+LONG_ROUTE_KM = 3.0
+
+# Returned geometry: "coords" (list of (lat, lng)) or "polyline" (Google
+# encoded), simplified with Douglas-Peucker at this tolerance in metres
+ROUTE_GEOMETRIES = ("coords", "polyline")
+SIMPLIFY_TOLERANCE_M = 5.0
+
+_road_graph = None
+
+
+def set_road_graph(graph):
+    """Share the startup-loaded road graph with searches (and forked workers)."""
+    global _road_graph
+    _road_graph = graph
+
+
+def get_road_graph():
+    return _road_graph
+
+
+def route_bbox(start, end, buffer=0.03):
+    """Incident search area for a route: the endpoint box plus `buffer` degrees."""
+    return (
+        min(start[0], end[0]) - buffer,
+        min(start[1], end[1]) - buffer,
+        max(start[0], end[0]) + buffer,
+        max(start[1], end[1]) + buffer,
+    )
+
+
+def build_risk_field(start, end, incidents, bbox=None):
+    """Rasterize incident risk on the A* lattice anchored at `start`."""
+    lats = [inc["lat"] for inc in incidents]
+    lngs = [inc["lng"] for inc in incidents]
+    if bbox is None:
+        bbox = (
+            min([start[0], end[0]] + lats),
+            min([start[1], end[1]] + lngs),
+            max([start[0], end[0]] + lats),
+            max([start[1], end[1]] + lngs),
+        )
+    return RiskField.build(start, ROUTE_STEP, bbox, lats, lngs, [inc["severity"] for inc in incidents])
+
+
+# 8-connected lattice moves as (di, dj)
+LATTICE_OFFSETS = np.array([
+    (di, dj)
+    for di in [-1, 0, 1]
+    for dj in [-1, 0, 1]
+    if not (di == 0 and dj == 0)
+])
+
+
+class _Lattice:
+    """Flat-indexed view of a RiskField raster with per-move edge costs.
+
+    The cost of moving u -> v is ``len(u, v) * (1 + AVOID_PENALTY * avoided(v))
+    + risk_weight * risk(v)``, i.e. never less than the haversine step length.
+    """
+
+    def __init__(self, field, risk_weight, avoid=None):
+        self.field = field
+        self.rows, self.cols = field.shape
+        self.size = self.rows * self.cols
+        self.row_lats = field.origin[0] + (field.i0 + np.arange(self.rows)) * field.step
+        self.col_lngs = field.origin[1] + (field.j0 + np.arange(self.cols)) * field.step
+
+        # Step length depends only on the row (latitude) and the move
+        self.step_km = haversine_km(
+            self.row_lats[:, None], 0.0,
+            self.row_lats[:, None] + LATTICE_OFFSETS[:, 0] * field.step,
+            LATTICE_OFFSETS[:, 1] * field.step,
+        )
+        self.node_cost = risk_weight * field.values.ravel()
+        self.avoided = np.zeros(self.size, dtype=bool)
+        for lat, lng in (avoid or []):
+            v = self.node_id(*field.node_index(lat, lng))
+            if v is not None:
+                self.avoided[v] = True
+
+    def node_id(self, i, j):
+        r, c = i - self.field.i0, j - self.field.j0
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            return r * self.cols + c
+        return None
+
+    def coords(self, v):
+        return (float(self.row_lats[v // self.cols]), float(self.col_lngs[v % self.cols]))
+
+    def all_coords(self):
+        return np.repeat(self.row_lats, self.cols), np.tile(self.col_lngs, self.rows)
+
+    def _moves(self, v, sign):
+        r, c = divmod(v, self.cols)
+        rr = r + sign * LATTICE_OFFSETS[:, 0]
+        cc = c + sign * LATTICE_OFFSETS[:, 1]
+        ok = (rr >= 0) & (rr < self.rows) & (cc >= 0) & (cc < self.cols)
+        return rr, cc, ok
+
+    def successors(self, u):
+        """(nodes, costs) of moves out of u."""
+        rr, cc, ok = self._moves(u, 1)
+        v = rr[ok] * self.cols + cc[ok]
+        length = self.step_km[u // self.cols][ok]
+        return v, length * (1 + AVOID_PENALTY * self.avoided[v]) + self.node_cost[v]
+
+    def predecessors(self, v):
+        """(nodes, costs) of moves into v."""
+        rr, cc, ok = self._moves(v, -1)
+        u = rr[ok] * self.cols + cc[ok]
+        length = self.step_km[rr[ok], np.flatnonzero(ok)]
+        return u, length * (1 + AVOID_PENALTY * self.avoided[v]) + self.node_cost[v]
+
+    def matrix(self):
+        """Directed CSR weight matrix of the whole lattice."""
+        src, dst, cost = [], [], []
+        r, c = np.divmod(np.arange(self.size), self.cols)
+        for k, (di, dj) in enumerate(LATTICE_OFFSETS):
+            rr, cc = r + di, c + dj
+            ok = (rr >= 0) & (rr < self.rows) & (cc >= 0) & (cc < self.cols)
+            u = np.flatnonzero(ok)
+            v = rr[ok] * self.cols + cc[ok]
+            length = self.step_km[r[ok], k]
+            src.append(u)
+            dst.append(v)
+            cost.append(length * (1 + AVOID_PENALTY * self.avoided[v]) + self.node_cost[v])
+        return csr_matrix(
+            (np.concatenate(cost), (np.concatenate(src), np.concatenate(dst))),
+            shape=(self.size, self.size),
+        )
+
+
+def lattice_cost_graph(field, risk_weight=2.0):
+    """(CSR cost matrix, node lats, node lngs) of a risk field's lattice.
+
+    The sparsity pattern depends only on the raster shape, so matrices
+    built from re-rasterized fields of the same area line up edge for edge.
+    """
+    lattice = _Lattice(field, risk_weight)
+    lats, lngs = lattice.all_coords()
+    return lattice.matrix(), lats, lngs
+
+
+def _trace(pred, v):
+    nodes = []
+    while v >= 0:
+        nodes.append(int(v))
+        v = pred[v]
+    return nodes
+
+
+def a_star_safe_path(start, end, incidents, max_time=3.0, risk_field=None, risk_weight=2.0,
+                     avoid=None, bidirectional=False, stats=None):
+    """A* over the risk lattice with a wall-clock budget.
+
+    The search covers the risk field's raster (request bbox plus the risk
+    radius) with no iteration cap. ``bidirectional`` runs forward and
+    backward searches with averaged haversine potentials. On timeout the
+    best partial path towards `end` is returned. A `stats` dict, if given,
+    receives lattice size, nodes expanded and whether the target was
+    reached.
+    """
+    start_time = time.time()
+    deadline = start_time + max_time
+
+    if risk_field is None:
+        risk_field = build_risk_field(start, end, incidents)
+
+    lattice = _Lattice(risk_field, risk_weight, avoid)
+    source = lattice.node_id(*risk_field.node_index(*start))
+    target = lattice.node_id(*risk_field.node_index(*end))
+    if source is None or target is None:
+        print("⚠️ Endpoint outside risk field, returning straight line")
+        return [start, end]
+
+    # Heuristics for every lattice node at once
+    lats, lngs = lattice.all_coords()
+    t_lat, t_lng = lattice.coords(target)
+    s_lat, s_lng = lattice.coords(source)
+    h_t = haversine_km(lats, lngs, t_lat, t_lng)
+    h_s = haversine_km(lats, lngs, s_lat, s_lng)
+
+    if bidirectional:
+        nodes, expanded = _bidirectional_search(lattice, source, target, h_t, h_s, deadline)
+    else:
+        nodes, expanded = _forward_search(lattice, source, target, h_t, deadline)
+
+    if stats is not None:
+        stats.update(
+            lattice_nodes=lattice.size,
+            expanded=expanded,
+            reached=bool(nodes) and nodes[-1] == target,
+        )
+
+    path = [lattice.coords(v) for v in nodes]
+    if path:
+        path[0] = start
+        if nodes[-1] == target and path[-1] != tuple(end):
+            path.append(end)
+
+    print(f"✅ Path found: {len(path)} points, {expanded} iterations, {time.time()-start_time:.2f}s")
+
+    if len(path) < 2:
+        print("⚠️ Path too short, returning straight line")
+        return [start, end]
+
+    return path
+
+
+def _forward_search(lattice, source, target, h_t, deadline):
+    g = np.full(lattice.size, np.inf)
+    pred = np.full(lattice.size, -1, dtype=np.int64)
+    closed = np.zeros(lattice.size, dtype=bool)
+    g[source] = 0.0
+    frontier = [(float(h_t[source]), source)]
+    expanded = 0
+
+    while frontier:
+        if expanded % 64 == 0 and time.time() > deadline:
+            print(f"Pathfinding timeout after {expanded} iterations")
+            break
+
+        _, u = heapq.heappop(frontier)
+        if closed[u]:
+            continue
+        closed[u] = True
+        expanded += 1
+        if u == target:
+            return list(reversed(_trace(pred, target))), expanded
+
+        v, cost = lattice.successors(u)
+        ng = g[u] + cost
+        better = ng < g[v]
+        v, ng = v[better], ng[better]
+        g[v] = ng
+        pred[v] = u
+        for node, key in zip(v.tolist(), (ng + h_t[v]).tolist()):
+            heapq.heappush(frontier, (key, node))
+
+    # Timed out: best partial path towards the target
+    reached = np.flatnonzero(np.isfinite(g))
+    best = int(reached[np.argmin(h_t[reached])])
+    return list(reversed(_trace(pred, best))), expanded
+
+
+def _bidirectional_search(lattice, source, target, h_t, h_s, deadline):
+    # Averaged potentials keep both directions consistent, so the search
+    # can stop as soon as the two best keys sum to the best meeting cost
+    p_f = (h_t - h_s) / 2
+    p_r = -p_f
+
+    g_f = np.full(lattice.size, np.inf)
+    g_r = np.full(lattice.size, np.inf)
+    pred_f = np.full(lattice.size, -1, dtype=np.int64)
+    pred_r = np.full(lattice.size, -1, dtype=np.int64)
+    closed_f = np.zeros(lattice.size, dtype=bool)
+    closed_r = np.zeros(lattice.size, dtype=bool)
+    g_f[source] = 0.0
+    g_r[target] = 0.0
+    front_f = [(float(p_f[source]), source)]
+    front_r = [(float(p_r[target]), target)]
+
+    best_cost = 0.0 if source == target else np.inf
+    meet = source if source == target else -1
+    expanded = 0
+
+    while front_f and front_r:
+        if expanded % 64 == 0 and time.time() > deadline:
+            print(f"Pathfinding timeout after {expanded} iterations")
+            break
+        if front_f[0][0] + front_r[0][0] >= best_cost:
+            break
+
+        forward = front_f[0][0] <= front_r[0][0]
+        if forward:
+            frontier, g, g_other, pred, closed, pot = front_f, g_f, g_r, pred_f, closed_f, p_f
+        else:
+            frontier, g, g_other, pred, closed, pot = front_r, g_r, g_f, pred_r, closed_r, p_r
+
+        _, u = heapq.heappop(frontier)
+        if closed[u]:
+            continue
+        closed[u] = True
+        expanded += 1
+
+        v, cost = lattice.successors(u) if forward else lattice.predecessors(u)
+        ng = g[u] + cost
+        better = ng < g[v]
+        v, ng = v[better], ng[better]
+        g[v] = ng
+        pred[v] = u
+        for node, key in zip(v.tolist(), (ng + pot[v]).tolist()):
+            heapq.heappush(frontier, (key, node))
+
+        if len(v):
+            through = ng + g_other[v]
+            k = int(np.argmin(through))
+            if through[k] < best_cost:
+                best_cost = float(through[k])
+                meet = int(v[k])
+
+    if meet < 0:
+        # No meeting before the deadline: best partial forward path
+        reached = np.flatnonzero(np.isfinite(g_f))
+        best = int(reached[np.argmin(h_t[reached])])
+        return list(reversed(_trace(pred_f, best))), expanded
+
+    return list(reversed(_trace(pred_f, meet))) + _trace(pred_r, meet)[1:], expanded
+
+
+def road_path(start, end, incident_index, bbox, risk_weight=2.0, avoid=None):
+    """Risk-weighted path over the shared road graph, or None if off-network."""
+    if _road_graph is None:
+        return None
+    _, start_gap = _road_graph.nearest_node(*start)
+    _, end_gap = _road_graph.nearest_node(*end)
+    if start_gap > ROAD_SNAP_MAX_KM or end_gap > ROAD_SNAP_MAX_KM:
+        return None
+
+    path = _road_graph.route(
+        start, end, incident_index, bbox=bbox, risk_weight=risk_weight,
+        avoid=avoid, avoid_factor=1 + AVOID_PENALTY,
+    )
+    if not path:
+        return None
+    return [start] + path + [end]
+
+
+def search_route(start, end, incidents, bbox, risk_weight=2.0, max_time=2.0, avoid=None):
+    """One route search: road network first, lattice A* as fallback.
+
+    Module-level and Flask-free so it can be submitted to worker processes.
+    `incidents` is a list of {"lat", "lng", "severity"} dicts or an
+    IncidentsRef to the published incident store, read here for `bbox`.
+    """
+    if isinstance(incidents, IncidentsRef):
+        incidents = shared_route_incidents(incidents, bbox)
+    path = None
+    if _road_graph is not None:
+        try:
+            path = road_path(start, end, IncidentIndex.from_incidents(incidents), bbox, risk_weight, avoid)
+        except Exception as e:
+            logger.error(f"Road network routing failed: {e}")
+
+    if not path:
+        try:
+            risk_field = build_risk_field(start, end, incidents, bbox=bbox)
+            long_route = float(haversine_km(start[0], start[1], end[0], end[1])) > LONG_ROUTE_KM
+            path = a_star_safe_path(
+                start, end, incidents,
+                max_time=max_time,
+                risk_field=risk_field,
+                risk_weight=risk_weight,
+                avoid=avoid,
+                bidirectional=long_route,
+            )
+        except Exception as e:
+            logger.error(f"Lattice search failed: {e}")
+            path = [start, end]
+
+    return path
+
+
+def init_route_worker(road_network_path=None, num_landmarks=8):
+    """Pool initializer: load the road graph unless it was inherited via fork."""
+    if _road_graph is None and road_network_path:
+        try:
+            set_road_graph(load_road_graph(road_network_path, num_landmarks=num_landmarks))
+        except Exception as e:
+            logger.error(f"Route worker could not load road network: {e}")
+
+
+def _path_cells(path):
+    return {
+        (round(lat / (ROUTE_STEP / 2)), round(lng / (ROUTE_STEP / 2)))
+        for lat, lng in path
+    }
+
+
+def _overlap(path, other):
+    cells = _path_cells(path)
+    if not cells:
+        return 1.0
+    return len(cells & _path_cells(other)) / len(cells)
+
+
+class RouteTimeout(Exception):
+    """Raised when the recommended route is not ready by the request deadline."""
+
+
+def _collect(futures, deadline, pool):
+    paths = []
+    for fut in futures:
+        try:
+            paths.append(fut.result(timeout=max(0.0, deadline - time.monotonic())))
+        except TimeoutError:
+            fut.cancel()
+            pool.record_timeout()
+            paths.append(None)
+        except Exception as e:
+            logger.error(f"Route search failed: {e}")
+            paths.append(None)
+    return paths
+
+
+def find_routes(start, end, incidents, bbox, pool, multiple=False, time_budget=2.0, queue_grace=1.0):
+    """[(route_type, path), ...] for the requested route profiles.
+
+    `incidents` is passed to search_route; an IncidentsRef keeps the
+    submissions small. Every search runs on `pool` (a RoutePool); with
+    ``multiple`` the profiles run concurrently. Searches get `time_budget`
+    seconds and results are awaited until that plus `queue_grace` for time
+    spent queued. Alternatives that mostly retrace an earlier route are
+    searched again, still in parallel, with that route penalized; ones that
+    stay duplicates, miss the deadline or are not shorter than the route
+    kept before them (as "shorter" and "fastest" promise) are dropped.
+    RoutePoolBusy propagates when the queue is full and RouteTimeout when
+    the recommended route misses the deadline.
+    """
+    profiles = ROUTE_PROFILES if multiple else ROUTE_PROFILES[:1]
+    deadline = time.monotonic() + time_budget + queue_grace
+    futures = pool.submit_batch([
+        (search_route, (start, end, incidents, bbox, weight, time_budget))
+        for _, weight in profiles
+    ])
+    paths = _collect(futures, deadline, pool)
+    if not paths[0]:
+        raise RouteTimeout("Recommended route not ready before the deadline")
+
+    retry = {}
+    for k in range(1, len(paths)):
+        if paths[k] and any(_overlap(paths[k], paths[m]) > MAX_ROUTE_OVERLAP for m in range(k) if paths[m]):
+            avoid = [pt for m in range(k) if paths[m] for pt in paths[m]]
+            remaining = deadline - queue_grace - time.monotonic()
+            paths[k] = None
+            if remaining > 0:
+                retry[k] = (search_route, (start, end, incidents, bbox, profiles[k][1], remaining, avoid))
+
+    if retry:
+        try:
+            futures = pool.submit_batch(list(retry.values()))
+            for k, path in zip(retry, _collect(futures, deadline, pool)):
+                paths[k] = path
+        except RoutePoolBusy:
+            logger.warning("Route pool busy, dropping alternative re-searches")
+
+    routes = [(profiles[0][0], paths[0])]
+    length = round(path_length_km(paths[0]), 2)
+    for k in range(1, len(paths)):
+        if not paths[k] or any(_overlap(paths[k], p) > MAX_ROUTE_OVERLAP for _, p in routes):
+            continue
+        # Each profile trades risk for distance, so its route must be shorter
+        # than the one before it (at the 10 m the response reports); an avoid
+        # re-search can make it longer
+        k_length = round(path_length_km(paths[k]), 2)
+        if k_length < length:
+            routes.append((profiles[k][0], paths[k]))
+            length = k_length
+    return routes
+
+
+def route_geometry(path, geometry="coords", tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """{"coords": [...]} or {"polyline": "..."} for a full-resolution path."""
+    points = simplify(path, tolerance_m)
+    if geometry == "polyline":
+        return {"polyline": encode(points)}
+    return {"coords": points}
+
+
+def summarize_route(route_type, path, incident_index, speed, geometry="coords",
+                    tolerance_m=SIMPLIFY_TOLERANCE_M):
+    """Route dict in the /safe_route response schema.
+
+    Distance and exposure (see exposure.score_path) use the full path; only
+    the returned geometry is simplified (see route_geometry).
+    """
+    distance_km = path_length_km(path)
+    exposure = score_path(path, incident_index, speed)
+
+    route = {
+        "type": route_type,
+        "distance_km": round(distance_km, 2),
+        "duration_min": int((distance_km / speed) * 60),
+        "safety_score": exposure["safety_score"],
+        "incident_count": exposure["incident_count"],
+        "exposure": exposure["exposure"],
+        "minutes_near_incidents": exposure["minutes_near_incidents"],
+        "hotspots": exposure["hotspots"],
+    }
+    route.update(route_geometry(path, geometry, tolerance_m))
+    return route
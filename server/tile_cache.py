@@ -0,0 +1,141 @@
+"""Two-level (memory + disk) cache for rendered density tiles.
+
+Tiles are kept LRU in memory and written to ``<root>/<z>/<x>/<y>.<fmt>`` so
+they survive restarts. Both levels expire after a TTL, which bounds how
+long time-decay steps take to show up. A new report drops only the tiles
+it touches; a render that raced with an invalidation is served but not
+stored.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+def _etag(body):
+    """Unquoted strong validator for a tile body."""
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+class TileCache:
+    """Thread-safe memory LRU in front of an on-disk tile directory."""
+
+    def __init__(self, root, max_entries=2048, ttl_seconds=3600):
+        self.root = root
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _path(self, key):
+        z, x, y, fmt = key
+        return os.path.join(self.root, str(z), str(x), f"{y}.{fmt}")
+
+    def _remember(self, key, body, expires_at):
+        etag = _etag(body)
+        self._entries[key] = (expires_at, body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return body, etag
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if time.time() - mtime >= self.ttl_seconds:
+                return None
+            with open(path, "rb") as f:
+                return f.read(), time.monotonic() + self.ttl_seconds - (time.time() - mtime)
+        except OSError:
+            return None
+
+    def _write_disk(self, key, body):
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            # Disk is only a warm-start layer; memory still holds the tile
+            pass
+
+    def get_or_render(self, key, render):
+        """(body, etag) for key = (z, x, y, fmt), rendering on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1], entry[2]
+                del self._entries[key]
+            epoch = self.epoch
+
+        cached = self._read_disk(key)
+        if cached is not None:
+            with self._lock:
+                if self.epoch == epoch:
+                    self.disk_hits += 1
+                    return self._remember(key, cached[0], cached[1])
+
+        body = render()
+        with self._lock:
+            self.misses += 1
+            if self.epoch != epoch:
+                return body, _etag(body)
+            result = self._remember(key, body, time.monotonic() + self.ttl_seconds)
+            # Written under the lock so an invalidation cannot be overtaken by a stale file
+            self._write_disk(key, body)
+        return result
+
+    def invalidate(self, tiles, formats):
+        """Drop the given (z, x, y) tiles in every format from memory and disk."""
+        with self._lock:
+            self.epoch += 1
+            dropped = 0
+            for z, x, y in tiles:
+                for fmt in formats:
+                    key = (z, x, y, fmt)
+                    if self._entries.pop(key, None) is not None:
+                        dropped += 1
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+            self.invalidations += dropped
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "epoch": self.epoch,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
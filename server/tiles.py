@@ -0,0 +1,154 @@
+"""Incident density tiles on the slippy-map (Web Mercator z/x/y) grid.
+
+Each tile aggregates time-decayed incident severity into a TILE_GRID x
+TILE_GRID raster, lightly smoothed, and is served either as a sparse JSON
+grid or as a 256 px RGBA heatmap PNG (encoded with zlib, no imaging
+dependency). Tile pixels follow Mercator rows, so PNGs line up with the
+base map.
+"""
+import json
+import math
+import struct
+import zlib
+
+import numpy as np
+
+TILE_GRID = 64
+TILE_PX = 256
+MIN_ZOOM = 3
+MAX_ZOOM = 16
+TILE_FORMATS = {"json": "application/json", "png": "image/png"}
+
+# Density (decayed severity per km^2) drawn at half intensity
+REF_DENSITY_PER_KM2 = 5.0
+EQUATOR_KM = 40075.016686
+
+# Separable [1, 2, 1] / 4 smoothing reaches one cell into the neighbours
+_KERNEL = np.array([0.25, 0.5, 0.25])
+_PAD = 1
+
+
+def _tile_y(lat, n):
+    lat = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    return (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * n
+
+
+def _lat(tile_y, n):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+
+def tile_bounds(z, x, y, pad=0.0):
+    """(min_lat, min_lng, max_lat, max_lng) of a tile, optionally padded by a tile fraction."""
+    n = 2 ** z
+    return (
+        _lat(min(y + 1 + pad, n), n),
+        (x - pad) / n * 360.0 - 180.0,
+        _lat(max(y - pad, 0), n),
+        (x + 1 + pad) / n * 360.0 - 180.0,
+    )
+
+
+def valid_tile(z, x, y):
+    return MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tiles_touching(lat, lng, zooms=range(MIN_ZOOM, MAX_ZOOM + 1)):
+    """Every (z, x, y) whose raster (including smoothing) a point at lat/lng affects."""
+    reach = (_PAD + 0.5) / TILE_GRID
+    tiles = []
+    for z in zooms:
+        n = 2 ** z
+        fx = (lng + 180.0) / 360.0 * n
+        fy = float(_tile_y(lat, n))
+        xs = {int(math.floor(fx - reach)), int(math.floor(fx + reach))}
+        ys = {int(math.floor(fy - reach)), int(math.floor(fy + reach))}
+        tiles.extend((z, x % n, y) for x in xs for y in ys if 0 <= y < n)
+    return tiles
+
+
+def density_grid(z, x, y, query):
+    """Smoothed (TILE_GRID, TILE_GRID) sum of decayed severity per cell.
+
+    `query(bbox)` returns (lats, lngs, severities), e.g. IncidentStore.query_bbox.
+    """
+    n = 2 ** z
+    lats, lngs, sev = query(tile_bounds(z, x, y, pad=_PAD / TILE_GRID))
+    size = TILE_GRID + 2 * _PAD
+    grid = np.zeros((size, size))
+    if len(lats):
+        cols = np.floor(((lngs + 180.0) / 360.0 * n - x) * TILE_GRID).astype(int) + _PAD
+        rows = np.floor((_tile_y(lats, n) - y) * TILE_GRID).astype(int) + _PAD
+        ok = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+        np.add.at(grid, (rows[ok], cols[ok]), sev[ok])
+
+        grid = np.apply_along_axis(np.convolve, 0, grid, _KERNEL, mode="same")
+        grid = np.apply_along_axis(np.convolve, 1, grid, _KERNEL, mode="same")
+    return grid[_PAD:-_PAD, _PAD:-_PAD]
+
+
+def cell_area_km2(z, y):
+    """Ground area of one grid cell in row band of tile (z, y)."""
+    n = 2 ** z
+    lat = _lat(y + 0.5, n)
+    side = EQUATOR_KM * math.cos(math.radians(lat)) / n / TILE_GRID
+    return side * side
+
+
+def _png(rgba):
+    """Minimal RGBA8 PNG encoder."""
+    height, width, _ = rgba.shape
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)], axis=1)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+# Heat ramp: transparent -> yellow -> orange -> deep red
+_RAMP_STOPS = np.array([0.0, 0.35, 0.7, 1.0])
+_RAMP_RGBA = np.array([
+    [255, 235, 59, 0],
+    [255, 193, 7, 150],
+    [245, 124, 0, 190],
+    [183, 28, 28, 220],
+], dtype=float)
+
+
+def render_png(grid, z, y):
+    density = grid / cell_area_km2(z, y)
+    intensity = density / (density + REF_DENSITY_PER_KM2)
+    rgba = np.stack(
+        [np.interp(intensity, _RAMP_STOPS, _RAMP_RGBA[:, c]) for c in range(4)], axis=-1
+    )
+    rgba[grid <= 0] = 0
+    scale = TILE_PX // TILE_GRID
+    rgba = np.repeat(np.repeat(rgba, scale, axis=0), scale, axis=1)
+    return _png(rgba.round().astype(np.uint8))
+
+
+def render_json(grid, z, x, y):
+    rows, cols = np.nonzero(grid > 1e-6)
+    return json.dumps({
+        "z": z,
+        "x": x,
+        "y": y,
+        "grid": TILE_GRID,
+        "bounds": tile_bounds(z, x, y),
+        "cell_area_km2": round(cell_area_km2(z, y), 6),
+        "max": round(float(grid.max()), 4) if grid.size else 0.0,
+        "cells": [[int(r), int(c), round(float(grid[r, c]), 4)] for r, c in zip(rows, cols)],
+    }, separators=(",", ":")).encode()
+
+
+def render_tile(z, x, y, fmt, query):
+    """Encoded tile body for `fmt` ("json" or "png")."""
+    grid = density_grid(z, x, y, query)
+    if fmt == "png":
+        return render_png(grid, z, y)
+    return render_json(grid, z, x, y)
@@ -0,0 +1,601 @@
+"""Live-location tracking sessions shared through /track/<session_id>.
+
+A session keeps its most recent fixes in a fixed-capacity ring buffer: one
+flat ``array('d')`` of (lat, lng, ts, speed, accuracy) records that grows
+to capacity once and is then overwritten in place, so an update allocates
+nothing and a session costs a few KB however long it runs. All times are
+epoch seconds as floats (fix times come from the phone's clock, so they
+have to be wall-clock); ISO strings are only produced for responses.
+
+Phones that buffer fixes send them in batches tagged with increasing
+sequence numbers; each session keeps the highest sequence number it has
+accepted and drops fixes at or below it, so a retransmitted batch is
+applied once. A batch that arrives after a later one loses its fixes, so
+clients keep a single batch in flight and start each one at their oldest
+unacknowledged fix (see mobile-app/src/utils/locationBatch.js).
+
+Sessions live in a store so several server processes can share them:
+MemorySessionStore for a single process, RedisSessionStore for any number
+of processes and hosts (any Redis-protocol server, or a stand-in client
+such as fakeredis). App code only goes through the store API, so both
+behave the same.
+"""
+import json
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+TRACK_CAPACITY = 100
+_FIELDS = 5  # lat, lng, ts, speed, accuracy
+
+
+def iso(ts):
+    """ISO 8601 (UTC) for an epoch timestamp, None passes through."""
+    return None if ts is None else datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def parse_timestamp(value, default=None):
+    """Epoch seconds from a client timestamp (ISO string, epoch s or ms), else `default`."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return default
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    return default
+
+
+class LocationRing:
+    """Fixed-capacity ring of location fixes, oldest overwritten first."""
+
+    __slots__ = ("capacity", "_buf", "_next", "_count")
+
+    def __init__(self, capacity=TRACK_CAPACITY):
+        self.capacity = capacity
+        self._buf = array("d")
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, lat, lng, ts, speed=0.0, accuracy=0.0):
+        if self._count < self.capacity:
+            self._buf.extend((lat, lng, ts, speed, accuracy))
+            self._count += 1
+        else:
+            i = self._next * _FIELDS
+            buf = self._buf
+            buf[i] = lat
+            buf[i + 1] = lng
+            buf[i + 2] = ts
+            buf[i + 3] = speed
+            buf[i + 4] = accuracy
+        self._next = (self._next + 1) % self.capacity
+
+    def latest(self):
+        """(lat, lng, ts, speed, accuracy) of the newest fix, or None."""
+        if not self._count:
+            return None
+        i = (self._next - 1) % self.capacity * _FIELDS
+        return tuple(self._buf[i:i + _FIELDS])
+
+    def records(self):
+        """All fixes, oldest first."""
+        start = self._next if self._count == self.capacity else 0
+        order = list(range(start, self._count)) + list(range(0, start))
+        return [tuple(self._buf[i * _FIELDS:(i + 1) * _FIELDS]) for i in order]
+
+    def ordered(self):
+        """The raw buffer rotated oldest first: flat (lat, lng, ts, speed, accuracy) * len."""
+        if self._count < self.capacity or not self._next:
+            return self._buf
+        i = self._next * _FIELDS
+        return self._buf[i:] + self._buf[:i]
+
+    def load(self, rows):
+        """Replace the contents with `rows`, an (n, 5) float64 array oldest first, n <= capacity."""
+        self._buf = array("d", rows.astype("<f8", copy=False).tobytes())
+        self._count = len(rows)
+        self._next = self._count % self.capacity
+
+
+def new_fixes(fixes, last_seq):
+    """Fixes (seq, lat, lng, ts, speed, accuracy) past `last_seq`, in seq order, one per seq.
+
+    Fixes at or below `last_seq` are dropped even if they were never applied.
+    """
+    fresh = {}
+    for fix in fixes:
+        if fix[0] > last_seq:
+            fresh.setdefault(fix[0], fix)
+    return [fresh[seq] for seq in sorted(fresh)]
+
+
+def location_dict(record):
+    """Response/event shape of a (lat, lng, ts, speed, accuracy) fix."""
+    if record is None:
+        return None
+    lat, lng, ts, speed, accuracy = record
+    return {"lat": lat, "lng": lng, "timestamp": iso(ts), "speed": speed, "accuracy": accuracy}
+
+
+class TrackingSession:
+    """One shared live-location session."""
+
+    __slots__ = (
+        "user_id", "user_name", "duration_minutes", "created_at", "expires_at",
+        "last_updated", "is_active", "total_updates", "last_seq", "locations",
+    )
+
+    def __init__(self, user_id, user_name, lat, lng, duration_minutes=30, capacity=TRACK_CAPACITY, now=None):
+        now = time.time() if now is None else now
+        self.user_id = user_id
+        self.user_name = user_name
+        self.duration_minutes = duration_minutes
+        self.created_at = now
+        self.expires_at = now + duration_minutes * 60 if duration_minutes > 0 else None
+        self.last_updated = now
+        self.is_active = True
+        self.total_updates = 1
+        self.last_seq = -1
+        self.locations = LocationRing(capacity)
+        self.locations.append(lat, lng, now)
+
+    @classmethod
+    def restore(cls, fields, records=(), capacity=TRACK_CAPACITY):
+        """Rebuild a session from stored fields and its fixes (oldest first)."""
+        session = cls.__new__(cls)
+        # Plain assignments: a warm restart restores thousands of these
+        session.user_id = fields["user_id"]
+        session.user_name = fields["user_name"]
+        session.duration_minutes = fields["duration_minutes"]
+        session.created_at = fields["created_at"]
+        session.expires_at = fields["expires_at"]
+        session.last_updated = fields["last_updated"]
+        session.is_active = fields["is_active"]
+        session.total_updates = fields["total_updates"]
+        session.last_seq = fields.get("last_seq", -1)
+        session.locations = LocationRing(capacity)
+        for record in records:
+            session.locations.append(*record)
+        return session
+
+    def expired(self, now=None):
+        if self.expires_at is None:
+            return False
+        return (time.time() if now is None else now) > self.expires_at
+
+    def add_location(self, lat, lng, ts=None, speed=0.0, accuracy=0.0, now=None):
+        """Record a fix (ts defaults to now) and return its record tuple."""
+        now = time.time() if now is None else now
+        record = (lat, lng, now if ts is None else ts, speed, accuracy)
+        self.locations.append(*record)
+        self.last_updated = now
+        self.total_updates += 1
+        return record
+
+    def add_locations(self, fixes, now=None):
+        """Record the batch's fixes newer than last_seq, in order; returns their records."""
+        now = time.time() if now is None else now
+        fresh = new_fixes(fixes, self.last_seq)
+        if fresh:
+            self.last_seq = fresh[-1][0]
+        return [self.add_location(*fix[1:], now=now) for fix in fresh]
+
+    def latest_location(self):
+        return location_dict(self.locations.latest())
+
+    def info(self):
+        return {
+            "user_name": self.user_name,
+            "created_at": iso(self.created_at),
+            "last_updated": iso(self.last_updated),
+            "expires_at": iso(self.expires_at),
+            "is_active": self.is_active,
+            "total_updates": self.total_updates,
+            "latest_location": self.latest_location(),
+        }
+
+
+class MemorySessionStore:
+    """Sessions in this process only (single-worker deployments).
+
+    With a LocationLog every change is also appended to disk, and
+    restore() rebuilds the sessions from it after a restart.
+    """
+
+    backend = "memory"
+
+    def __init__(self, log=None):
+        self._sessions = {}
+        self._viewers = {}  # session_id -> client ids in its room
+        self._rooms = {}  # client id -> session_ids it has joined
+        self._lock = threading.Lock()
+        self.log = log
+
+    def restore(self, window_seconds, now=None):
+        """Replay the log (sessions updated within window_seconds) and start appending to it.
+
+        Raises LocationLogBusy if another process owns the log directory.
+        """
+        self.log.acquire()
+        sessions = self.log.replay(window_seconds, now)
+        with self._lock:
+            self._sessions.update(sessions)
+        self.log.open(self._sessions, self._lock)
+        return len(sessions)
+
+    def create(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = session
+            if self.log is not None:
+                self.log.session_created(session_id, session)
+
+    def get(self, session_id, locations=True):
+        """The session (a live object here), or None."""
+        return self._sessions.get(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def ids(self):
+        return list(self._sessions)
+
+    def add_location(self, session_id, lat, lng, ts=None, speed=0.0, accuracy=0.0, now=None):
+        """Record a fix; returns (record, total_updates), or None if the session is gone."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            record = session.add_location(lat, lng, ts, speed, accuracy, now)
+            if self.log is not None:
+                self.log.location_added(session_id, record, session.last_updated)
+            return record, session.total_updates
+
+    def add_locations(self, session_id, fixes, now=None):
+        """Record a batch of (seq, ...) fixes; returns (records, total_updates, last_seq) or None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            records = session.add_locations(fixes, now)
+            if self.log is not None and records:
+                for record in records:
+                    self.log.location_added(session_id, record, session.last_updated)
+                self.log.sequence(session_id, session.last_seq)
+            return records, session.total_updates, session.last_seq
+
+    def stop(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            session.is_active = False
+            if self.log is not None:
+                self.log.session_stopped(session_id)
+            return True
+
+    def joined(self, session_id, client_id):
+        """Add a viewer to the session's room; returns the viewer count."""
+        with self._lock:
+            viewers = self._viewers.setdefault(session_id, set())
+            viewers.add(client_id)
+            self._rooms.setdefault(client_id, set()).add(session_id)
+            return len(viewers)
+
+    def left(self, session_id, client_id):
+        """Remove a viewer from the session's room; returns the viewer count."""
+        with self._lock:
+            self._rooms.get(client_id, set()).discard(session_id)
+            viewers = self._viewers.get(session_id)
+            if viewers is None:
+                return 0
+            viewers.discard(client_id)
+            if not viewers:
+                del self._viewers[session_id]
+            return len(viewers)
+
+    def disconnected(self, client_id):
+        """Remove a disconnected client from every room; returns the sessions it left."""
+        with self._lock:
+            rooms = self._rooms.pop(client_id, set())
+            for session_id in rooms:
+                viewers = self._viewers.get(session_id)
+                if viewers is not None:
+                    viewers.discard(client_id)
+                    if not viewers:
+                        del self._viewers[session_id]
+            return list(rooms)
+
+    def viewers(self, session_id):
+        return len(self._viewers.get(session_id, ()))
+
+    def pop_expired(self, now=None):
+        """Remove and return the ids of expired sessions."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session.expired(now)]
+            for sid in expired:
+                del self._sessions[sid]
+                for client_id in self._viewers.pop(sid, ()):
+                    self._rooms.get(client_id, set()).discard(sid)
+                if self.log is not None:
+                    self.log.session_ended(sid)
+        return expired
+
+    def stats(self):
+        stats = {
+            "backend": self.backend,
+            "sessions": len(self._sessions),
+            "watched_sessions": len(self._viewers),
+            "viewers": len(self._rooms),
+        }
+        if self.log is not None:
+            stats["log"] = self.log.stats()
+        return stats
+
+
+_RECORD = struct.Struct("<5d")
+
+
+class RedisSessionStore:
+    """Sessions in Redis, shared by every process pointed at it.
+
+    Per session, a hash ``<prefix>:<id>`` holds the fields and a list
+    ``<prefix>:<id>:fixes`` the packed fixes (newest first, trimmed to
+    capacity). Presence is a set ``<prefix>:<id>:viewers`` of client ids
+    plus, per client, a set ``<prefix>-client:<client id>`` of the sessions
+    it joined, so any worker can drop a disconnected client from its rooms.
+    A sorted set of expiry times lets exactly one process claim each
+    expired session. Keys carry a TTL: a grace period past expiry, or
+    an idle timeout (refreshed by updates) for open-ended sessions.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, prefix="track", capacity=TRACK_CAPACITY, grace_seconds=3600,
+                 idle_seconds=86400):
+        self.client = client
+        self.prefix = prefix
+        self.capacity = capacity
+        self.grace_seconds = grace_seconds
+        self.idle_seconds = idle_seconds
+        self._expiring = f"{prefix}:expiring"
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, session_id):
+        return f"{self.prefix}:{session_id}"
+
+    def _ttl(self, expires_at, now):
+        if expires_at is None:
+            return self.idle_seconds
+        return max(1, int(expires_at + self.grace_seconds - now))
+
+    def create(self, session_id, session):
+        key = self._key(session_id)
+        ttl = self._ttl(session.expires_at, session.created_at)
+        fields = {
+            "user_id": json.dumps(session.user_id),
+            "user_name": session.user_name,
+            "duration_minutes": session.duration_minutes,
+            "created_at": session.created_at,
+            "expires_at": "" if session.expires_at is None else session.expires_at,
+            "last_updated": session.last_updated,
+            "is_active": int(session.is_active),
+            "total_updates": session.total_updates,
+            "last_seq": session.last_seq,
+        }
+        pipe = self.client.pipeline()
+        pipe.delete(key, key + ":fixes", key + ":viewers")
+        pipe.hset(key, mapping=fields)
+        for record in session.locations.records():
+            pipe.lpush(key + ":fixes", _RECORD.pack(*record))
+        pipe.expire(key, ttl)
+        pipe.expire(key + ":fixes", ttl)
+        if session.expires_at is not None:
+            pipe.zadd(self._expiring, {session_id: session.expires_at})
+        pipe.execute()
+
+    def get(self, session_id, locations=True):
+        """A snapshot of the session, or None; locations=False skips the fixes."""
+        key = self._key(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(key)
+        if locations:
+            pipe.lrange(key + ":fixes", 0, self.capacity - 1)
+        result = pipe.execute()
+        raw = {k.decode() if isinstance(k, bytes) else k: v for k, v in result[0].items()}
+        if not raw:
+            return None
+        text = lambda name: raw[name].decode() if isinstance(raw[name], bytes) else str(raw[name])
+        expires_at = text("expires_at")
+        fields = {
+            "user_id": json.loads(text("user_id")),
+            "user_name": text("user_name"),
+            "duration_minutes": int(float(text("duration_minutes"))),
+            "created_at": float(text("created_at")),
+            "expires_at": float(expires_at) if expires_at else None,
+            "last_updated": float(text("last_updated")),
+            "is_active": text("is_active") == "1",
+            "total_updates": int(text("total_updates")),
+            "last_seq": int(text("last_seq")) if "last_seq" in raw else -1,
+        }
+        records = [_RECORD.unpack(packed) for packed in reversed(result[1])] if locations else ()
+        return TrackingSession.restore(fields, records, self.capacity)
+
+    def __contains__(self, session_id):
+        return bool(self.client.exists(self._key(session_id)))
+
+    def ids(self):
+        skip = len(self.prefix) + 1
+        return [
+            key[skip:]
+            for key in (k.decode() if isinstance(k, bytes) else k for k in self.client.scan_iter(f"{self.prefix}:*"))
+            if key != self._expiring and not key.endswith((":fixes", ":viewers"))
+        ]
+
+    def add_location(self, session_id, lat, lng, ts=None, speed=0.0, accuracy=0.0, now=None):
+        """Record a fix; returns (record, total_updates), or None if the session is gone.
+
+        A WATCH transaction like add_locations, so a session that expires or
+        is claimed between the check and the write is not recreated as a
+        bare hash without its fields.
+        """
+        now = time.time() if now is None else now
+        key = self._key(session_id)
+        record = (lat, lng, now if ts is None else ts, speed, accuracy)
+
+        def apply(pipe):
+            total, expires_at = pipe.hmget(key, "total_updates", "expires_at")
+            if total is None:
+                return None
+            pipe.multi()
+            pipe.lpush(key + ":fixes", _RECORD.pack(*record))
+            pipe.ltrim(key + ":fixes", 0, self.capacity - 1)
+            pipe.hset(key, "last_updated", now)
+            pipe.hincrby(key, "total_updates", 1)
+            if not expires_at:
+                # Open-ended sessions live until they have been idle for idle_seconds
+                pipe.expire(key, self.idle_seconds)
+                pipe.expire(key + ":fixes", self.idle_seconds)
+            return record, int(total) + 1
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def add_locations(self, session_id, fixes, now=None):
+        """Record a batch of (seq, ...) fixes; returns (records, total_updates, last_seq) or None.
+
+        Runs as a WATCH transaction on the session hash, so concurrent batches
+        for one session are deduped against the same last_seq.
+        """
+        now = time.time() if now is None else now
+        key = self._key(session_id)
+
+        def apply(pipe):
+            total, last_seq, expires_at = pipe.hmget(key, "total_updates", "last_seq", "expires_at")
+            if total is None:
+                return None
+            last_seq = int(last_seq) if last_seq is not None else -1
+            fresh = new_fixes(fixes, last_seq)
+            records = [(lat, lng, now if ts is None else ts, speed, accuracy)
+                       for _, lat, lng, ts, speed, accuracy in fresh]
+            if fresh:
+                last_seq = fresh[-1][0]
+            pipe.multi()
+            if records:
+                for record in records:
+                    pipe.lpush(key + ":fixes", _RECORD.pack(*record))
+                pipe.ltrim(key + ":fixes", 0, self.capacity - 1)
+                pipe.hset(key, mapping={"last_updated": now, "last_seq": last_seq})
+                pipe.hincrby(key, "total_updates", len(records))
+                if not expires_at:
+                    pipe.expire(key, self.idle_seconds)
+                    pipe.expire(key + ":fixes", self.idle_seconds)
+            return records, int(total) + len(records), last_seq
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def stop(self, session_id):
+        """Mark the session inactive; False if it is gone.
+
+        A WATCH transaction like add_location, so a session that expires in
+        between is not recreated as a bare hash with no TTL.
+        """
+        key = self._key(session_id)
+
+        def apply(pipe):
+            if not pipe.exists(key):
+                return False
+            pipe.multi()
+            pipe.hset(key, "is_active", 0)
+            return True
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def _client_key(self, client_id):
+        return f"{self.prefix}-client:{client_id}"
+
+    def joined(self, session_id, client_id):
+        """Add a viewer to the session's room; returns the viewer count."""
+        viewers = self._key(session_id) + ":viewers"
+        rooms = self._client_key(client_id)
+        pipe = self.client.pipeline()
+        pipe.sadd(viewers, client_id)
+        pipe.sadd(rooms, session_id)
+        # Entries left behind by a crashed worker age out with the idle timeout
+        pipe.expire(viewers, self.idle_seconds)
+        pipe.expire(rooms, self.idle_seconds)
+        pipe.scard(viewers)
+        return int(pipe.execute()[-1])
+
+    def left(self, session_id, client_id):
+        """Remove a viewer from the session's room; returns the viewer count."""
+        viewers = self._key(session_id) + ":viewers"
+        pipe = self.client.pipeline()
+        pipe.srem(viewers, client_id)
+        pipe.srem(self._client_key(client_id), session_id)
+        pipe.scard(viewers)
+        return int(pipe.execute()[-1])
+
+    def disconnected(self, client_id):
+        """Remove a disconnected client from every room; returns the sessions it left."""
+        rooms = self._client_key(client_id)
+        session_ids = [s.decode() if isinstance(s, bytes) else s for s in self.client.smembers(rooms)]
+        pipe = self.client.pipeline()
+        for session_id in session_ids:
+            pipe.srem(self._key(session_id) + ":viewers", client_id)
+        pipe.delete(rooms)
+        pipe.execute()
+        return session_ids
+
+    def viewers(self, session_id):
+        return int(self.client.scard(self._key(session_id) + ":viewers"))
+
+    def pop_expired(self, now=None):
+        """Remove and return the ids of expired sessions this process claimed."""
+        now = time.time() if now is None else now
+        expired = []
+        for session_id in self.client.zrangebyscore(self._expiring, "-inf", now):
+            # ZREM succeeds in exactly one process, which then owns the cleanup
+            if self.client.zrem(self._expiring, session_id):
+                session_id = session_id.decode() if isinstance(session_id, bytes) else session_id
+                key = self._key(session_id)
+                self.client.delete(key, key + ":fixes", key + ":viewers")
+                expired.append(session_id)
+        return expired
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "sessions": len(self.ids()),
+            "expiring": int(self.client.zcard(self._expiring)),
+        }
+
+
+def session_store_from_env(url=None, log_dir=None, replay_seconds=3600):
+    """RedisSessionStore for a redis:// URL, else a MemorySessionStore.
+
+    Redis already outlives the process; the memory store is backed by a
+    LocationLog in `log_dir` (when set) and replays it on startup.
+    """
+    if url:
+        return RedisSessionStore.from_url(url)
+    if not log_dir:
+        return MemorySessionStore()
+    from location_log import LocationLog
+
+    store = MemorySessionStore(LocationLog(log_dir))
+    store.restore(replay_seconds)
+    return store